@@ -0,0 +1,156 @@
+#!/usr/local/bin/python3
+# coding=utf-8
+
+####### Validation of a stream of JSON records coming from an asyncio program
+###  validateAsync takes an async iterator of lines or of chunks of text or bytes and is an async generator of
+###  the result of the validation of each record, with the messages of ValidateJsonRnc.py.
+###  The records are found by the splitting of validateStream and validated by the same functions; they are
+###  passed by batches through bounded queues so that a slow consumer stops the reading of the input, and
+###  large batches are validated in an executor so that the event loop is not blocked.
+########################################################################
+
+import asyncio,threading,codecs
+from ValidateJsonRnc    import idFunction,uniqueFunctions,uniqueChecker,recordOutcome,reportOutcome
+from ValidationCache    import validOutcome
+from SplitJson          import jsonSplitter
+
+## maximum number of records in a batch
+batchSize=1000
+
+## maximum number of batches (and of chunks of the input) waiting in a queue
+maxQueued=4
+
+## batches of at least this number of records are validated in an executor instead of the event loop
+offloadSize=100
+
+class ChunkReader:
+    """file read by a thread (e.g. by jsonSplitter) whose content is the chunks of text or bytes put
+       in an asyncio queue by the event loop, None being put at the end of the input;
+       beforeWait() is called each time more input is needed"""
+    def __init__(self,chunks,loop,beforeWait):
+        self.chunks=chunks
+        self.loop=loop
+        self.beforeWait=beforeWait
+        self.buf=""
+        self.eof=False
+        self.decoder=codecs.getincrementaldecoder("utf-8")()
+
+    def read(self,size):
+        while len(self.buf)<size and not self.eof:
+            self.beforeWait()
+            chunk=asyncio.run_coroutine_threadsafe(self.chunks.get(),self.loop).result()
+            if chunk==None:
+                self.eof=True
+                self.buf+=self.decoder.decode(b"",True)
+            else:
+                self.buf+=self.decoder.decode(chunk) if isinstance(chunk,bytes) else chunk
+        (text,self.buf)=(self.buf[:size],self.buf[size:])
+        return text
+
+## put in the queue of batches the lists of lines (text or bytes) of the chunks of an async iterator
+#  the lines of a chunk are put as soon as it is read, the last line may have no newline
+async def batchLines(source,batches):
+    rest=None # start of a line not yet ended
+    async for chunk in source:
+        newline=b"\n" if isinstance(chunk,bytes) else "\n"
+        lines=chunk.split(newline)
+        if rest!=None:
+            lines[0]=rest+lines[0]
+        rest=lines.pop()
+        for i in range(0,len(lines),batchSize):
+            await batches.put([line+newline for line in lines[i:i+batchSize]])
+    if rest:
+        await batches.put([rest])
+    await batches.put(None)
+
+## put in the queue of batches the lists of the json values of the chunks of an async iterator, split by a thread
+#  the values already found are put before waiting for more input
+async def batchValues(source,batches,loop):
+    chunks=asyncio.Queue(maxQueued)
+    stopped=threading.Event()
+    batch=[]
+    errors=[]
+    def putBatch(): # in the thread
+        nonlocal batch
+        if len(batch)>0 and not stopped.is_set():
+            asyncio.run_coroutine_threadsafe(batches.put(batch),loop).result()
+        batch=[]
+    def split():
+        try:
+            for value in jsonSplitter(ChunkReader(chunks,loop,putBatch)):
+                batch.append(value)
+                if len(batch)==batchSize:
+                    putBatch()
+            putBatch()
+        except Exception as err:
+            errors.append(err)
+    thread=threading.Thread(target=split,daemon=True)
+    thread.start()
+    try:
+        async for chunk in source:
+            await chunks.put(chunk)
+        await chunks.put(None)
+        await loop.run_in_executor(None,thread.join)
+        if len(errors)>0:
+            raise errors[0]
+        await batches.put(None)
+    finally:
+        if thread.is_alive(): # the consumer has stopped: let the thread end
+            stopped.set()
+            while not chunks.empty():
+                chunks.get_nowait()
+            chunks.put_nowait(None)
+            while not batches.empty():
+                batches.get_nowait()
+
+###
+#  async generator of the results of the validation with a validator of the records of an async iterator of lines or
+#  of chunks of text or bytes (e.g. read from a socket). When split is True, the records are the json values found
+#  in the input, otherwise they are its lines. The result of a record is a dict with its number from 1 ("nb"),
+#  its verdict ("valid", "invalid", "bad" or "dup") and its messages as output by ValidateJsonRnc.py ("" when none).
+#  idStr gives the id of the records, whose values must be unique as those of the json pointers of unique
+#  (ValidateJsonRnc.uniquePointers when None).
+#  The errors are added to the statistics of the validator and counts (a dict with the number of "invalid", "bad"
+#  and "dup" objects) is updated when it is given. The large batches are validated with the executor
+#  (the default executor of the event loop when None), which must be an executor of threads.
+async def validateAsync(validator,source,idStr=None,split=False,logMessages=True,counts=None,executor=None,
+                        unique=None):
+    loop=asyncio.get_running_loop()
+    idFn=idFunction(idStr)
+    uniqueFns=uniqueFunctions(idStr,unique)
+    if counts==None:
+        counts={"invalid":0,"bad":0,"dup":0}
+    messages=[]
+    (checkUnique,uniqueSets)=uniqueChecker(uniqueFns,output=messages.append)
+    def outcomes(batch):
+        return [recordOutcome(validator,inJson,idFn,uniqueFns,logMessages) for inJson in batch]
+    batches=asyncio.Queue(maxQueued)
+    errors=[]
+    async def produce():
+        try:
+            await (batchValues(source,batches,loop) if split else batchLines(source,batches))
+        except Exception as err: # raised while reading or splitting the input
+            errors.append(err)
+            await batches.put(None)
+    producer=asyncio.ensure_future(produce())
+    nb=0
+    try:
+        while True:
+            batch=await batches.get()
+            if batch==None:break
+            if len(batch)>=offloadSize:
+                batchOutcomes=await loop.run_in_executor(executor,outcomes,batch)
+            else:
+                batchOutcomes=outcomes(batch)
+            for outcome in batchOutcomes:
+                nb+=1
+                if outcome is not validOutcome:
+                    reportOutcome(validator,outcome,nb,checkUnique,logMessages,counts,messages.append)
+                yield {"nb":nb,"verdict":outcome[0],"messages":"".join(messages)}
+                messages.clear()
+        if len(errors)>0:
+            raise errors[0]
+    finally:
+        producer.cancel()
+        for uniqueSet in uniqueSets:
+            uniqueSet.close()
@@ -0,0 +1,175 @@
+#!/usr/local/bin/python3
+# coding=utf-8
+
+####### Validation of blocks of records by columns of values
+###  for records that are objects with fixed fields (and nested objects with fixed fields), the values of each field
+###  of a simple type are gathered in a column over a block of records, then the type and the numeric or length
+###  facets of the field are checked on the whole column at once by the builtin set, map, min and max that go over
+###  a column without the loop of the interpreter. The values of a column that fails a check are then found with
+###  NumPy arrays when NumPy is installed, otherwise one by one, and the records having such a value (or not
+###  having the expected fields) are validated again by the compiled schema that builds their messages.
+###  The verdicts are the same as those of the isValid method of the compiled schema.
+###  Gathering the columns only pays for flat records: when most fields of the records are nested objects or arrays,
+###  which are checked value by value anyway, the records are checked one by one by the compiled schema.
+########################################################################
+
+import math
+from operator           import itemgetter
+from ValidateJsonObject import (ObjectNode,SimpleTypeNode,simpleTypeClasses,MinimumFacet,ExclusiveMinimumFacet,
+                                MaximumFacet,ExclusiveMaximumFacet,MinLengthFacet,MaxLengthFacet)
+
+try:
+    import numpy
+except ImportError: # the columns are checked with the builtin functions
+    numpy=None
+
+## largest integer whose comparisons with the floats of NumPy are exact
+maxExactInt=1<<53
+
+## comparison of a value (or of an array) with the bound of a facet, True for the values that do not satisfy it
+boundChecks={MinimumFacet:lambda a,f:a<f.low, ExclusiveMinimumFacet:lambda a,f:a<=f.low,
+             MaximumFacet:lambda a,f:a>f.high,ExclusiveMaximumFacet:lambda a,f:a>=f.high,
+             MinLengthFacet:lambda a,f:a<f.low,MaxLengthFacet:lambda a,f:a>f.high}
+numericFacetTypes=(MinimumFacet,ExclusiveMinimumFacet,MaximumFacet,ExclusiveMaximumFacet)
+lengthFacetTypes=(MinLengthFacet,MaxLengthFacet)
+
+## bound of a facet
+def facetBound(facet):
+    return facet.low if hasattr(facet,"low") else facet.high
+
+class LeafColumn:
+    """checks of the column of the values of a field of a simple type"""
+    def __init__(self,node):
+        self.node=node
+        self.types=simpleTypeClasses[node.theType]
+        self.numericFacets=[f for f in node.facets if type(f) in numericFacetTypes]
+        self.lengthFacets=[f for f in node.facets if type(f) in lengthFacetTypes]
+        self.otherFacets=[f for f in node.facets if type(f) not in numericFacetTypes+lengthFacetTypes]
+
+    ## positions in a list of values of those that are not valid
+    def failures(self,col):
+        if not set(map(type,col))<=self.types:
+            isValid=self.node.isValid
+            return [i for (i,v) in enumerate(col) if not isValid(v)]
+        failed=set()
+        if self.numericFacets:
+            failed.update(self.boundFailures(col,self.numericFacets,True))
+        if self.lengthFacets:
+            failed.update(self.boundFailures(list(map(len,col)),self.lengthFacets,False))
+        for facet in self.otherFacets: # e.g. patterns, that are checked value by value
+            ok=facet.ok
+            failed.update(i for (i,v) in enumerate(col) if not ok(v))
+        return sorted(failed)
+
+    ## positions of the values (numbers or lengths) not satisfying bound facets
+    #  the extreme values of the column tell which facets are not satisfied by all the values (a NaN satisfying
+    #  all of them), the values not satisfying these facets are then found with NumPy or one by one
+    def boundFailures(self,values,facets,isNumeric):
+        if len(values)==0:
+            return []
+        if not(isNumeric and float in set(map(type,values)) and any(map(math.isnan,values))):
+            (low,high)=(min(values),max(values))
+            facets=[facet for facet in facets if boundChecks[type(facet)](low,facet) or boundChecks[type(facet)](high,facet)]
+            if len(facets)==0:
+                return []
+        array=numericArray(values,facets) if numpy!=None else None
+        if array is not None:
+            mask=numpy.zeros(len(values),dtype=bool)
+            for facet in facets:
+                mask|=boundChecks[type(facet)](array,facet)
+            return numpy.flatnonzero(mask).tolist()
+        return [i for (i,v) in enumerate(values) if any(boundChecks[type(facet)](v,facet) for facet in facets)]
+
+## NumPy array of numbers or lengths whose comparisons with the bounds of facets are exact, None when there is none
+def numericArray(values,facets):
+    bounds=[facetBound(facet) for facet in facets]
+    types=set(map(type,values))
+    try:
+        if types<={int,bool} and all(type(b) is int for b in bounds):
+            return numpy.array(values,dtype=numpy.int64) # OverflowError for large integers
+        if types<={float} and all(type(b) is float or abs(b)<=maxExactInt for b in bounds):
+            return numpy.array(values,dtype=numpy.float64)
+    except OverflowError:
+        pass
+    return None
+
+class NodeColumn:
+    """checks one by one of the column of the values of a field by its node"""
+    def __init__(self,node):
+        self.node=node
+
+    def failures(self,col):
+        isValid=self.node.isValid
+        return [i for (i,v) in enumerate(col) if not isValid(v)]
+
+class ObjectColumns:
+    """checks of the fields of an object with fixed fields: the values of its fields of simple types are checked
+       by columns, those of its fields that are objects with fixed fields by nested ObjectColumns and the others
+       one by one by their node (NodeColumn)"""
+    def __init__(self,node,ancestors):
+        self.fields=frozenset(node.properties)
+        self.required=frozenset(node.requiredSet)
+        self.columns=[]  # list of (field,LeafColumn, ObjectColumns or NodeColumn)
+        ancestors=ancestors|{id(node)}
+        for (field,prop) in node.properties.items():
+            if type(prop) is SimpleTypeNode:
+                self.columns.append((field,LeafColumn(prop)))
+            elif isFixedObject(prop) and id(prop) not in ancestors: # recursive objects are checked one by one
+                self.columns.append((field,ObjectColumns(prop,ancestors)))
+            else:
+                self.columns.append((field,NodeColumn(prop)))
+
+    ## positions in a list of values of those that are not valid
+    def failures(self,col):
+        fields=self.fields
+        required=self.required
+        failed=[]
+        objs=[]
+        rows=[]
+        for (i,v) in enumerate(col):
+            if type(v) is dict and v.keys()<=fields and required<=v.keys():
+                objs.append(v)
+                rows.append(i)
+            else:
+                failed.append(i)
+        failedRows=set()
+        for (field,column) in self.columns:
+            failedRows.update(self.fieldFailures(field,objs,column.failures))
+        failed.extend(rows[i] for i in failedRows)
+        return failed
+
+    ## True when at least half of the fields are of a simple type, whose columns are checked at once
+    def isFlat(self):
+        nbLeaves=sum(1 for (field,column) in self.columns if type(column) is LeafColumn)
+        return 2*nbLeaves>=len(self.columns)
+
+    ## positions in objs of the objects whose value of a field is not valid according to failures(values)
+    def fieldFailures(self,field,objs,failures):
+        if field in self.required:
+            return failures(list(map(itemgetter(field),objs)))
+        positions=[i for (i,obj) in enumerate(objs) if field in obj]
+        return [positions[i] for i in failures([objs[i][field] for i in positions])]
+
+## True when the node is an object with fixed fields whose values can be checked by columns
+def isFixedObject(node):
+    return type(node) is ObjectNode and node.additionalProperties is None and node.properties is not None \
+           and node.required is not None
+
+class BatchValidator:
+    """validator of blocks of records by columns according to a compiled schema, the records being checked one by
+       one by the compiled schema when it is not an object with fixed fields or when its fields are mostly
+       not of a simple type"""
+    def __init__(self,compiledSchema):
+        self.compiledSchema=compiledSchema
+        columns=ObjectColumns(compiledSchema,frozenset()) if isFixedObject(compiledSchema) else None
+        self.columns=columns if columns!=None and columns.isFlat() else None
+
+    ## list of the verdicts (True for valid) of a list of decoded records
+    def verdicts(self,objs):
+        if self.columns==None:
+            isValid=self.compiledSchema.isValid
+            return [isValid(obj) for obj in objs]
+        verdicts=[True]*len(objs)
+        for i in self.columns.failures(objs):
+            verdicts[i]=False
+        return verdicts
@@ -0,0 +1,156 @@
+#!/usr/local/bin/python3
+# coding=utf-8
+
+####### Benchmark of the stages of the validation on records generated according to JSON-rnc schemas
+###  for each schema, records are generated (GenerateJson.py) then each stage is timed separately on all of them:
+###  ppJson (writing the records on many lines), jsonSplitter (finding the records in this text), decoding the
+###  records, validating them and reporting the errors of the invalid ones. The throughput of each stage is saved
+###  as a JSON baseline so that the next runs with the same parameters show (and detect) regressions.
+########################################################################
+
+import sys,os,io,json,time,glob,platform,argparse
+from ppJson             import ppJson
+from SplitJson          import jsonSplitter
+from DecodeJson         import decodeJson
+from ValidateJsonObject import showVal
+from ValidateJsonRnc    import getValidator,reportOutcome
+from GenerateJson       import JsonGenerator
+
+try:
+    import resource
+except ImportError: # not on Windows
+    resource=None
+
+## stages in the order of their timing
+stages=["ppJson","jsonSplitter","decode","validate","errorReporting"]
+
+## megabytes of the peak resident set size of the process, None when it is not known
+def peakRss():
+    if resource==None:return None
+    maxrss=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss/(1<<20) if sys.platform=="darwin" else maxrss/(1<<10) # bytes on macOS, kilobytes elsewhere
+
+## (best number of seconds of repeat calls of fn,result of the last call)
+def timed(fn,repeat):
+    best=None
+    for i in range(repeat):
+        start=time.perf_counter()
+        result=fn()
+        seconds=time.perf_counter()-start
+        best=seconds if best==None else min(best,seconds)
+    return (best,result)
+
+###
+#  dict of the measures of the stages of the validation of records generated according to a schema
+#  whose validator is given, params being a dict with the fields records, invalidRate, depth, size, seed and repeat
+def benchmark(validator,params):
+    generator=JsonGenerator(validator,params["depth"],params["size"],params["seed"])
+    records=[record for (record,isValid) in generator.records(params["records"],params["invalidRate"])]
+    repeat=params["repeat"]
+    seconds={}
+    def writeRecords():
+        out=io.StringIO()
+        for record in records:
+            ppJson(out,record)
+        return out.getvalue()
+    (seconds["ppJson"],text)=timed(writeRecords,repeat)
+    (seconds["jsonSplitter"],lines)=timed(lambda:list(jsonSplitter(text)),repeat)
+    (seconds["decode"],objs)=timed(lambda:[decodeJson(line) for line in lines],repeat)
+    compiledSchema=validator.compiledSchema
+    (seconds["validate"],verdicts)=timed(lambda:[compiledSchema.isValid(obj) for obj in objs],repeat)
+    invalidObjs=[obj for (obj,isValid) in zip(objs,verdicts) if not isValid]
+    def reportErrors():
+        counts={"invalid":0,"bad":0,"dup":0}
+        messages=[]
+        for (nb,obj) in enumerate(invalidObjs,1):
+            (mess,kinds)=validator.errorsAndKinds(obj,False)
+            outcome=("invalid",None,[],showVal(obj,100),mess,kinds)
+            reportOutcome(validator,outcome,nb,None,True,counts,messages.append)
+        validator.takeErrorStatistics()
+        return messages
+    (seconds["errorReporting"],messages)=timed(reportErrors,repeat)
+    megabytes=sum(len(line.encode("utf-8")) for line in lines)/(1<<20)
+    return {"parameters":params,
+            "records":len(objs),
+            "invalid":len(invalidObjs),
+            "megabytes":round(megabytes,3),
+            "stages":{stage:{"seconds":round(seconds[stage],6),
+                             "recordsPerSec":round(len(objs)/seconds[stage],1) if seconds[stage]>0 else None,
+                             "MBPerSec":round(megabytes/seconds[stage],3) if seconds[stage]>0 else None}
+                      for stage in stages},
+            "peakRssMB":None if peakRss()==None else round(peakRss(),1),
+            "python":platform.python_version(),
+            "machine":platform.machine(),
+            "date":time.strftime("%Y-%m-%d %H:%M")}
+
+## print the measures of a schema, compared with those of a baseline (when not None) with the same parameters
+#  returns the list of the stages slower than in the baseline by more than tolerance (a fraction)
+def printResults(name,results,baseline,tolerance):
+    print ("%s: %d records (%d invalid), %.2f MB"%(name,results["records"],results["invalid"],results["megabytes"]))
+    if baseline!=None and baseline["parameters"]!=results["parameters"]:
+        print ("   the baseline was measured with other parameters, it is not compared")
+        baseline=None
+    slower=[]
+    for stage in stages:
+        measures=results["stages"][stage]
+        line="   %-15s %9.4f s %12s records/s %9.2f MB/s"%(stage,measures["seconds"],
+                                                           "%.0f"%measures["recordsPerSec"] if measures["recordsPerSec"] else "-",
+                                                           measures["MBPerSec"] or 0)
+        if baseline!=None and measures["recordsPerSec"] and baseline["stages"][stage]["recordsPerSec"]:
+            change=measures["recordsPerSec"]/baseline["stages"][stage]["recordsPerSec"]-1
+            line+="   %+6.1f%% vs baseline"%(100*change)
+            if change<-tolerance:
+                line+="   SLOWER"
+                slower.append(stage)
+        print (line)
+    if results["peakRssMB"]!=None:
+        print ("   peak RSS: %.1f MB"%results["peakRssMB"])
+    return slower
+
+## write a baseline in a file replaced atomically
+def saveBaseline(fileName,results):
+    tmpFileName=fileName+".tmp"
+    with open(tmpFileName,"w") as f:
+        json.dump(results,f,indent=1)
+    os.replace(tmpFileName,fileName)
+
+if __name__ == '__main__':
+    testsDir=os.path.join(os.path.dirname(os.path.abspath(__file__)),"..","Tests")
+    parser=argparse.ArgumentParser(description="Benchmark the stages of the validation on records generated according to JSON-rnc schemas "+
+                                               "(all those of the Tests directory by default). The exit code is 1 when a stage is "+
+                                               "slower than in its baseline.")
+    parser.add_argument("--records","-n",help="Number of records generated for each schema",type=int,default=10000)
+    parser.add_argument("--invalid-rate",help="Proportion of invalid records",type=float,default=0.1)
+    parser.add_argument("--depth",help="Maximum nesting of objects and arrays (unless required by the schema)",type=int,default=5)
+    parser.add_argument("--size",help="Usual number of elements of arrays and objects and length of strings",type=int,default=5)
+    parser.add_argument("--seed",help="Seed of the random generator",type=int,default=0)
+    parser.add_argument("--repeat",help="Number of times each stage is run, the best time being kept",type=int,default=3)
+    parser.add_argument("--baselines",help="Directory of the baselines, one JSON file for each schema",metavar="DIR")
+    parser.add_argument("--save",help="Save the results as the new baselines",action="store_true")
+    parser.add_argument("--tolerance",help="Fraction of the throughput of a baseline that can be lost without being reported",
+                        type=float,default=0.1)
+    parser.add_argument("schemas",help="JSON-rnc files of the schemas",nargs="*")
+    args=parser.parse_args()
+    if args.save and args.baselines==None:
+        parser.error("--save needs a --baselines directory")
+    params={"records":args.records,"invalidRate":args.invalid_rate,"depth":args.depth,"size":args.size,
+            "seed":args.seed,"repeat":args.repeat}
+    schemaFiles=args.schemas or sorted(glob.glob(os.path.join(testsDir,"*.jsonrnc")))
+    slower=[]
+    for schemaFile in schemaFiles:
+        validator=getValidator(schemaFile)
+        if validator==None:continue
+        name=os.path.basename(schemaFile)[:-len(".jsonrnc")] if schemaFile.endswith(".jsonrnc") else os.path.basename(schemaFile)
+        results=benchmark(validator,params)
+        baselineFile=None if args.baselines==None else os.path.join(args.baselines,name+".json")
+        baseline=None
+        if baselineFile!=None and os.path.exists(baselineFile):
+            with open(baselineFile) as f:
+                baseline=json.load(f)
+        slower+=[name+":"+stage for stage in printResults(name,results,baseline,args.tolerance)]
+        if args.save:
+            os.makedirs(args.baselines,exist_ok=True)
+            saveBaseline(baselineFile,results)
+    if len(slower)>0:
+        print ("Slower than the baselines: "+", ".join(slower))
+        exit(1)
@@ -0,0 +1,32 @@
+#!/usr/local/bin/python3
+# coding=utf-8
+
+####### Checkpoints of a long validation for resuming it after it has been stopped
+###  the state of the validation (position in the input, counters, error statistics) is saved in a file
+###  that is replaced atomically, so that a validation killed while saving keeps its previous checkpoint
+########################################################################
+
+import pickle,os
+
+## seconds between checkpoints
+checkpointInterval=60
+
+## save the state (a dict) of a validation by writing a temporary file renamed as fileName
+def saveCheckpoint(fileName,state):
+    tmpFileName=fileName+".tmp"
+    with open(tmpFileName,"wb") as f:
+        pickle.dump(state,f,pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmpFileName,fileName)
+
+## state saved in a checkpoint file, None when there is none
+def loadCheckpoint(fileName):
+    if not os.path.exists(fileName):return None
+    with open(fileName,"rb") as f:
+        return pickle.load(f)
+
+## remove a checkpoint file once the validation is done
+def removeCheckpoint(fileName):
+    if os.path.exists(fileName):
+        os.remove(fileName)
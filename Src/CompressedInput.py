@@ -0,0 +1,116 @@
+#!/usr/local/bin/python3
+# coding=utf-8
+
+####### Reading of inputs that may be compressed with gzip, bz2 or xz
+###  the compression is detected by the magic bytes at the start of the input which is decompressed
+###  by large blocks in a thread of its own, so that decompression overlaps with the validation
+########################################################################
+
+import io,sys,threading,queue,gzip
+
+## size of the blocks of decompressed bytes
+blockSize=1<<20
+
+## maximum number of decompressed blocks waiting to be read
+maxBlocks=4
+
+## modules decompressing a file starting with the magic bytes, bz2 and lzma may be missing in some Python builds
+compressions=[(b"\x1f\x8b",gzip)]
+try:
+    import bz2
+    compressions.append((b"BZh",bz2))
+except ImportError:
+    pass
+try:
+    import lzma
+    compressions.append((b"\xfd7zXZ\x00",lzma))
+except ImportError:
+    pass
+
+## module for decompressing a buffered binary file according to its first bytes, None when it is not compressed
+def compressionModule(f):
+    head=f.peek(6)[:6]
+    for (magic,module) in compressions:
+        if head.startswith(magic):
+            return module
+    return None
+
+class DecompressingReader(io.RawIOBase):
+    """raw binary stream of the decompressed bytes of a file, the decompression being done by a thread
+       that puts the decompressed blocks in a bounded queue"""
+    def __init__(self,f,module):
+        self.f=f
+        self.blocks=queue.Queue(maxBlocks)
+        self.block=b""
+        self.pos=0
+        self.eof=False
+        self.stopped=threading.Event()
+        self.thread=threading.Thread(target=self.decompress,args=(module,),daemon=True)
+        self.thread.start()
+
+    ## put the decompressed blocks in the queue, then an empty block at the end or the exception raised
+    def decompress(self,module):
+        try:
+            with module.open(self.f,"rb") as df:
+                while not self.stopped.is_set():
+                    block=df.read(blockSize)
+                    self.put(block)
+                    if len(block)==0:break
+        except Exception as err:
+            self.put(err)
+
+    def put(self,item):
+        while not self.stopped.is_set():
+            try:
+                self.blocks.put(item,timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def readable(self):
+        return True
+
+    def readinto(self,b):
+        while self.pos==len(self.block):
+            if self.eof:return 0
+            block=self.blocks.get()
+            if isinstance(block,Exception):
+                self.eof=True
+                raise block
+            if len(block)==0:
+                self.eof=True
+                return 0
+            (self.block,self.pos)=(block,0)
+        n=min(len(b),len(self.block)-self.pos)
+        b[:n]=self.block[self.pos:self.pos+n]
+        self.pos+=n
+        return n
+
+    def close(self):
+        if not self.closed:
+            self.stopped.set()
+            self.thread.join()
+            self.f.close()
+        super().close()
+
+## binary (bytes) or text stream of the content of a buffered binary file decompressed when needed
+def decompressedInput(f,binary):
+    module=compressionModule(f)
+    if module!=None:
+        f=io.BufferedReader(DecompressingReader(f,module),blockSize)
+    return f if binary else io.TextIOWrapper(f)
+
+## open a file that may be compressed for reading its content as bytes or as text
+def openInput(fileName,binary=False):
+    return decompressedInput(open(fileName,"rb"),binary)
+
+## True when a file is compressed
+def isCompressed(fileName):
+    with open(fileName,"rb") as f:
+        return compressionModule(f)!=None
+
+## stdin as bytes or as text decompressed when needed
+def stdinInput(binary=False):
+    if compressionModule(sys.stdin.buffer)==None:
+        return sys.stdin.buffer if binary else sys.stdin
+    return decompressedInput(sys.stdin.buffer,binary)
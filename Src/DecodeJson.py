@@ -0,0 +1,93 @@
+#!/usr/local/bin/python3
+# coding=utf-8
+
+####### Decoding of the JSON text of a record with a check of duplicate keys
+###  the text is decoded by the fastest decoder available without checking duplicate keys
+###  it is decoded again with a check of each object only when it might contain a duplicate key
+########################################################################
+
+import json
+
+# detect possible duplicate pairs in a Json object
+# adapted from http://stackoverflow.com/questions/16172011/json-in-python-receive-check-duplicate-key-error
+def duplicate_check_hook(pairs):
+    result = dict()
+    for key,val in pairs:
+        if key in result:
+            raise KeyError("duplicate key: "+key)
+        result[key]=val
+    return result
+
+## decoders of a str or bytes json text that do not check duplicate keys
+#  a decoder from an optional module is used when it is installed
+jsonDecoders={"json":json.loads}
+try:
+    import orjson
+    jsonDecoders["orjson"]=orjson.loads
+except ImportError:
+    pass
+
+fastLoads=jsonDecoders.get("orjson",json.loads)
+
+def setJsonDecoder(name):
+    global fastLoads
+    fastLoads=jsonDecoders[name]
+
+## number of keys of all the objects within a json value
+def countKeys(value):
+    nbKeys=0
+    stack=[value]
+    while len(stack)>0:
+        value=stack.pop()
+        if type(value) is dict:
+            nbKeys+=len(value)
+            for v in value.values():
+                if type(v) is dict or type(v) is list:
+                    stack.append(v)
+        elif type(value) is list:
+            for v in value:
+                if type(v) is dict or type(v) is list:
+                    stack.append(v)
+    return nbKeys
+
+## number of colons within the strings (keys and values) of a json value
+def countStringColons(value):
+    nbColons=0
+    stack=[value]
+    while len(stack)>0:
+        value=stack.pop()
+        if type(value) is dict:
+            for (k,v) in value.items():
+                nbColons+=k.count(":")
+                stack.append(v)
+        elif type(value) is list:
+            stack.extend(value)
+        elif type(value) is str:
+            nbColons+=value.count(":")
+    return nbColons
+
+###
+#  decode the json text (a str or bytes) of a record
+#  raises ValueError with the message of the json module for an invalid text and KeyError for a duplicate key
+#
+#  Each key is followed by a colon in the text, so there cannot be a duplicate key when the text has no
+#  more colons than the number of keys of the decoded objects. The colons within the decoded strings are
+#  then discounted, unless a colon is written with an escape in the text. A text that still has more colons
+#  is decoded again with the check of duplicate keys.
+def decodeJson(inJson):
+    try:
+        obj=fastLoads(inJson)
+    except ValueError: # the error is given by the json module (that may also accept the text, e.g. NaN)
+        return json.loads(inJson,object_pairs_hook=duplicate_check_hook)
+    if type(obj) is not dict and type(obj) is not list:
+        return obj
+    if isinstance(inJson,str):
+        (colon,escapedColon)=(":","\\u003")
+    else:
+        (colon,escapedColon)=(b":",b"\\u003")
+    nbColons=inJson.count(colon)
+    if nbColons>0:
+        nbKeys=countKeys(obj)
+        if nbColons>nbKeys and (escapedColon in inJson or nbColons-countStringColons(obj)>nbKeys):
+            json.loads(inJson,object_pairs_hook=duplicate_check_hook) # raises KeyError on a duplicate key
+    return obj
@@ -0,0 +1,85 @@
+#!/usr/local/bin/python3
+# coding=utf-8
+
+####### Statistics of the kinds of errors of the validated records within a bounded memory
+###  a kind of error is a normalized json path with an error message (e.g. "phoneNumber/[]/code:integer expected:").
+###  The occurrences of the kinds are counted with the Space-Saving algorithm (Metwally, Agrawal and El Abbadi, 2005):
+###  at most maxKinds kinds are counted, a new kind replacing the least frequent one whose count it inherits, so that
+###  noisy data does not fill the memory while the frequent kinds are still found, their count being over-estimated
+###  by at most the count of the kind they replaced (0 as long as no kind has been replaced).
+###  A few ids of records are kept as examples of each kind.
+########################################################################
+
+## maximum number of kinds of errors counted
+maxKinds=1000
+
+## number of ids of records kept as examples of each kind of error
+maxExamples=3
+
+class ErrorCounter:
+    """counts of the kinds of errors, at most capacity kinds being counted"""
+    def __init__(self,capacity=None):
+        self.capacity=maxKinds if capacity==None else capacity
+        self.counts={}   # kind => count, in the order of the first occurrence of the kinds
+        self.errors={}   # kind => maximum over-estimation of its count
+        self.examples={} # kind => list of ids of records
+        self.buckets={}  # count => dict of the kinds with this count (as keys), the oldest first
+        self.minCount=0  # smallest count of a kind when capacity kinds are counted
+
+    ## add nb occurrences of a kind of error found in the record identified by recordId (when not None)
+    def add(self,kind,recordId=None,nb=1):
+        count=self.counts.get(kind)
+        if count==None:
+            if len(self.counts)<self.capacity:
+                (count,error)=(0,0)
+            else: # replace a kind with the smallest count
+                count=self.minCount
+                bucket=self.buckets[count]
+                replaced=next(iter(bucket))
+                self.remove(replaced,count)
+                del self.counts[replaced]
+                del self.errors[replaced]
+                del self.examples[replaced]
+                error=count
+            self.errors[kind]=error
+            self.examples[kind]=[]
+        else:
+            self.remove(kind,count)
+        count+=nb
+        self.counts[kind]=count
+        self.buckets.setdefault(count,{})[kind]=None
+        if len(self.counts)==1 or count<self.minCount or self.minCount not in self.buckets:
+            self.minCount=min(self.buckets)
+        examples=self.examples[kind]
+        if recordId!=None and len(examples)<maxExamples and recordId not in examples: # a record can have many errors of a kind
+            examples.append(recordId)
+
+    ## remove a kind from the bucket of its count
+    def remove(self,kind,count):
+        bucket=self.buckets[count]
+        del bucket[kind]
+        if len(bucket)==0:
+            del self.buckets[count]
+
+    ## add the counts of another ErrorCounter or of a dict kind => count
+    def merge(self,other):
+        if isinstance(other,dict):
+            for (kind,count) in other.items():
+                self.add(kind,None,count)
+            return
+        for (kind,count) in other.counts.items():
+            self.add(kind,None,count)
+            self.errors[kind]+=other.errors[kind]
+            examples=self.examples[kind]
+            examples.extend([recordId for recordId in other.examples[kind] if recordId not in examples][:maxExamples-len(examples)])
+
+    ## list of (kind,count) from the most frequent kind, the kinds with the same count in the order of their first occurrence
+    def items(self):
+        return sorted(self.counts.items(),key=lambda i:i[1],reverse=True)
+
+    ## largest over-estimation of a count, 0 when no kind has been replaced
+    def maxError(self):
+        return max(self.errors.values(),default=0)
+
+    def __len__(self):
+        return len(self.counts)
@@ -0,0 +1,227 @@
+#!/usr/local/bin/python3
+# coding=utf-8
+
+####### Generation of random JSON records according to a JSON-rnc schema
+###  valid records are built by following the schema (alternatives, facets, optional fields, patterns) and invalid
+###  ones by changing a value of a valid record, each record being checked by the validator so that the rate of
+###  invalid records is the one asked for. Used for benchmarking the validator on data of any size.
+########################################################################
+
+import random,string,json,argparse
+from ValidateJsonObject import resolveRef
+
+try:
+    import re._parser as regexParser # sre_parse is deprecated since python 3.11
+except ImportError:
+    import sre_parse as regexParser
+
+## characters of the generated strings
+printable=string.ascii_letters+string.digits
+
+## number of tries for building a record that is valid (or invalid) as asked
+maxTries=20
+
+## characters that can match a character set of a regex (the items of an IN node of the parsed regex)
+def charSet(items):
+    chars=set()
+    negate=False
+    for (op,av) in items:
+        if op==regexParser.NEGATE:
+            negate=True
+        elif op==regexParser.LITERAL:
+            chars.add(chr(av))
+        elif op==regexParser.RANGE:
+            chars.update(chr(c) for c in range(av[0],min(av[1],av[0]+255)+1))
+        elif op==regexParser.CATEGORY:
+            if av==regexParser.CATEGORY_DIGIT:
+                chars.update(string.digits)
+            elif av==regexParser.CATEGORY_SPACE:
+                chars.add(" ")
+            elif av==regexParser.CATEGORY_WORD:
+                chars.update(printable+"_")
+            else:
+                chars.update(printable)
+    if negate:
+        chars=set(printable)-chars
+    return sorted(chars)
+
+## random string matching a regex, the repetitions being done at most size times more than their minimum
+#  raises ValueError for the regex constructs that are not handled (e.g. backreferences)
+def regexString(rand,pattern,size):
+    out=[]
+    def gen(items):
+        for (op,av) in items:
+            if op==regexParser.LITERAL:
+                out.append(chr(av))
+            elif op==regexParser.NOT_LITERAL:
+                out.append(rand.choice(printable.replace(chr(av),"")))
+            elif op==regexParser.ANY:
+                out.append(rand.choice(printable))
+            elif op==regexParser.IN:
+                out.append(rand.choice(charSet(av)))
+            elif op==regexParser.BRANCH:
+                gen(rand.choice(av[1]))
+            elif op==regexParser.SUBPATTERN:
+                gen(av[-1])
+            elif op in (regexParser.MAX_REPEAT,regexParser.MIN_REPEAT):
+                (low,high,item)=av
+                for i in range(rand.randint(low,min(high,low+size))):
+                    gen(item)
+            elif op==regexParser.AT:
+                pass
+            else:
+                raise ValueError("regex construct not handled:"+str(op))
+    gen(regexParser.parse(pattern))
+    return "".join(out)
+
+class JsonGenerator:
+    """generator of random values according to a JSON schema, the nesting of objects and arrays being
+       at most maxDepth unless required by the schema, size being the usual number of elements of arrays and
+       of objects with arbitrary keys (and the length of strings), a validator checking the generated records"""
+    def __init__(self,validator,maxDepth=5,size=5,seed=0):
+        self.validator=validator
+        self.rootSchema=validator.schema
+        self.maxDepth=maxDepth
+        self.size=size
+        self.rand=random.Random(seed)
+
+    ## random value of a schema at a depth of nesting
+    def value(self,schema,depth=0):
+        rand=self.rand
+        if "$ref" in schema:
+            schema=resolveRef(schema,self.rootSchema)
+        if "oneOf" in schema:
+            alternatives=schema["oneOf"]
+            if depth>=self.maxDepth: # avoid nesting when possible
+                leaves=[alt for alt in alternatives if self.isLeaf(alt)]
+                if len(leaves)>0:
+                    alternatives=leaves
+            return self.value(rand.choice(alternatives),depth)
+        theType=schema.get("type")
+        if theType=="string":
+            return self.stringValue(schema)
+        if theType=="integer" or theType=="number":
+            return self.numberValue(schema,theType=="integer")
+        if theType=="boolean":
+            return rand.random()<0.5
+        if theType=="null":
+            return None
+        if theType=="object":
+            return self.objectValue(schema,depth)
+        if theType=="array":
+            low=schema.get("minItems",0)
+            high=schema.get("maxItems",low if depth>=self.maxDepth else low+self.size)
+            if "items" not in schema:
+                return [rand.randint(0,100) for i in range(low)]
+            return [self.value(schema["items"],depth+1) for i in range(rand.randint(low,high))]
+        return None
+
+    ## True when a schema is neither an object, an array nor an alternative, i.e. its values have no nesting
+    def isLeaf(self,schema):
+        if "$ref" in schema:
+            schema=resolveRef(schema,self.rootSchema)
+        return "oneOf" not in schema and schema.get("type") not in ("object","array")
+
+    def stringValue(self,schema):
+        rand=self.rand
+        if "pattern" in schema:
+            try:
+                return regexString(rand,schema["pattern"],self.size)
+            except ValueError:
+                pass # the record is checked by the validator
+        low=schema.get("minLength",1)
+        high=schema.get("maxLength",low+2*self.size)
+        return "".join(rand.choice(printable) for i in range(rand.randint(low,max(low,high))))
+
+    def numberValue(self,schema,isInteger):
+        low=schema.get("minimum",schema.get("exclusiveMinimum",-1000))
+        high=schema.get("maximum",schema.get("exclusiveMaximum",low+2000))
+        if isInteger:
+            low=int(low)+1 if "exclusiveMinimum" in schema else int(low)
+            high=int(high)-1 if "exclusiveMaximum" in schema else int(high)
+            return self.rand.randint(low,max(low,high))
+        value=round(self.rand.uniform(low,high),3)
+        if value<=low and "exclusiveMinimum" in schema or value>=high and "exclusiveMaximum" in schema:
+            value=(low+high)/2
+        return value
+
+    def objectValue(self,schema,depth):
+        rand=self.rand
+        additionalProperties=schema.get("additionalProperties")
+        if type(additionalProperties) is dict: # arbitrary keys
+            low=schema.get("minProperties",0)
+            high=schema.get("maxProperties",low if depth>=self.maxDepth else low+self.size)
+            return {"k%d"%i:self.value(additionalProperties,depth+1) for i in range(rand.randint(low,high))}
+        obj={}
+        required=set(schema.get("required",[]))
+        for (field,prop) in schema.get("properties",{}).items():
+            if field in required or (depth<self.maxDepth and rand.random()<0.5):
+                obj[field]=self.value(prop,depth+1)
+        return obj
+
+    ## value of a different type replacing a value of a record
+    def wrongValue(self,value):
+        if type(value) is dict:
+            if len(value)>0 and self.rand.random()<0.5:
+                value=dict(value)
+                del value[self.rand.choice(list(value))] # may remove a required field
+                return value
+            return dict(value,unexpected_field=1)
+        return self.rand.choice([v for v in ["wrong",-1,12.5,True,None,[],{}] if type(v) is not type(value)])
+
+    ## record built by replacing a random value (at any depth) of a record by a wrong value
+    def changedRecord(self,record):
+        paths=[]
+        def collect(value,path):
+            paths.append(path)
+            if type(value) is dict:
+                for field in value:
+                    collect(value[field],path+[field])
+            elif type(value) is list:
+                for (i,elem) in enumerate(value):
+                    collect(elem,path+[i])
+        collect(record,[])
+        path=self.rand.choice(paths)
+        if len(path)==0:
+            return self.wrongValue(record)
+        record=json.loads(json.dumps(record)) # deep copy
+        parent=record
+        for sel in path[:-1]:
+            parent=parent[sel]
+        parent[path[-1]]=self.wrongValue(parent[path[-1]])
+        return record
+
+    ## (record,isValid) where the record is valid or invalid as asked whenever it can be within maxTries tries
+    def record(self,valid=True):
+        for i in range(maxTries):
+            record=self.value(self.rootSchema)
+            if self.validator.errors(record)!="":
+                continue
+            if valid:
+                return (record,True)
+            for j in range(maxTries):
+                changed=self.changedRecord(record)
+                if self.validator.errors(changed)!="":
+                    return (changed,False)
+        return (record,self.validator.errors(record)=="")
+
+    ## list of nb (record,isValid) with about invalidRate invalid ones
+    def records(self,nb,invalidRate):
+        return [self.record(self.rand.random()>=invalidRate) for i in range(nb)]
+
+if __name__ == '__main__':
+    parser=argparse.ArgumentParser(description="Generate random JSON lines according to a JSON-rnc schema")
+    parser.add_argument("--records","-n",help="Number of records",type=int,default=100)
+    parser.add_argument("--invalid-rate",help="Proportion of invalid records",type=float,default=0.1)
+    parser.add_argument("--depth",help="Maximum nesting of objects and arrays (unless required by the schema)",type=int,default=5)
+    parser.add_argument("--size",help="Usual number of elements of arrays and objects and length of strings",type=int,default=5)
+    parser.add_argument("--seed",help="Seed of the random generator, the same records being generated for the same seed",type=int,default=0)
+    parser.add_argument("schema",help="name of file containing the schema")
+    args=parser.parse_args()
+    from ValidateJsonRnc import getValidator
+    validator=getValidator(args.schema)
+    if validator==None:
+        exit(1)
+    generator=JsonGenerator(validator,args.depth,args.size,args.seed)
+    for (record,isValid) in generator.records(args.records,args.invalid_rate):
+        print (json.dumps(record,ensure_ascii=False))
@@ -11,8 +11,9 @@
 ###     - update README
 ########################################################################
 
-import sys,re,json,codecs,datetime,argparse,os
+import sys,re,json,codecs,datetime,argparse,os,hashlib,threading
 from ppJson             import ppJson
+from ValidateJsonObject import Validator
 
 ## flags for debugging
 traceParse=False
@@ -110,346 +111,413 @@ class Token:
 #               | '"' , character , { character } , '"' ;
 # value       = number | string | "true" | "false" | "null";
 
-## global shared variables for the parser functions 
-schema = {
-    "$schema":"http://json-schema.org/draft-07/schema#",
-    "definitions":{}
-    }
-
-defs = schema["definitions"]
-refs = set([])
-
-token=None
-tokenizer=None
-lines=["**dummy**"] # lines of the input kept for error messages, line 0 added to make line numbers start at one...
-errorsInSchema=0
-
-def errorJsrnc(module,message,recoveryTokens):
-    global lines,token,tokenizer,errorsInSchema,traceParse
-    if traceParse:print( ">>>errorJsrnc:"+module)
-    errorsInSchema+=1
-    line = lines[token.line_num] if token.line_num<len(lines) else ""
-    print ("line %3d: %s"%(token.line_num,line),end='')
-    print (((token.column+10)*" ")+"↑:"+message)
-    if recoveryTokens!=None:
-        endTokens=set(["EOF"]+recoveryTokens)
-        while token.kind not in endTokens:
-            token=next(tokenizer)
+class JsonRncError:
+    """error found while parsing a JSON-rnc schema at a column of a line (numbered from 1) of its text,
+       line_num being 0 for an error found while compiling the schema (e.g. a left recursive definition)"""
+    def __init__(self,line_num,column,line,message):
+        self.line_num=line_num
+        self.column=column
+        self.line=line
+        self.message=message
 
-# definitions = "start" = type | {definition} ;
-# definition  = (identifier | string ) , ["=" , types] ;
-def parseDef(): ## modifies the global schema variable
-    global token, tokenizer,defs, refs, schema,traceParse
-    if traceParse:print (">>>parseDef:"+str(token))
-    is_start=False
-    typedef=None
-    if token.kind in set(["IDENT","STR","START"]):
-        is_start=token.kind=="START"
-        ident=token.value[1:-1] if token.kind=="STR" else token.value
-    else:
-        errorJsrnc("parseDef","identifier expected at start of definition",["IDENT"])
-        ident="**dummy**"
-    token=next(tokenizer)
-    if token.kind=="EQUAL":
-        token=next(tokenizer)
-    else:
-        errorJsrnc("parseDef","equal expected in a definition",None)
-    typedef = parseTypes()
-    if ident in defs:
-        errorJsrnc("parseDef","double definition for "+ident,None)
-    if typedef!=None:
-        if is_start:
-            schema.update(typedef)
+    ## the line of the error followed by an arrow pointing at the column of the error
+    def __str__(self):
+        if self.line_num==0:
+            return "schema: "+self.message
+        return "line %3d: %s"%(self.line_num,self.line)+((self.column+10)*" ")+"↑:"+self.message
+
+    def __repr__(self):
+        return "JsonRncError(%d,%d,%r)"%(self.line_num,self.column,self.message)
+
+class JsonRncParser:
+    """parser of JSON-rnc schemas whose state is kept in its own fields instead of global variables,
+       so that many parsers can be used in the same process, each one in its own thread.
+       Each call to parse starts with a new schema; the errors found are kept in the list errors and
+       are also printed when showErrors is True."""
+    def __init__(self,showErrors=False):
+        self.showErrors=showErrors
+        self.reset()
+
+    def reset(self):
+        self.schema = {
+            "$schema":"http://json-schema.org/draft-07/schema#",
+            "definitions":{}
+            }
+        self.defs = self.schema["definitions"]
+        self.refs = set([])
+        self.token=None
+        self.tokenizer=None
+        self.lines=["**dummy**"] # lines of the input kept for error messages, line 0 added to make line numbers start at one...
+        self.errors=[]
+
+    # parse jsonrnc definitions given as a string or as an iterable of lines (e.g. a file)
+    # and returns the schema or None when errors were found
+    def parse(self,jsonrncContent):
+        self.reset()
+        if isinstance(jsonrncContent,str):
+            jsonrncContent=jsonrncContent.splitlines(keepends=True)
+        for line in jsonrncContent: # must read all input for dealing with stdin
+            self.lines.append(line)
+        self.tokenizer = tokenizeRNC("".join(self.lines[1:]))
+        self.token = next(self.tokenizer)
+        try:
+            while self.token.kind!="EOF":
+                self.parseDef()
+        except StopIteration:
+            self.errorJsrnc("main","unexpected end of file",None)
+        ## check missing definitions (the schema should contains one the valid starting point of ValidateObject.validate(...))
+        if all(map(lambda t: t not in self.schema,["type","oneOf","$ref"]))  and "start" not in self.defs:
+            self.errorJsrnc("main","no start definition",None)
+        for ref in self.refs:
+            if ref not in self.defs:
+                self.errorJsrnc("main","no definition found for "+ref,None)
+        return self.schema if len(self.errors)==0 else None
+
+    # parse the jsonrnc definitions of a file
+    def parseFile(self,fileName):
+        with open(fileName,encoding="utf-8") as f:
+            return self.parse(f)
+
+    def errorJsrnc(self,module,message,recoveryTokens):
+        if traceParse:print( ">>>errorJsrnc:"+module)
+        line = self.lines[self.token.line_num] if self.token.line_num<len(self.lines) else ""
+        error=JsonRncError(self.token.line_num,self.token.column,line,message)
+        self.errors.append(error)
+        if self.showErrors:print(error)
+        if recoveryTokens!=None:
+            endTokens=set(["EOF"]+recoveryTokens)
+            while self.token.kind not in endTokens:
+                self.token=next(self.tokenizer)
+
+    # definitions = "start" = type | {definition} ;
+    # definition  = (identifier | string ) , ["=" , types] ;
+    def parseDef(self): ## modifies the schema of the parser
+        if traceParse:print (">>>parseDef:"+str(self.token))
+        is_start=False
+        typedef=None
+        if self.token.kind in set(["IDENT","STR","START"]):
+            is_start=self.token.kind=="START"
+            ident=self.token.value[1:-1] if self.token.kind=="STR" else self.token.value
         else:
-            defs[ident]= typedef
-    if traceParse:ident+"="+json.dumps(typedef,indent=3)
-    return
-
-## types       = type , ( {"," , type} | {"|" , type} ) ;
-def parseTypes(): ## =>  
-    global token,tokenizer, traceParse
-    if traceParse:print ("<<parseTypes:"+str(token))
-    res = parseType()
-    if token.kind=="COMMA":
-        res1=res
-        res={res1}
-        while token.kind=="COMMA":
-            token=next(tokenizer)
-            res1.update(parseType())
-    elif token.kind=="VERT_BAR":
-        res1=[res]
-        res={"oneOf":res1}
-        while token.kind=="VERT_BAR":
-            token=next(tokenizer)
-            res1.append(parseType())
-    if traceParse:print (">>parseTypes:"+str(res))
-    return res
-
-## type        = ("string" | "integer" | "number" | "boolean" | "null"     (* primitive types *)
-##                | identifier | string                                    (* name of a user defined type *)
-##                | "/", character-"/" , "/"                               (* regular expression without a slash *)
-##               ) , [facets]
-##               | "{" , [properties] , "}"                                (* object *)
-##               | "[" , [types]  , "]"                                     (* array *)
-##               | "(" , types   , ")" ;                                   (* grouping *)
-def parseType():
-    global token,tokenizer,traceParse,refs
-    if traceParse:print ("<<parseType:"+str(token))
-    res=None
-    if token.kind in set(["STRING","INTEGER","NUMBER","BOOLEAN","NULL"]):
-        res={"type":token.value}
-        token=next(tokenizer)
-        res=checkFacets(res)
-    elif token.kind == "IDENT": 
-        res={"$ref":"#/definitions/"+token.value}
-        refs.add(token.value)
-        token=next(tokenizer)
-        res=checkFacets(res)
-    elif token.kind == "STR":
-        res={"$ref":"#/definitions/"+token.value[1:-1]}
-        refs.add(token.value[1:-1])
-        token=next(tokenizer)
-        res=checkFacets(res)
-    elif token.kind == "REGEX":
-        res = {"type":"string","pattern":token.value[1:-1]}
-        token=next(tokenizer)
-        res=checkFacets(res)
-    elif token.kind == "OPEN_BRACE":
-        token=next(tokenizer)
-        if token.kind == "CLOSE_BRACE": # skip object validation on {}
-            token=next(tokenizer)
-            res={"type":"object"}
-            res=checkFacets(res)
+            self.errorJsrnc("parseDef","identifier expected at start of definition",["IDENT"])
+            ident="**dummy**"
+        self.token=next(self.tokenizer)
+        if self.token.kind=="EQUAL":
+            self.token=next(self.tokenizer)
         else:
-            (props,required,additionalProperties)=mergeProps(parseProps())
-            res = {"type":"object","required":required,"additionalProperties":additionalProperties}
-            if len(props)>0:res["properties"]=props
-            if token.kind == "CLOSE_BRACE":
-                token=next(tokenizer)
-                res=checkFacets(res)
+            self.errorJsrnc("parseDef","equal expected in a definition",None)
+        typedef = self.parseTypes()
+        if ident in self.defs:
+            self.errorJsrnc("parseDef","double definition for "+ident,None)
+        if typedef!=None:
+            if is_start:
+                self.schema.update(typedef)
             else:
-                errorJsrnc("parseType","closing brace expected",["CLOSE_BRACE"])
-    elif token.kind == "OPEN_BRACKET":
-        token=next(tokenizer)
-        if token.kind == "CLOSE_BRACKET": ## skip array validation on []
-            token=next(tokenizer)
-            res={"type":"array"}
-            res=checkFacets(res)
-        else:
-            res = {"type":"array","items":parseTypes()}
-            if token.kind == "CLOSE_BRACKET":
-                token=next(tokenizer)
-                res=checkFacets(res)
+                self.defs[ident]= typedef
+        if traceParse:ident+"="+json.dumps(typedef,indent=3)
+        return
+
+    ## types       = type , ( {"," , type} | {"|" , type} ) ;
+    def parseTypes(self): ## =>  
+        if traceParse:print ("<<parseTypes:"+str(self.token))
+        res = self.parseType()
+        if self.token.kind=="COMMA":
+            res1=res
+            res={res1}
+            while self.token.kind=="COMMA":
+                self.token=next(self.tokenizer)
+                res1.update(self.parseType())
+        elif self.token.kind=="VERT_BAR":
+            res1=[res]
+            res={"oneOf":res1}
+            while self.token.kind=="VERT_BAR":
+                self.token=next(self.tokenizer)
+                res1.append(self.parseType())
+        if traceParse:print (">>parseTypes:"+str(res))
+        return res
+
+    ## type        = ("string" | "integer" | "number" | "boolean" | "null"     (* primitive types *)
+    ##                | identifier | string                                    (* name of a user defined type *)
+    ##                | "/", character-"/" , "/"                               (* regular expression without a slash *)
+    ##               ) , [facets]
+    ##               | "{" , [properties] , "}"                                (* object *)
+    ##               | "[" , [types]  , "]"                                     (* array *)
+    ##               | "(" , types   , ")" ;                                   (* grouping *)
+    def parseType(self):
+        if traceParse:print ("<<parseType:"+str(self.token))
+        res=None
+        if self.token.kind in set(["STRING","INTEGER","NUMBER","BOOLEAN","NULL"]):
+            res={"type":self.token.value}
+            self.token=next(self.tokenizer)
+            res=self.checkFacets(res)
+        elif self.token.kind == "IDENT": 
+            res={"$ref":"#/definitions/"+self.token.value}
+            self.refs.add(self.token.value)
+            self.token=next(self.tokenizer)
+            res=self.checkFacets(res)
+        elif self.token.kind == "STR":
+            res={"$ref":"#/definitions/"+self.token.value[1:-1]}
+            self.refs.add(self.token.value[1:-1])
+            self.token=next(self.tokenizer)
+            res=self.checkFacets(res)
+        elif self.token.kind == "REGEX":
+            res = {"type":"string","pattern":self.token.value[1:-1]}
+            self.checkPattern(res["pattern"])
+            self.token=next(self.tokenizer)
+            res=self.checkFacets(res)
+        elif self.token.kind == "OPEN_BRACE":
+            self.token=next(self.tokenizer)
+            if self.token.kind == "CLOSE_BRACE": # skip object validation on {}
+                self.token=next(self.tokenizer)
+                res={"type":"object"}
+                res=self.checkFacets(res)
+            else:
+                (props,required,additionalProperties)=self.mergeProps(self.parseProps())
+                res = {"type":"object","required":required,"additionalProperties":additionalProperties}
+                if len(props)>0:res["properties"]=props
+                if self.token.kind == "CLOSE_BRACE":
+                    self.token=next(self.tokenizer)
+                    res=self.checkFacets(res)
+                else:
+                    self.errorJsrnc("parseType","closing brace expected",["CLOSE_BRACE"])
+        elif self.token.kind == "OPEN_BRACKET":
+            self.token=next(self.tokenizer)
+            if self.token.kind == "CLOSE_BRACKET": ## skip array validation on []
+                self.token=next(self.tokenizer)
+                res={"type":"array"}
+                res=self.checkFacets(res)
             else:
-                errorJsrnc("parseType","closing bracket expected",["CLOSE_BRACKET"])
-    elif token.kind == "OPEN_PAREN":
-        token=next(tokenizer)
-        res = parseTypes()
-        if token.kind == "CLOSE_PAREN":
-            token=next(tokenizer)
+                res = {"type":"array","items":self.parseTypes()}
+                if self.token.kind == "CLOSE_BRACKET":
+                    self.token=next(self.tokenizer)
+                    res=self.checkFacets(res)
+                else:
+                    self.errorJsrnc("parseType","closing bracket expected",["CLOSE_BRACKET"])
+        elif self.token.kind == "OPEN_PAREN":
+            self.token=next(self.tokenizer)
+            res = self.parseTypes()
+            if self.token.kind == "CLOSE_PAREN":
+                self.token=next(self.tokenizer)
+            else:
+                self.errorJsrnc("parseType","closing parenthesis expected",["CLOSE_PAREN"])
         else:
-            errorJsrnc("parseType","closing parenthesis expected",["CLOSE_PAREN"])
-    else:
-        errorJsrnc("parseType","ident or json type expected",["IDENT","STR"])
-    if traceParse:print (">>parseType:"+str(res)    )
-    return res
-
-def mergeProps(props):
-    if traceParse: print ("<<mergeProp:"+str(props))
-    res={}
-    if props==None:return res
-    required=[]
-    additionalPropertiesFound=False;
-    if type(props) is not list:
-        props=[props]
-    for po in props:
-        if po!=None and type(po) is tuple: ## None can happen in case of a schema error
-            (prop,optional,additionalProp)=po
-            keys=prop.keys()
-            if len(keys)>0:
-                key=list(keys)[0]
-                if key in res:
-                    errorJsrnc("mergeProps","repeated property name:"+key,None)
-                res.update(prop)
-                if not(optional):
-                    required.append(key)
-            if additionalProp != False:
-                additionalPropertiesFound=additionalProp
-    if traceParse: print (">>mergeProp:"+str((res,required)))
-    return (res,required,additionalPropertiesFound)
+            self.errorJsrnc("parseType","ident or json type expected",["IDENT","STR"])
+        if traceParse:print (">>parseType:"+str(res)    )
+        return res
 
-# properties  = property , {[","] , property} ;
-def parseProps(): ## => [{id:"nom",type:...,(optional:True)?}]
-    global token,tokenizer,traceParse
-    if traceParse:print ("<<parseProps:"+str(token))
-    res = [parseProp()]
-    while token.kind in ["COMMA","IDENT","STR","OPEN_PAREN"]:
-        if token.kind=="COMMA": token=next(tokenizer)
-        res.append(parseProp())
-    if traceParse:print (">>parseProps:"+str(res))
-    return res
-
-# property    = (identifier , ["?"] , ":" , type| "*")  | "(" , properties , ")" ;
-def parseProp(): ## => ({ident:type},optional[boolean],additionalProperty) | None
-    global token, tokenizer,traceParse,refs
-    if traceParse:print ("<<parseProp:"+str(token))
-    res=None
-    if token.kind in ["IDENT","STR"]:
-        ident=token.value if token.kind == "IDENT" else token.value[1:-1] # remove outer quotes
-        token=next(tokenizer)
-        optional=False
-        parsedType=None
-        if token.kind =="INTERROGATION":
-            optional=True
-            token=next(tokenizer)
-        if token.kind == "COLON":
-            token=next(tokenizer)
-            parsedType=parseType()
-        res=({ident:parsedType},optional,False)
-    elif token.kind=="STAR":
-        token=next(tokenizer)
-        if token.kind == "COLON":
-            token=next(tokenizer)
-            res=({},False,parseType())
-        else:
-            errorJsrnc("parseProp","colon expected after *",["IDENT","STR"])
-    elif token.kind=="OPEN_PAREN":
-        token=next(tokenizer)
-        res = parseProps()
-        if token.kind == "CLOSE_PAREN":
-            token=next(tokenizer)
+    def mergeProps(self,props):
+        if traceParse: print ("<<mergeProp:"+str(props))
+        res={}
+        if props==None:return res
+        required=[]
+        additionalPropertiesFound=False;
+        if type(props) is not list:
+            props=[props]
+        for po in props:
+            if po!=None and type(po) is tuple: ## None can happen in case of a self.schema error
+                (prop,optional,additionalProp)=po
+                keys=prop.keys()
+                if len(keys)>0:
+                    key=list(keys)[0]
+                    if key in res:
+                        self.errorJsrnc("mergeProps","repeated property name:"+key,None)
+                    res.update(prop)
+                    if not(optional):
+                        required.append(key)
+                if additionalProp != False:
+                    additionalPropertiesFound=additionalProp
+        if traceParse: print (">>mergeProp:"+str((res,required)))
+        return (res,required,additionalPropertiesFound)
+
+    # properties  = property , {[","] , property} ;
+    def parseProps(self): ## => [{id:"nom",type:...,(optional:True)?}]
+        if traceParse:print ("<<parseProps:"+str(self.token))
+        res = [self.parseProp()]
+        while self.token.kind in ["COMMA","IDENT","STR","OPEN_PAREN"]:
+            if self.token.kind=="COMMA": self.token=next(self.tokenizer)
+            res.append(self.parseProp())
+        if traceParse:print (">>parseProps:"+str(res))
+        return res
+
+    # property    = (identifier , ["?"] , ":" , type| "*")  | "(" , properties , ")" ;
+    def parseProp(self): ## => ({ident:type},optional[boolean],additionalProperty) | None
+        if traceParse:print ("<<parseProp:"+str(self.token))
+        res=None
+        if self.token.kind in ["IDENT","STR"]:
+            ident=self.token.value if self.token.kind == "IDENT" else self.token.value[1:-1] # remove outer quotes
+            self.token=next(self.tokenizer)
+            optional=False
+            parsedType=None
+            if self.token.kind =="INTERROGATION":
+                optional=True
+                self.token=next(self.tokenizer)
+            if self.token.kind == "COLON":
+                self.token=next(self.tokenizer)
+                parsedType=self.parseType()
+            res=({ident:parsedType},optional,False)
+        elif self.token.kind=="STAR":
+            self.token=next(self.tokenizer)
+            if self.token.kind == "COLON":
+                self.token=next(self.tokenizer)
+                res=({},False,self.parseType())
+            else:
+                self.errorJsrnc("parseProp","colon expected after *",["IDENT","STR"])
+        elif self.token.kind=="OPEN_PAREN":
+            self.token=next(self.tokenizer)
+            res = self.parseProps()
+            if self.token.kind == "CLOSE_PAREN":
+                self.token=next(self.tokenizer)
+            else:
+                self.errorJsrnc("parseProp","closing paren expected",["CLOSE_PAREN"])        
         else:
-            errorJsrnc("parseProp","closing paren expected",["CLOSE_PAREN"])        
-    else:
-        errorJsrnc("parseProp","ident, string or open parenthesis expected at the start of a prop",["IDENT","STR"])
-    if traceParse:print (">>parseProp:"+str(res))
-    return res
-
-def checkFacets(res):
-    global token,tokenizer
-    if token.kind=="AT":
-        token=next(tokenizer)
-        theType=res["type"] if "type" in res else None # TODO: try to take into account the #ref 
-        for facet in parseFacets(theType):
-            res.update(facet)
-    return res
+            self.errorJsrnc("parseProp","ident, string or open parenthesis expected at the start of a prop",["IDENT","STR"])
+        if traceParse:print (">>parseProp:"+str(res))
+        return res
 
-# taken from https://stackoverflow.com/questions/379906/how-do-i-parse-a-string-to-a-float-or-int
-# if the string corresponds to a string then return it else return a float
-def num(s):
-    try:
-        return int(s)
-    except ValueError:
-        return float(s)
+    def checkFacets(self,res):
+        if self.token.kind=="AT":
+            self.token=next(self.tokenizer)
+            theType=res["type"] if "type" in res else None # TODO: try to take into account the #ref 
+            for facet in self.parseFacets(theType):
+                res.update(facet)
+        return res
 
-# facets      = "@(" , facetId , "=" , value , {",", facetId , "=" , value } ")" ;
-# facetId     = "minimum" | "exclusiveMinimum" | "maximum" | "exclusiveMaximum"   (* for numbers *)
-#               | "pattern" | "minLength" | "maxLength" ;                         (* for strings *)
-#               | "miniTEMs" | "maxItems"                                         (* for arrays *)
-#               | "minProperties" | "maxProperties";                              (* for objects *)
-def parseFacets(theType):
-    global token, tokenizer, traceParse
-    if traceParse:print ("<<parseFacets:"+str(token))
-    facets=[]
-    if token.kind=="OPEN_PAREN":
-        token=next(tokenizer)
-        while token.kind != "CLOSE_PAREN":
-            if token.kind in ["IDENT","STR"]:
-                ident=token.value
-                if ident in ["minimum","maximum"]:
-                    token=next(tokenizer)
-                    if token.kind == "EQUAL":
-                        token=next(tokenizer)
-                        if token.kind == "NUMBER":
-                            facets.append({ident:num(token.value)})
-                            token=next(tokenizer)
-                            if theType!= None and ident in ["minimum","maximum"] and theType not in ["number","integer"]:
-                                errorJsrnc("parseFacets","facet "+ident+" only applicable to numeric types",None);
+    # check that a pattern is a valid regular expression
+    def checkPattern(self,pattern):
+        try:
+            re.compile(pattern)
+        except re.error as err:
+            self.errorJsrnc("checkPattern","illegal regular expression: "+str(err),None)
+
+    # facets      = "@(" , facetId , "=" , value , {",", facetId , "=" , value } ")" ;
+    # facetId     = "minimum" | "exclusiveMinimum" | "maximum" | "exclusiveMaximum"   (* for numbers *)
+    #               | "pattern" | "minLength" | "maxLength" ;                         (* for strings *)
+    #               | "miniTEMs" | "maxItems"                                         (* for arrays *)
+    #               | "minProperties" | "maxProperties";                              (* for objects *)
+    def parseFacets(self,theType):
+        if traceParse:print ("<<parseFacets:"+str(self.token))
+        facets=[]
+        if self.token.kind=="OPEN_PAREN":
+            self.token=next(self.tokenizer)
+            while self.token.kind != "CLOSE_PAREN":
+                if self.token.kind in ["IDENT","STR"]:
+                    ident=self.token.value
+                    if ident in ["minimum","maximum"]:
+                        self.token=next(self.tokenizer)
+                        if self.token.kind == "EQUAL":
+                            self.token=next(self.tokenizer)
+                            if self.token.kind == "NUMBER":
+                                facets.append({ident:num(self.token.value)})
+                                self.token=next(self.tokenizer)
+                                if theType!= None and ident in ["minimum","maximum"] and theType not in ["number","integer"]:
+                                    self.errorJsrnc("parseFacets","facet "+ident+" only applicable to numeric types",None);
+                            else: 
+                                self.errorJsrnc("parseFacets","number expected in facet "+ident,["NUMBER"])
                         else: 
-                            errorJsrnc("parseFacets","number expected in facet "+ident,["NUMBER"])
-                    else: 
-                        errorJsrnc("parseFacets","= expected in facet",["IDENT","STR"])
-                elif ident=="pattern":
-                    token=next(tokenizer)
-                    if token.kind == "EQUAL":
-                        token=next(tokenizer)
-                        if token.kind == "STR":
-                            facets.append({ident:token.value[1:-1]})
-                            token=next(tokenizer)
-                            if theType!= None and theType != "string":
-                                errorJsrnc("parseFacets","facet "+ident+" only applicable to string",None);
-                        else:
-                            errorJsrnc("parseFacets"," string expected as pattern facet",["STR"])
-                    else: 
-                        errorJsrnc("parseFacets","= expected in facet",["IDENT","STR"])
-                elif ident == "exclusiveMinimum" or ident=="exclusiveMaximum":
-                    token=next(tokenizer)
-                    if token.kind == "EQUAL":
-                        token=next(tokenizer)
-                        if token.kind=="NUMBER":
-                            facets.append({ident:num(token.value)})
-                            token=next(tokenizer)
-                            if theType!= None and theType not in ["number","integer"]:
-                                errorJsrnc("parseFacets","facet "+ident+" only applicable to numeric types",None);
+                            self.errorJsrnc("parseFacets","= expected in facet",["IDENT","STR"])
+                    elif ident=="pattern":
+                        self.token=next(self.tokenizer)
+                        if self.token.kind == "EQUAL":
+                            self.token=next(self.tokenizer)
+                            if self.token.kind == "STR":
+                                facets.append({ident:self.token.value[1:-1]})
+                                self.checkPattern(self.token.value[1:-1])
+                                self.token=next(self.tokenizer)
+                                if theType!= None and theType != "string":
+                                    self.errorJsrnc("parseFacets","facet "+ident+" only applicable to string",None);
+                            else:
+                                self.errorJsrnc("parseFacets"," string expected as pattern facet",["STR"])
                         else: 
-                            errorJsrnc("parseFacets","number expected for facet "+ident,["STR"]) 
-                    else: 
-                        errorJsrnc("parseFacets","= expected in facet",["IDENT","STR"])
-                elif ident in ["minItems","maxItems","minProperties","maxProperties","minLength","maxLength"]:
-                    token=next(tokenizer)
-                    if token.kind == "EQUAL":
-                        token=next(tokenizer)
-                        if token.kind == "NUMBER":
-                            facets.append({ident:int(token.value)})
-                            token=next(tokenizer)
-                            if theType!= None and ident in ["minItems","maxItems"] and theType != "array":
-                                errorJsrnc("parseFacets","facet "+ident+" only applicable to array types",None)
-                            elif theType!= None and ident in ["minProperties","maxProperties"] and theType != "object":
-                                errorJsrnc("parseFacets","facet "+ident+" only applicable to object types",None)
-                            elif theType!= None and ident in ["minLength","maxLength"] and theType !="string":
-                                errorJsrnc("parseFacets","facet "+ident+" only applicable to string types",None);
+                            self.errorJsrnc("parseFacets","= expected in facet",["IDENT","STR"])
+                    elif ident == "exclusiveMinimum" or ident=="exclusiveMaximum":
+                        self.token=next(self.tokenizer)
+                        if self.token.kind == "EQUAL":
+                            self.token=next(self.tokenizer)
+                            if self.token.kind=="NUMBER":
+                                facets.append({ident:num(self.token.value)})
+                                self.token=next(self.tokenizer)
+                                if theType!= None and theType not in ["number","integer"]:
+                                    self.errorJsrnc("parseFacets","facet "+ident+" only applicable to numeric types",None);
+                            else: 
+                                self.errorJsrnc("parseFacets","number expected for facet "+ident,["STR"]) 
+                        else: 
+                            self.errorJsrnc("parseFacets","= expected in facet",["IDENT","STR"])
+                    elif ident in ["minItems","maxItems","minProperties","maxProperties","minLength","maxLength"]:
+                        self.token=next(self.tokenizer)
+                        if self.token.kind == "EQUAL":
+                            self.token=next(self.tokenizer)
+                            if self.token.kind == "NUMBER":
+                                facets.append({ident:int(self.token.value)})
+                                self.token=next(self.tokenizer)
+                                if theType!= None and ident in ["minItems","maxItems"] and theType != "array":
+                                    self.errorJsrnc("parseFacets","facet "+ident+" only applicable to array types",None)
+                                elif theType!= None and ident in ["minProperties","maxProperties"] and theType != "object":
+                                    self.errorJsrnc("parseFacets","facet "+ident+" only applicable to object types",None)
+                                elif theType!= None and ident in ["minLength","maxLength"] and theType !="string":
+                                    self.errorJsrnc("parseFacets","facet "+ident+" only applicable to string types",None);
+                            else: 
+                                self.errorJsrnc("parseFacets","number expected in facet "+ident,["NUMBER"])
                         else: 
-                            errorJsrnc("parseFacets","number expected in facet "+ident,["NUMBER"])
+                            self.errorJsrnc("parseFacets","= expected in facet",["IDENT","STR"])
                     else: 
-                        errorJsrnc("parseFacets","= expected in facet",["IDENT","STR"])
+                        self.errorJsrnc("parseFacets","unrecognized facet:"+self.token.value,["IDENT","STR"])
+                        break
                 else: 
-                    errorJsrnc("parseFacets","unrecognized facet:"+token.value,["IDENT","STR"])
+                    self.errorJsrnc("parseFacets","identifier expected in facet",["IDENT","STR"])
                     break
-            else: 
-                errorJsrnc("parseFacets","identifier expected in facet",["IDENT","STR"])
-                break
-            if token.kind == "COMMA":
-                token=next(tokenizer)
-        token=next(tokenizer) # skip closing parenthesis
-    else: 
-        errorJsrnc("parseFacets","open parenthesis expected at the start of a facet",["IDENT","STR"])
-    #todo: check that min{inum|Length|Items|Properties} are <= than the corresponding max...
-    if traceParse:print (">>parseFacets:"+str(facets))
-    return facets
+                if self.token.kind == "COMMA":
+                    self.token=next(self.tokenizer)
+            self.token=next(self.tokenizer) # skip closing parenthesis
+        else: 
+            self.errorJsrnc("parseFacets","open parenthesis expected at the start of a facet",["IDENT","STR"])
+        #todo: check that min{inum|Length|Items|Properties} are <= than the corresponding max...
+        if traceParse:print (">>parseFacets:"+str(facets))
+        return facets
+
+# taken from https://stackoverflow.com/questions/379906/how-do-i-parse-a-string-to-a-float-or-int
+# if the string corresponds to a string then return it else return a float
+def num(s):
+    try:
+        return int(s)
+    except ValueError:
+        return float(s)
 
 
 # parse a file containing jsonrnc definitions and returns either a schema or 
-# a number indicating the number of errors found during parsing
+# a number indicating the number of errors found during parsing, the errors being printed
 #
 def parseJsonRnc(jsonrncContent):
-    global token,tokenizer,lines
-    for line in jsonrncContent: # must read all input for dealing with stdin
-        lines.append(line)
-    # print lines
-    tokenizer = tokenizeRNC("".join(lines[1:]))
-    token = next(tokenizer)
-    try:
-        while token.kind!="EOF":
-            parseDef()
-    except StopIteration:
-        errorJsrnc("main","unexpected end of file",None)
-    ## check missing definitions (the schema should contains one the valid starting point of ValidateObject.validate(...))
-    if all(map(lambda t: t not in schema,["type","oneOf","$ref"]))  and "start" not in defs:
-        errorJsrnc("main","no start definition",None)
-    for ref in refs:
-        if ref not in defs:
-            errorJsrnc("main","no definition found for "+ref,None)
-    return schema if errorsInSchema==0 else errorsInSchema
+    parser=JsonRncParser(showErrors=True)
+    schema=parser.parse(jsonrncContent)
+    return schema if schema!=None else len(parser.errors)
+
+## validators of the schemas already compiled by compile_rnc, keyed by a hash of their text
+compiledRncs={}
+compiledRncsLock=threading.Lock()
+maxCompiledRncs=256
+
+# returns a new Validator for a jsonrnc schema given as a string, the schema being parsed and compiled only
+# the first time its text is seen (the compiled schema being shared by the validators of the same text).
+# raises ValueError whose args are the message and the list of JsonRncError when the schema has errors
+def compile_rnc(text):
+    key=hashlib.sha256(text.encode("utf-8","surrogatepass")).hexdigest()
+    with compiledRncsLock:
+        compiled=compiledRncs.get(key)
+    if compiled==None:
+        parser=JsonRncParser()
+        schema=parser.parse(text)
+        if schema==None:
+            raise ValueError("%d errors found in schema"%len(parser.errors),parser.errors)
+        try:
+            compiled=Validator(schema)
+        except NameError as err: # errors found while compiling the schema
+            errors=[JsonRncError(0,0,"",mess) for mess in str(err).split("\n")]
+            raise ValueError("%d errors found in schema"%len(errors),errors) from None
+        with compiledRncsLock:
+            if len(compiledRncs)>=maxCompiledRncs: # forget the schema compiled first
+                del compiledRncs[next(iter(compiledRncs))]
+            compiledRncs[key]=compiled
+    return Validator(compiled.schema,compiledSchema=compiled.compiledSchema)
 
 if __name__ == '__main__':
     parser=argparse.ArgumentParser(description="Parse a JSON-rnc schema from a file or from stdin if no file is given. When there is no error in the schema, produce a JSON Schema on stdout")
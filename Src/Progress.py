@@ -0,0 +1,147 @@
+#!/usr/local/bin/python3
+# coding=utf-8
+
+####### Periodic report of the progress of a long validation
+###  every progressInterval seconds, the number of records read, the throughput (records and megabytes per second),
+###  the rate of invalid records, the estimated time to the end of the input and the resident memory are written
+###  as a line on stderr and/or in a stats file. The stats file is rewritten atomically, either as JSON or in the
+###  textfile format of the Prometheus node exporter (for a file ending with .prom), so that a scheduler can detect
+###  a slow or stuck validation (whose file is no longer updated) without parsing the console.
+########################################################################
+
+import os,sys,json,time
+from ValidateJsonObject import showNum
+
+## seconds between reports
+progressInterval=5
+
+## write a progress line on stderr
+showProgress=False
+
+## file of the stats rewritten at each report, None when there is none
+progressFile=None
+
+## number of bytes of the input file for estimating the time to its end, None when it is not known
+#  (standard input, compressed file)
+inputSize=None
+
+## labels of the Prometheus metrics: name => value
+metricLabels={}
+
+## True when the progress is reported
+def isReporting():
+    return showProgress or progressFile!=None
+
+## megabytes of the resident set size of the process, None when it is not known
+def currentRss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1])*os.sysconf("SC_PAGE_SIZE")/(1<<20)
+    except (OSError,ValueError,IndexError): # not on Linux, the peak resident set size is the best estimation
+        try:
+            import resource
+        except ImportError:
+            return None
+        maxrss=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss/(1<<20) if sys.platform=="darwin" else maxrss/(1<<10)
+
+## hours:minutes:seconds of a number of seconds
+def showDuration(seconds):
+    seconds=int(seconds)
+    return "%d:%02d:%02d"%(seconds//3600,seconds//60%60,seconds%60)
+
+## value of a Prometheus label with the backslashes, quotes and newlines escaped
+def labelValue(value):
+    return str(value).replace("\\","\\\\").replace('"','\\"').replace("\n","\\n")
+
+## (name,type,help,field of the stats) of the Prometheus metrics
+prometheusMetrics=[
+    ("jsonrnc_records_read_total","counter","Records read","records"),
+    ("jsonrnc_records_validated_total","counter","Records validated","validated"),
+    ("jsonrnc_records_invalid_total","counter","Invalid, malformed or duplicate records","invalid"),
+    ("jsonrnc_bytes_read_total","counter","Bytes of the records read","bytes"),
+    ("jsonrnc_records_per_second","gauge","Records read per second since the start","recordsPerSec"),
+    ("jsonrnc_bytes_per_second","gauge","Bytes read per second since the start","bytesPerSec"),
+    ("jsonrnc_invalid_ratio","gauge","Proportion of invalid records among the validated ones","invalidRate"),
+    ("jsonrnc_eta_seconds","gauge","Estimated seconds to the end of the input","etaSeconds"),
+    ("jsonrnc_resident_memory_bytes","gauge","Resident set size of the process","rssBytes"),
+    ("jsonrnc_done","gauge","1 when the validation is finished","done"),
+    ("jsonrnc_last_update_timestamp_seconds","gauge","Time of the last update of this file","updated"),
+]
+
+## text of the stats in the textfile format of Prometheus, the unknown values being omitted
+def prometheusText(stats):
+    labels=",".join('%s="%s"'%(name,labelValue(value)) for (name,value) in sorted(metricLabels.items()))
+    lines=[]
+    for (name,metricType,help,field) in prometheusMetrics:
+        value=stats[field]
+        if value==None:continue
+        lines.append("# HELP %s %s"%(name,help))
+        lines.append("# TYPE %s %s"%(name,metricType))
+        lines.append("%s%s %s"%(name,"{"+labels+"}" if labels else "",repr(float(value)) if type(value) is float else int(value)))
+    return "\n".join(lines)+"\n"
+
+## write the stats in a file by renaming a temporary file, so that a reader never sees a partial file
+def saveStats(fileName,stats):
+    text=prometheusText(stats) if fileName.endswith(".prom") else json.dumps(stats,indent=1)+"\n"
+    tmpFileName=fileName+".tmp"
+    with open(tmpFileName,"w") as f:
+        f.write(text)
+    os.replace(tmpFileName,fileName)
+
+class ProgressMeter:
+    """progress of a validation reported when time.monotonic() reaches nextReport, the rates being computed
+       from the records and bytes read since its creation, the first ones having been read before (when resuming)"""
+    def __init__(self,nbRead=0,nbBytes=0):
+        self.start=time.monotonic()
+        self.startNb=nbRead
+        self.startBytes=nbBytes
+        self.nextReport=self.start+progressInterval
+
+    ## dict of the stats of the validation after nbRead records (nbValidated of them validated) and nbBytes bytes
+    #  counts giving the number of "invalid", "bad" and "dup" records
+    def stats(self,nbRead,nbValidated,nbBytes,counts,done):
+        elapsed=time.monotonic()-self.start
+        nbInvalid=counts["invalid"]+counts["bad"]+counts["dup"]
+        bytesPerSec=(nbBytes-self.startBytes)/elapsed if elapsed>0 else None
+        eta=None
+        if done:
+            eta=0
+        elif inputSize!=None and bytesPerSec:
+            eta=round(max(0,inputSize-nbBytes)/bytesPerSec,1)
+        rss=currentRss()
+        return {"records":nbRead,
+                "validated":nbValidated,
+                "invalid":nbInvalid,
+                "invalidRate":round(nbInvalid/nbValidated,6) if nbValidated>0 else None,
+                "bytes":nbBytes,
+                "inputBytes":inputSize,
+                "elapsedSeconds":round(elapsed,3),
+                "recordsPerSec":round((nbRead-self.startNb)/elapsed,1) if elapsed>0 else None,
+                "bytesPerSec":round(bytesPerSec,1) if bytesPerSec!=None else None,
+                "etaSeconds":eta,
+                "rssBytes":None if rss==None else int(rss*(1<<20)),
+                "done":1 if done else 0,
+                "updated":round(time.time(),3)}
+
+    ## report the progress and set the time of the next report
+    def report(self,nbRead,nbValidated,nbBytes,counts,done=False):
+        stats=self.stats(nbRead,nbValidated,nbBytes,counts,done)
+        if showProgress:
+            sys.stderr.write(self.progressLine(stats))
+        if progressFile!=None:
+            saveStats(progressFile,stats)
+        self.nextReport=time.monotonic()+progressInterval
+
+    def progressLine(self,stats):
+        parts=["%s records"%showNum(stats["records"])]
+        if stats["invalidRate"]!=None:
+            parts[0]+=" (%s invalid, %.2f%%)"%(showNum(stats["invalid"]),100*stats["invalidRate"])
+        if stats["recordsPerSec"]!=None:
+            parts.append("%s records/s, %.2f MB/s"%(showNum(int(stats["recordsPerSec"])),stats["bytesPerSec"]/(1<<20)))
+        if inputSize and not stats["done"]:
+            parts.append("%d%%"%min(100,100*stats["bytes"]//inputSize)+
+                         ("" if stats["etaSeconds"]==None else " ETA "+showDuration(stats["etaSeconds"])))
+        if stats["rssBytes"]!=None:
+            parts.append("RSS %d MB"%(stats["rssBytes"]>>20))
+        return ("Done: " if stats["done"] else "Progress: ")+", ".join(parts)+"\n"
@@ -0,0 +1,68 @@
+#!/usr/local/bin/python3
+# coding=utf-8
+
+####### Separation of the valid records of an input from the invalid ones in a single pass
+###  while validating, each record is copied as it was read either in the output of the valid records or in the
+###  quarantine of the invalid, malformed or duplicate ones, optionally with their messages, so that the input
+###  is not read again for extracting the bad records. The outputs are written by large buffers and are compressed
+###  according to the extension of their file (.gz, .bz2 or .xz).
+########################################################################
+
+import io,json,gzip
+
+## bytes of the buffer of an output
+bufferSize=1<<23
+
+## compression level of the gzip outputs, lower than the default for not slowing down the validation
+gzipLevel=6
+
+## binary file of an output compressed according to the extension of its name
+def openOutput(fileName):
+    if fileName.endswith(".gz"):
+        f=gzip.open(fileName,"wb",compresslevel=gzipLevel)
+    elif fileName.endswith(".bz2"):
+        import bz2
+        f=bz2.open(fileName,"wb")
+    elif fileName.endswith(".xz"):
+        import lzma
+        f=lzma.open(fileName,"wb")
+    else:
+        f=open(fileName,"wb",buffering=0)
+    return io.BufferedWriter(f,bufferSize)
+
+## bytes of the text of a record read as bytes or as text, ending with a newline
+def recordBytes(record):
+    if not isinstance(record,bytes):
+        record=record.encode("utf-8")
+    return record if record.endswith(b"\n") else record+b"\n"
+
+class Quarantine:
+    """outputs of the valid records (when validFile is not None) and of the others (when quarantineFile is not None),
+       the records of the quarantine being written within a JSON object with their messages when withMessages is True"""
+    def __init__(self,validFile,quarantineFile,withMessages=False):
+        self.validOutput=None if validFile==None else openOutput(validFile)
+        self.quarantineOutput=None if quarantineFile==None else openOutput(quarantineFile)
+        self.withMessages=withMessages
+
+    ## write the nb-th record of the input (as read) according to the outcome of its validation
+    def write(self,nb,record,outcome):
+        kind=outcome[0]
+        if kind=="valid":
+            if self.validOutput!=None:
+                self.validOutput.write(recordBytes(record))
+        elif self.quarantineOutput!=None:
+            if self.withMessages:
+                if isinstance(record,bytes):
+                    record=record.decode("utf-8",errors="replace")
+                (idVal,mess)=(outcome[1],outcome[4])
+                line={"nb":nb,"error":kind,"messages":mess.strip("\n").split("\n"),"record":record.rstrip("\r\n")}
+                if idVal!=None:
+                    line["id"]=idVal
+                self.quarantineOutput.write(json.dumps(line,ensure_ascii=False).encode("utf-8")+b"\n")
+            else:
+                self.quarantineOutput.write(recordBytes(record))
+
+    def close(self):
+        for output in [self.validOutput,self.quarantineOutput]:
+            if output!=None:
+                output.close()
@@ -0,0 +1,56 @@
+#!/usr/local/bin/python3
+# coding=utf-8
+
+####### Sampling of the records of a stream and estimation of the rate of invalid records
+###  for a quick check of a huge file by validating only some of its records
+########################################################################
+
+import random,math
+
+## z value of a 95% confidence interval
+z95=1.96
+
+## minimum number of records validated before stopping on the width of the confidence interval
+minSampleSize=30
+
+## generator of the (nb,record) of a stream of (nb,record) keeping one record out of n, starting with the first one
+#  the records being numbered from 1
+def everyNth(records,n):
+    for (nb,record) in records:
+        if (nb-1)%n==0:
+            yield (nb,record)
+
+## list of size (nb,record) chosen uniformly among a stream of (nb,record) and sorted by nb (algorithm R)
+#  the same records are chosen for the same stream as the random generator has a fixed seed
+def reservoirSample(records,size,seed=0):
+    rand=random.Random(seed)
+    sample=[]
+    for (i,record) in enumerate(records):
+        if i<size:
+            sample.append(record)
+        else:
+            j=rand.randrange(i+1)
+            if j<size:
+                sample[j]=record
+    sample.sort(key=lambda record:record[0])
+    return sample
+
+## Wilson score interval (low,high) at 95% of the rate of invalid records in a sample of n records
+def confidenceInterval(nbInvalid,n):
+    p=nbInvalid/n
+    z2=z95*z95
+    denominator=1+z2/n
+    center=(p+z2/(2*n))/denominator
+    halfWidth=z95*math.sqrt(p*(1-p)/n+z2/(4*n*n))/denominator
+    return (max(0.0,center-halfWidth),min(1.0,center+halfWidth))
+
+## True when the confidence interval of the rate of invalid records has a half width of at most margin
+def rateIsKnown(nbInvalid,n,margin):
+    if n<minSampleSize:return False
+    (low,high)=confidenceInterval(nbInvalid,n)
+    return (high-low)/2<=margin
+
+## line giving the rate of invalid records in a sample of n records with its confidence interval
+def showRate(nbInvalid,n):
+    (low,high)=confidenceInterval(nbInvalid,n)
+    return "Rate of invalid objects: %.2f%% (95%% confidence interval: %.2f%% to %.2f%%)"%(100*nbInvalid/n,100*low,100*high)
@@ -0,0 +1,85 @@
+#!/usr/local/bin/python3
+# coding=utf-8
+
+####### Cache of the JSON-rnc schemas parsed and compiled by the validator
+###  a schema is found by a hash of the content of its JSON-rnc file and of the version of the tool (the source
+###  of the modules that parse and compile it), so that neither touching nor copying the file gives a new parse.
+###  For each schema, the cache directory keeps its JSON Schema and its compiled validation nodes pickled, which
+###  are loaded faster than parsing and compiling the schema again. The files are written under a temporary name
+###  then renamed, so that many validators starting at the same time never read a partial file.
+###  As unpickling a file can run any code, the compiled nodes are loaded only from a directory and a file that
+###  belong to the user and that no one else can write.
+########################################################################
+
+import hashlib,os,sys,io,pickle,tempfile,stat
+from ppJson import ppJson
+import ParseJsonRnc,ValidateJsonObject
+
+## directory of the cache, None when schemas are not cached
+schemaCacheDir=os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser(os.path.join("~",".cache")),"json-rnc")
+
+## hash of the source of the modules producing the cached files and of the version of python, computed once
+toolVersion=None
+def getToolVersion():
+    global toolVersion
+    if toolVersion==None:
+        h=hashlib.blake2b(digest_size=16)
+        h.update(("%d.%d:%d"%(sys.version_info[0],sys.version_info[1],pickle.HIGHEST_PROTOCOL)).encode())
+        for module in [ParseJsonRnc,ValidateJsonObject,sys.modules[__name__]]:
+            with open(module.__file__,"rb") as f:
+                h.update(f.read())
+        toolVersion=h.digest()
+    return toolVersion
+
+## key of a JSON-rnc schema (the bytes of its file) in the cache
+def schemaFileKey(content):
+    return hashlib.blake2b(content,digest_size=20,key=getToolVersion()).hexdigest()
+
+## write bytes in a file of the cache directory by renaming a temporary file, ignoring the errors
+#  (e.g. a read only directory) that only prevent caching
+def writeAtomically(fileName,data):
+    try:
+        os.makedirs(schemaCacheDir,mode=0o700,exist_ok=True)
+        (fd,tmpFileName)=tempfile.mkstemp(dir=schemaCacheDir,prefix=fileName+".",suffix=".tmp")
+        try:
+            with os.fdopen(fd,"wb") as f:
+                f.write(data)
+            os.replace(tmpFileName,os.path.join(schemaCacheDir,fileName))
+        except BaseException:
+            os.remove(tmpFileName)
+            raise
+    except OSError:
+        pass
+
+## True when the status of a file or a directory shows that it belongs to the user and that only the user can write it
+#  (always True where files have no owner)
+def isPrivate(status):
+    if not hasattr(os,"getuid"):return True
+    return status.st_uid==os.getuid() and status.st_mode&(stat.S_IWGRP|stat.S_IWOTH)==0
+
+## (schema,compiled schema) saved for a key, None when it is not in the cache, cannot be read
+#  or could have been written by another user
+def loadSchema(key):
+    if schemaCacheDir==None:return None
+    try:
+        if not isPrivate(os.stat(schemaCacheDir)):
+            return None
+        with open(os.path.join(schemaCacheDir,key+".pickle"),"rb") as f:
+            if not isPrivate(os.fstat(f.fileno())):
+                return None
+            return pickle.load(f)
+    except Exception: # missing or corrupted file
+        return None
+
+## save the JSON Schema and the compiled schema (when it is not None) of a key
+def saveSchema(key,schema,compiledSchema):
+    if schemaCacheDir==None:return
+    out=io.StringIO()
+    ppJson(out,schema)
+    writeAtomically(key+".json",out.getvalue().encode("utf-8"))
+    if compiledSchema!=None:
+        try:
+            data=pickle.dumps((schema,compiledSchema),pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError,RecursionError):
+            return
+        writeAtomically(key+".pickle",data)
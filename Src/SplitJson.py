@@ -3,56 +3,127 @@
 
 ####### Splitting of a JSON file into single line objects
 ###  Guy Lapalme (lapalme@iro.umontreal.ca) March 2015
+##   revision for reading the input by chunks, each value being found by the json decoder
 ########################################################################
 
-import re,argparse,sys
+import re,json,argparse
+from CompressedInput import openInput,stdinInput
 
 traceSplitter=False
 
-## generator that yields the next json object in input
-#  by keeping track of the levels of braces and brackets not counting them within strings
+## size of the chunks read from the input, more is read when a value does not fit in what has been read
+chunkSize=1<<16
 
-## tokenizer adapted from https://docs.python.org/3.4/library/re.html#writing-a-tokenizer
-def jsonSplitter(input):
-    if traceSplitter:print ("jsonSplitter: start")
-    token_specification = [
-        ("SKIP",          r'\s+'), # skip blanks and newlines
-         # escaped quoted string syntax taken from http://stackoverflow.com/questions/16130404/regex-string-and-escaped-quote
-        ("STRING",        r'"(?:\\.|[^"\\])*?"'+"|"+ r"'(?:\\.|[^'\\])*?'"),# double or single quoted string
-        ("OPEN_BRACE",    r'\{'),
-        ("CLOSE_BRACE",   r'\}'),
-        ("OPEN_BRACKET",  r'\['),
-        ("CLOSE_BRACKET", r'\]'),
-        ("OTHER",         r'[^ \n{}[\]\"\']+')
-    ]
-    tok_regex = '|'.join('(?P<%s>%s)' % pair for pair in token_specification)
+## blanks between json values
+blanks=re.compile(r'\s*')
+
+## tokens of the input that is not valid JSON (e.g. single quoted strings or True)
+#  adapted from https://docs.python.org/3.4/library/re.html#writing-a-tokenizer
+token_specification = [
+    ("SKIP",          r'\s+'), # skip blanks and newlines
+     # escaped quoted string syntax taken from http://stackoverflow.com/questions/16130404/regex-string-and-escaped-quote
+    ("STRING",        r'"(?:\\.|[^"\\])*?"'+"|"+ r"'(?:\\.|[^'\\])*?'"),# double or single quoted string
+    ("OPEN",          r'[{[]'),
+    ("CLOSE",         r'[}\]]'),
+    ("OTHER",         r'[^ \n{}[\]\"\']+'),
+    ("QUOTE",         r'["\']'),  # start of a string not yet terminated
+]
+tok_regex = re.compile('|'.join('(?P<%s>%s)' % pair for pair in token_specification),re.DOTALL)
+
+## strings or blanks outside of strings
+stringOrBlanks = re.compile(r'("(?:\\.|[^"\\])*")|\s+')
+
+## remove the blanks outside of strings of a valid json value so that it is on a single line
+def singleLine(value):
+    return stringOrBlanks.sub(r'\1',value)
+
+### find the end of a value that is not valid JSON starting at pos in buf
+#   by keeping track of the levels of braces and brackets not counting them within strings
+#   returns (end,value) where value is written on a single line, newlines within strings being replaced by \n
+#   returns None when the end of buf is reached before the end of the value and more input is available
+def scanInvalidValue(buf,pos,eof):
     level=0
-    res=""
-    for mo in re.finditer(tok_regex, input,re.DOTALL):
+    tokens=[]
+    while True:
+        mo=tok_regex.match(buf,pos)
+        if mo==None: # end of buf
+            return (pos,"".join(tokens)) if eof else None
         kind = mo.lastgroup
         value = mo.group(kind)
-        # print ("mo:"+kind+":"+value)
+        pos=mo.end()
         if kind=="SKIP":continue
-        if   kind=="OPEN_BRACKET"  or kind=="OPEN_BRACE" :level+=1
-        elif kind=="CLOSE_BRACKET" or kind=="CLOSE_BRACE":level-=1
-        elif kind=="STRING": res=res.replace('\n','\\n') # reinsert newlines within strings
-        res+=value
-        # if traceSplitter: print (str(level)+":"+res)
-        if level==0:
-            if traceSplitter:print("splitter: yield: %d chars"%len(res))
-            yield res
-            res=""
+        if kind=="QUOTE" or (kind=="OTHER" and pos==len(buf)):
+            if not eof: return None # the string or the token might continue in the next chunk
+            if kind=="QUOTE": continue # skip the quote of an unterminated string
+        if   kind=="OPEN" : level+=1
+        elif kind=="CLOSE": level-=1
+        elif kind=="STRING": value=value.replace('\n','\\n') # reinsert newlines within strings
+        tokens.append(value)
+        if level<=0:
+            return (pos,"".join(tokens))
+
+## generator that yields the next json value in input (a string or a file), as soon as it is complete
+#  the input is read by chunks so that only the current value is kept in memory,
+#  the json decoder finds the end of each valid value, the other ones are found by scanInvalidValue
+#  when singleLineValues is True, the blanks outside strings are removed from valid values
+def jsonSplitter(input,singleLineValues=False):
+    if traceSplitter:print ("jsonSplitter: start")
+    decoder=json.JSONDecoder()
+    if isinstance(input,str):
+        buf=input
+        eof=True
+    else:
+        buf=""
+        eof=False
+    pos=0
+    needMore=False
+    while True:
+        pos=blanks.match(buf,pos).end()
+        if needMore or pos==len(buf):
+            if eof:
+                if pos==len(buf):break
+            else: # read more input, at least as much as what is kept so that each value is read in linear time
+                chunk=input.read(max(chunkSize,len(buf)-pos))
+                buf=buf[pos:]+chunk
+                pos=0
+                eof=len(chunk)==0
+                needMore=False
+                continue
+        needMore=False
+        try:
+            (obj,end)=decoder.raw_decode(buf,pos)
+            if buf[pos] not in '{["': # a number or a literal must be followed by a separator
+                if end==len(buf) and not eof:
+                    needMore=True
+                    continue
+                if end<len(buf) and blanks.match(buf,end).end()==end and buf[end] not in '{}[]"\'':
+                    raise ValueError("value followed by other characters")
+            value=buf[pos:end]
+            if singleLineValues:
+                value=singleLine(value)
+        except ValueError as err:
+            if not eof and (isinstance(err,json.JSONDecodeError) and
+                            (err.pos>=len(buf)-8 or err.msg.startswith("Unterminated string"))):
+                needMore=True # the value is probably cut at the end of what has been read
+                continue
+            scanned=scanInvalidValue(buf,pos,eof)
+            if scanned==None:
+                needMore=True
+                continue
+            (end,value)=scanned
+            if value=="": # only unterminated quotes at the end of the input
+                pos=end
+                continue
+        if traceSplitter:print("splitter: yield: %d chars"%len(value))
+        pos=end
+        yield value
 
 if __name__ == '__main__':
-    parser=argparse.ArgumentParser(description="Split stdin into single line JSON objects")
+    parser=argparse.ArgumentParser(description="Split a JSON file (stdin by default), possibly compressed, into single line JSON objects")
     parser.add_argument("--debug",help="Trace calls for debugging",action="store_true")
+    parser.add_argument("json_file",help="name of the JSON file to split",nargs='?')
     args=parser.parse_args()
     if args.debug : traceSplitter=True
-    # it seems that sys.stdin.read() does not work from the console... but readlines() does
-    splitter = jsonSplitter("".join(sys.stdin.readlines())) 
-    try:
-        while True:
-            jsonUnit=next(splitter)
+    with (stdinInput() if args.json_file==None else openInput(args.json_file)) as f:
+        for jsonUnit in jsonSplitter(f,True):
             print (jsonUnit)
-    except StopIteration:
-            pass
@@ -0,0 +1,117 @@
+#!/usr/local/bin/python3
+# coding=utf-8
+
+####### Detection of values repeated in different records within a bounded memory
+###  the number of the record in which each value first appeared is kept in a dict up to a limit,
+###  the values are then spilled to an SQLite database in which the repeated values are confirmed,
+###  a Bloom filter telling without looking at the database that most new values have never been seen
+########################################################################
+
+import hashlib,sqlite3,tempfile,os,json
+
+## memory (in bytes) for all the values checked for uniqueness, set with --unique-memory
+uniqueMemory=1<<30
+
+## estimate of the memory used by a value kept in a dict
+bytesPerValue=200
+
+class BloomFilter:
+    """set of keys telling that a key has never been added, but that may wrongly tell that a key has been added"""
+    def __init__(self,nbBytes,nbHashes=7):
+        self.bits=bytearray(nbBytes)
+        self.nbBits=nbBytes*8
+        self.nbHashes=nbHashes
+
+    def positions(self,key):
+        digest=hashlib.blake2b(key,digest_size=16).digest()
+        h1=int.from_bytes(digest[:8],"little")
+        h2=int.from_bytes(digest[8:],"little")|1
+        return [(h1+i*h2)%self.nbBits for i in range(self.nbHashes)]
+
+    def add(self,key):
+        for pos in self.positions(key):
+            self.bits[pos>>3]|=1<<(pos&7)
+
+    def mayContain(self,key):
+        for pos in self.positions(key):
+            if not(self.bits[pos>>3]&(1<<(pos&7))):
+                return False
+        return True
+
+## key of a value: a string is its own key, the other values are serialized in JSON after a NUL
+def valueKey(value):
+    if isinstance(value,str):
+        return value
+    return "\0"+json.dumps(value,sort_keys=True)
+
+class UniqueValueSet:
+    """values each associated with the number of the record in which it first appeared,
+       the database is kept in dbFile when it is given (e.g. for resuming a validation) instead of a temporary file"""
+    def __init__(self,maxMemory,dbFile=None):
+        self.maxInMemory=max(1000,maxMemory*3//4//bytesPerValue)
+        self.bloomBytes=max(1<<16,maxMemory//4)
+        self.recent={}  # key => record number for the values that have not been spilled
+        self.bloom=None # created with the database at the first spill
+        self.db=None
+        self.dbFile=dbFile
+
+    ## number of the record in which the value first appeared, None when it is new, it is then associated with nb
+    def firstRecord(self,value,nb):
+        key=valueKey(value)
+        if key in self.recent:
+            return self.recent[key]
+        if self.bloom!=None:
+            keyBytes=key.encode("utf-8","surrogatepass")
+            if self.bloom.mayContain(keyBytes):
+                row=self.db.execute("SELECT nb FROM seen WHERE key=?",(keyBytes,)).fetchone()
+                if row!=None:
+                    return row[0]
+        self.recent[key]=nb
+        if len(self.recent)>=self.maxInMemory:
+            self.spill()
+        return None
+
+    ## open the database, a temporary one is not journaled as it is not kept if the validation is stopped
+    def openDb(self):
+        temporary=self.dbFile==None
+        if temporary:
+            (fd,self.dbFile)=tempfile.mkstemp(prefix="jsonrnc-unique-",suffix=".sqlite")
+            os.close(fd)
+        self.db=sqlite3.connect(self.dbFile)
+        if temporary:
+            self.db.execute("PRAGMA journal_mode=OFF")
+        self.db.execute("PRAGMA synchronous=OFF")
+        self.db.execute("CREATE TABLE IF NOT EXISTS seen(key BLOB PRIMARY KEY, nb INTEGER) WITHOUT ROWID")
+        self.bloom=BloomFilter(self.bloomBytes)
+
+    ## move the values kept in memory to the database
+    def spill(self):
+        if self.db==None:
+            self.openDb()
+        keys=[(key.encode("utf-8","surrogatepass"),nb) for (key,nb) in self.recent.items()]
+        with self.db:
+            self.db.executemany("INSERT INTO seen VALUES (?,?)",keys)
+        for (keyBytes,nb) in keys:
+            self.bloom.add(keyBytes)
+        self.recent={}
+
+    ## write all the values to the database so that they can be restored
+    def save(self):
+        if len(self.recent)>0:
+            self.spill()
+
+    ## restore the values saved in the database for the records numbered up to lastNb,
+    #  those of the following records having been saved after the last checkpoint of a validation
+    def restore(self,lastNb):
+        if not os.path.exists(self.dbFile):return
+        self.openDb()
+        with self.db:
+            self.db.execute("DELETE FROM seen WHERE nb>?",(lastNb,))
+        for (keyBytes,) in self.db.execute("SELECT key FROM seen"):
+            self.bloom.add(keyBytes)
+
+    def close(self):
+        if self.db!=None:
+            self.db.close()
+            os.remove(self.dbFile)
+            self.db=None
@@ -0,0 +1,71 @@
+#!/usr/local/bin/python3
+# coding=utf-8
+
+####### Thin client of ValidationDaemon.py validating a JSON file according to a JSON-rnc schema
+###  the lines of the file are sent to the daemon, which keeps the schema compiled, and the messages of the
+###  response are printed as ValidateJsonRnc.py would, without starting a validator nor preparing the schema.
+###  The whole file is sent in a single request, so that ids and unique values are checked among all its records:
+###  the client is meant for the many small files whose validation is dominated by the start of a validator.
+########################################################################
+
+import os,json,argparse,socket,http.client
+from CompressedInput import openInput,stdinInput
+
+## response of the daemon listening on a Unix domain socket to a request (a dict)
+def socketRequest(socketFile,request):
+    with socket.socket(socket.AF_UNIX,socket.SOCK_STREAM) as s:
+        s.connect(socketFile)
+        with s.makefile("rwb") as f:
+            f.write(json.dumps(request).encode("utf-8")+b"\n")
+            f.flush()
+            return json.loads(f.readline())
+
+## response of the daemon listening for HTTP requests on a port of localhost to a request (a dict)
+def httpRequest(port,request):
+    connection=http.client.HTTPConnection("127.0.0.1",port)
+    try:
+        connection.request("POST","/validate",json.dumps(request).encode("utf-8"),{"Content-Type":"application/json"})
+        return json.loads(connection.getresponse().read())
+    finally:
+        connection.close()
+
+if __name__ == '__main__':
+    parser=argparse.ArgumentParser(description="Validate a JSON file according to a JSON-rnc schema with a validation daemon. "+
+                                               "The number of invalid objects (modulo 256) is returned as the exit code of the program.")
+    group=parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--socket",help="File of the Unix domain socket of the daemon",metavar="FILE")
+    group.add_argument("--port",help="Port on localhost of the HTTP daemon",type=int)
+    parser.add_argument("--split","-s",help="Separate the input JSON objects each a single line.",action="store_true")
+    parser.add_argument("-id",help="use this selector as a list of keys each separated by a slash, a.k.a. JSON pointer, (e.g. '_id/$oid') "
+                                   "for identifying records in error messages instead of line numbers")
+    parser.add_argument("--unique",help="JSON pointer of a field whose values must be unique among the records (e.g. 'email'), "
+                                        "this option can be repeated",action="append",default=[],metavar="POINTER")
+    parser.add_argument("--stats","-st",help="Output statistics about error messages",action="store_true")
+    parser.add_argument("--nolog",help="Do not log error messages",action="store_true")
+    parser.add_argument("schema",help="name of file containing the schema")
+    parser.add_argument("json_file",help="name of the JSON file to validate",nargs='?')
+    args=parser.parse_args()
+    if args.json_file != None and args.json_file.endswith((".json",".json.gz",".json.bz2",".json.xz")): ## always split when dealing with .json file
+        args.split=True
+    if args.json_file==None:
+        lines=list(stdinInput())
+    elif not os.path.exists(args.json_file):
+        print ("json file not found: "+args.json_file)
+        exit(1)
+    else:
+        with openInput(args.json_file) as f:
+            lines=list(f)
+    request={"schema":os.path.abspath(args.schema),"lines":lines,"id":args.id,"unique":args.unique,
+             "split":args.split,"nolog":args.nolog,"stats":args.stats}
+    try:
+        response=socketRequest(args.socket,request) if args.socket!=None else httpRequest(args.port,request)
+    except (OSError,http.client.HTTPException,ValueError) as err: # no daemon or a broken response
+        print ("cannot validate with the daemon on %s: %s"%(args.socket or "port %d"%args.port,err))
+        exit(1)
+    if "error" in response:
+        print (response["error"],end="")
+        exit(1)
+    for result in response["results"]:
+        print (result["messages"],end="")
+    print (response["summary"]+response["stats"],end="")
+    exit(response["invalid"])
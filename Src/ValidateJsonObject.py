@@ -6,17 +6,58 @@
 ##   revision for adding statistics on error messages, May 2015
 ########################################################################
 
-import re
+import re,sys,signal,threading,time
+from ErrorStatistics import ErrorCounter
 
-traceValidate=False
+## optional time budget (in seconds) for matching a single value against a pattern, so that a value
+#  leading to catastrophic backtracking does not stall a whole validation.
+#  With the regex module (when it is installed) the budget is given to the match itself, otherwise
+#  an interval timer interrupts the match, which can only be done in the main thread on Unix; a pattern compiled
+#  by the re module before the budget was set (e.g. by a validator already compiled) is also matched under the timer
+regexTimeout=None
 
-# global schema
-rootSchema=None
+try:
+    import regex as regexModule
+except ImportError:
+    regexModule=None
 
-def errorValidate(sels,mess,infos):
+class PatternTimeout(Exception):
+    pass
+
+def raisePatternTimeout(signum,frame):
+    raise PatternTimeout()
+
+def setRegexTimeout(seconds):
+    global regexTimeout
+    regexTimeout=seconds
+    if seconds is not None:
+        signal.signal(signal.SIGALRM,raisePatternTimeout)
+
+def errorValidate(sels,mess,infos,kind=None):
+    addErrorKind(errorPath(sels)+":"+(mess if kind==None else kind))
     return "%s\t%s\t%s\n"%("/".join(sels),mess,infos)
 def errorSchema(sels,mess,infos):
-    return "! Error in schema !\t"+errorValidate(sels,mess,infos)
+    addErrorKind("! Error in schema !:"+errorPath(sels))
+    return "! Error in schema !\t%s\t%s\t%s\n"%("/".join(sels),mess,infos)
+
+## kinds of the errors found while building the messages of an object (for the statistics of the errors)
+#  errorKinds.found is the list of the kinds found up to now by the thread, None when they are not collected
+#  a kind is the json path of the error normalized by errorPath with its message without the values of the object
+errorKinds=threading.local()
+
+def addErrorKind(kind):
+    found=getattr(errorKinds,"found",None)
+    if found is not None:
+        found.append(kind)
+
+## selectors that stand for any position of an array or any field of an object in the kinds of errors
+class ItemIndex(str):pass
+class AnyField(str):pass
+
+## json path of a list of selectors in which the positions in arrays are written [] and the fields of
+#  additional properties *, so that the number of kinds of errors does not depend on the values of the objects
+def errorPath(sels):
+    return "/".join("[]" if type(sel) is ItemIndex else "*" if type(sel) is AnyField else sel for sel in sels)
     
 def isString(value):
     return isinstance(value,str)
@@ -27,195 +68,694 @@ def showVal(value,width=50):
     else: val=str(value)
     return val if len(val)<width else val[0:width-13]+"..."+val[-10:]
 
-### recursively find a definition within a partial schema (sch) using a selector
-#   this function makes use of the global schema
-def deref(selects,schema):
-    global traceValidate,rootSchema
-    if traceValidate: print ("$$deref(%s,%s)"%(str(selects),showVal(schema)))
-    if len(selects)==0:
-        return schema
-    field=selects[0]
-    if field=="#":
-        return deref(selects[1:],rootSchema)
-    if field in schema:
-        return deref(selects[1:],schema[field])
-    else:
-        raise NameError("could not find:"+field) 
+################################################################################################
+#### compilation of a JSON schema into a tree of validation nodes
+##   the schema dict is examined only once before validating any record: each node keeps only
+##   what applies to it so that its validate(sels,o) method does not probe the schema
+##   validate(sels,o) returns "" if no error otherwise returns an error message
+##   isValid(o) gives the same verdict without building selectors nor messages, it is the fast path
+##   used first on each record, validate(sels,o) being only called for building the messages of invalid ones
 
-### 
-#  validate object o according to a schema keeping track of selectors (sels)
-#  that are used to identify errors 
-#  return "" if no error otherwise returns an error message
-def validate(sels,schema,parent,o):
-    global traceValidate
-    if traceValidate: print ("$$validate:%s:%s:%s"%("/".join(sels),showVal(schema),showVal(o)))
-    if "oneOf" in schema:
-        allMess=[]
-        for alt in schema["oneOf"]:
-            mess=validate(sels,alt,schema,o)
-            if traceValidate: print ("$$$"+showVal(alt)+"=>"+mess)
-            if mess=="":
-                return ""
-            allMess.append(mess)
+class SchemaNode:
+    """base class of the nodes of a compiled schema"""
+    def validate(self,sels,o):
+        return ""
+
+    def isValid(self,o):
+        return True
+
+    ## python types of the values that can be valid, None when any type can be
+    def acceptedTypes(self,visited):
+        return None
+
+    ## replace each node linked to this one by link(node,step) where step is the step of the json path
+    #  from this node to the linked one (a field, "*" for any field, "[]" for items, "|i" for the i-th alternative)
+    def relink(self,link):
+        pass
+
+    ## line printed when the node validates a value while tracing, None for no line
+    def traceLine(self,sels,o):
+        return None
+
+class SchemaErrorNode(SchemaNode):
+    """schema that cannot be used for validation: report the error for every value"""
+    def __init__(self,mess,infos):
+        self.mess=mess
+        self.infos=infos
+
+    def validate(self,sels,o):
+        return errorSchema(sels,self.mess,self.infos)
+
+    def isValid(self,o):
+        return False
+
+    def acceptedTypes(self,visited):
+        return set()
+
+class OneOfNode(SchemaNode):
+    """the value must match one of the alternatives
+       the alternatives to try are found in a dispatch table indexed by the python type of the value,
+       an object alternative being tried only when the value has its discriminating required field"""
+    def __init__(self,alternatives):
+        self.alternatives=alternatives
+        self.dispatch=None      # python type => list of (alternative, required field or None)
+        self.allCandidates=None # list of (alternative, None) for values of other types
+
+    def validate(self,sels,o):
+        if self.isValid(o):
+            return ""
+        found=getattr(errorKinds,"found",None)
+        errorKinds.found=None # the errors of the alternatives are not counted
+        try:
+            allMess=[alt.validate(sels,o) for alt in self.alternatives]
+        finally:
+            errorKinds.found=found
+        addErrorKind(errorPath(sels)+":does not match any alternative:")
         return showVal(o)+" does not match any alternative:\n -"+" -".join(allMess) # returns combined error message
-    if "type" in schema :
-        theType=schema['type']
-        if theType in ["integer","number","boolean","string","boolean","null"]:
-            valid=validateSimpleType(sels,theType,o)
-            if valid!="": return valid
-            return validateFacets(sels,schema,o)
-        if theType=="object":
-            if type(o) is dict:
-                # check length of object
-                nbProps=len(o)
-                valid=""
-                # print ("nbProps:%d,%d,%d"%(nbProps,schema["minProperties"],schema["maxProperties"]))
-                if "minProperties" in schema:
-                    if nbProps<schema["minProperties"]:
-                        valid+=errorValidate(sels,"object length less than "+str(schema["minProperties"]),showVal(o))
-                if "maxProperties" in schema:
-                    if nbProps>schema["maxProperties"]:
-                        valid+=errorValidate(sels,"object length greater than "+str(schema["maxProperties"]),showVal(o))
-                # check properties
-                if "additionalProperties" in schema and type(schema["additionalProperties"]) is not bool:
-                    # validate only values, not field names
-                    for field in iter(o):
-                        newSels=list(sels)
-                        newSels.append(field)
-                        valid+=validate(newSels,schema["additionalProperties"],parent,o[field])
-                    return valid
-                elif 'properties' in schema:
-                    if "required" in schema:
-                        return validateProperties(sels,schema['properties'],schema['required'],schema,o)
-                    else:
-                        return errorSchema(sels,"'required' field not in schema","")
-                else:
-                    return valid # no property validation when there is no 'properties' field
+
+    def isValid(self,o):
+        candidates=self.dispatch.get(type(o),self.allCandidates)
+        for (alt,field) in candidates:
+            if field is not None and field not in o:
+                continue
+            if alt.isValid(o):
+                return True
+        return False
+
+    def acceptedTypes(self,visited):
+        if id(self) in visited:
+            return set()
+        visited.add(id(self))
+        types=set()
+        for alt in self.alternatives:
+            altTypes=alt.acceptedTypes(visited)
+            if altTypes is None:
+                return None
+            types|=altTypes
+        return types
+
+    def relink(self,link):
+        linked={}
+        for (i,alt) in enumerate(self.alternatives):
+            if id(alt) not in linked:
+                linked[id(alt)]=link(alt,"|%d"%i)
+        self.alternatives=[linked[id(alt)] for alt in self.alternatives]
+        self.allCandidates=[(linked[id(alt)],field) for (alt,field) in self.allCandidates]
+        self.dispatch={pythonType:[(linked[id(alt)],field) for (alt,field) in candidates]
+                       for (pythonType,candidates) in self.dispatch.items()}
+
+    def traceLine(self,sels,o):
+        return "$$validate:oneOf:%s:%s"%("/".join(sels),showVal(o))
+
+    ## build the dispatch table once all the nodes of the schema have been linked
+    def buildDispatch(self):
+        altTypes=[alt.acceptedTypes(set()) for alt in self.alternatives]
+        # discriminating field of object alternatives: the required field needed by the fewest other alternatives
+        requiredFields=[set(alt.required) if type(alt) is ObjectNode and alt.additionalProperties is None
+                                             and alt.properties is not None and alt.required
+                                          else set()
+                        for alt in self.alternatives]
+        fields=[]
+        for (i,alt) in enumerate(self.alternatives):
+            field=None
+            if len(requiredFields[i])>0:
+                field=min(alt.required,key=lambda f:sum(1 for (j,req) in enumerate(requiredFields) if j!=i and f in req))
+            fields.append(field)
+        self.allCandidates=[(alt,None) for alt in self.alternatives]
+        self.dispatch={}
+        for pythonType in [str,int,float,bool,type(None),dict,list]:
+            self.dispatch[pythonType]=[(alt,fields[i] if pythonType is dict else None)
+                                       for (i,alt) in enumerate(self.alternatives)
+                                       if altTypes[i] is None or pythonType in altTypes[i]]
+
+## type checks of the simple types, named functions so that the compiled nodes can be pickled
+def isInteger(value):
+    return type(value) is int
+def isNumber(value):
+    return isinstance(value,(int,float))
+def isBoolean(value):
+    return type(value) is bool
+def isNull(value):
+    return value is None
+
+simpleTypeChecks={
+    "string" :isString,
+    "integer":isInteger,
+    "number" :isNumber,
+    "boolean":isBoolean,
+    "null"   :isNull,
+}
+
+## python types of the values of the simple types
+simpleTypeClasses={
+    "string" :{str},
+    "integer":{int},
+    "number" :{int,float,bool},
+    "boolean":{bool},
+    "null"   :{type(None)},
+}
+
+class SimpleTypeNode(SchemaNode):
+    """string, integer, number, boolean or null value with the facets that apply to its type"""
+    def __init__(self,theType,facets):
+        self.theType=theType
+        self.typeCheck=simpleTypeChecks[theType]
+        self.expected=theType+" expected:"
+        self.facets=facets # list of facet checks
+
+    def validate(self,sels,o):
+        if not self.typeCheck(o):
+            return errorValidate(sels,self.expected,showVal(o))
+        valid=""
+        for facet in self.facets:
+            if not facet.ok(o):
+                valid+=facet.message(sels,o)
+        return valid
+
+    def isValid(self,o):
+        if not self.typeCheck(o):
+            return False
+        for facet in self.facets:
+            if not facet.ok(o):
+                return False
+        return True
+
+    def acceptedTypes(self,visited):
+        return simpleTypeClasses[self.theType]
+
+    def traceLine(self,sels,o):
+        return "$$validate:%s:%s:%s"%("/".join(sels),self.theType,showVal(o))
+
+class ObjectNode(SchemaNode):
+    """object with optional checks on its number of properties and on its properties"""
+    def __init__(self,minProperties,maxProperties):
+        self.minProperties=minProperties
+        self.maxProperties=maxProperties
+        self.additionalProperties=None # node for validating all values
+        self.properties=None           # dict of field name => node
+        self.required=None             # list of required field names
+        self.requiredSet=None
+
+    def validate(self,sels,o):
+        if type(o) is not dict:
+            return errorValidate(sels,"object expected:",showVal(o))
+        # check length of object
+        nbProps=len(o)
+        valid=""
+        if self.minProperties is not None and nbProps<self.minProperties:
+            valid+=errorValidate(sels,"object length less than "+str(self.minProperties),showVal(o))
+        if self.maxProperties is not None and nbProps>self.maxProperties:
+            valid+=errorValidate(sels,"object length greater than "+str(self.maxProperties),showVal(o))
+        # check properties
+        if self.additionalProperties is not None:
+            # validate only values, not field names
+            for field in o:
+                valid+=self.additionalProperties.validate(sels+[AnyField(field)],o[field])
+            return valid
+        if self.properties is not None:
+            if self.required is None:
+                return errorSchema(sels,"'required' field not in schema","")
+            return self.validateProperties(sels,o)
+        return valid # no property validation when there is no 'properties' field
+
+    def validateProperties(self,sels,obj):
+        valid=""
+        props=self.properties
+        # validate required fields
+        for field in self.required:
+            if field in obj:
+                valid+=props[field].validate(sels+[field],obj[field])
             else:
-                return errorValidate(sels,"object expected:",showVal(o))
-        if theType =="array":
-            if type(o) is list:
-                if 'items' in schema: 
-                    schemaItems=schema['items']
-                    valid=""
-                    newSels=list(sels)
-                    no=0
-                    for elem in o: #check each element of the array
-                        valid+=validate(newSels+["["+str(no)+"]"],schemaItems,[],elem)
-                        no+=1
-                    if "minItems" in schema:
-                        if no<schema["minItems"]:
-                            valid+=errorValidate(newSels,"array length less than "+str(schema["minItems"]),showVal(o))
-                    if "maxItems" in schema:
-                        if no>schema["maxItems"]:
-                            valid+=errorValidate(newSels,"array length greater than "+str(schema["maxItems"]),showVal(o))
-                    return valid
+                valid+=errorValidate(sels,"missing required field:"+field,"")
+        # validate the other fields of the object
+        required=self.requiredSet
+        for field in obj:
+            if field not in required: # required fields have already been validated
+                if field in props:
+                    valid+=props[field].validate(sels+[field],obj[field])
                 else:
-                    return "" # no validation when no item is defined...
-            else:
-                return errorValidate(sels,"array expected:",showVal(o))
+                    valid+=errorValidate(sels,"unexpected field in object:"+field,"","unexpected field in object:")
+        return valid
+
+    def isValid(self,o):
+        if type(o) is not dict:
+            return False
+        if self.additionalProperties is not None:
+            if not self.hasValidLength(o):
+                return False
+            additionalProperties=self.additionalProperties
+            for value in o.values():
+                if not additionalProperties.isValid(value):
+                    return False
+            return True
+        if self.properties is not None: # as in validate, the length is not checked when there are properties
+            if self.required is None:
+                return False
+            props=self.properties
+            for field in self.required:
+                if field not in o or not props[field].isValid(o[field]):
+                    return False
+            required=self.requiredSet
+            for field in o:
+                if field not in required:
+                    if field not in props or not props[field].isValid(o[field]):
+                        return False
+            return True
+        return self.hasValidLength(o)
+
+    def acceptedTypes(self,visited):
+        return {dict}
+
+    def relink(self,link):
+        if self.additionalProperties is not None:
+            self.additionalProperties=link(self.additionalProperties,"*")
+        if self.properties is not None:
+            self.properties={field:link(node,field) for (field,node) in self.properties.items()}
+
+    def traceLine(self,sels,o):
+        return "$$validate:%s:object:%s"%("/".join(sels),showVal(o))
+
+    def hasValidLength(self,o):
+        nbProps=len(o)
+        if self.minProperties is not None and nbProps<self.minProperties:
+            return False
+        if self.maxProperties is not None and nbProps>self.maxProperties:
+            return False
+        return True
+
+class ArrayNode(SchemaNode):
+    """array whose elements are validated by the items node, with optional length checks"""
+    def __init__(self,minItems,maxItems):
+        self.minItems=minItems
+        self.maxItems=maxItems
+        self.items=None
+
+    def validate(self,sels,o):
+        if type(o) is not list:
+            return errorValidate(sels,"array expected:",showVal(o))
+        if self.items is None:
+            return "" # no validation when no item is defined...
+        items=self.items
+        valid=""
+        no=0
+        for elem in o: #check each element of the array
+            valid+=items.validate(sels+[ItemIndex("["+str(no)+"]")],elem)
+            no+=1
+        if self.minItems is not None and no<self.minItems:
+            valid+=errorValidate(sels,"array length less than "+str(self.minItems),showVal(o))
+        if self.maxItems is not None and no>self.maxItems:
+            valid+=errorValidate(sels,"array length greater than "+str(self.maxItems),showVal(o))
+        return valid
+
+    def isValid(self,o):
+        if type(o) is not list:
+            return False
+        if self.items is None:
+            return True
+        items=self.items
+        for elem in o:
+            if not items.isValid(elem):
+                return False
+        nbItems=len(o)
+        if self.minItems is not None and nbItems<self.minItems:
+            return False
+        if self.maxItems is not None and nbItems>self.maxItems:
+            return False
+        return True
+
+    def acceptedTypes(self,visited):
+        return {list}
+
+    def relink(self,link):
+        if self.items is not None:
+            self.items=link(self.items,"[]")
+
+    def traceLine(self,sels,o):
+        return "$$validate:%s:array:%s"%("/".join(sels),showVal(o))
+
+################################################################################################
+#### nodes wrapping the nodes of a compiled schema for tracing or profiling the validation
+##   they are linked in place of the nodes they wrap only when the schema is traced or profiled,
+##   so that the validation of a schema that is not costs nothing more
+
+class TracedNode(SchemaNode):
+    """node printing the values validated by the node it wraps"""
+    def __init__(self,node):
+        self.node=node
+
+    def validate(self,sels,o):
+        line=self.node.traceLine(sels,o)
+        if line is not None:
+            print (line)
+        return self.node.validate(sels,o)
+
+    def isValid(self,o):
+        return self.node.isValid(o)
+
+    def acceptedTypes(self,visited):
+        return self.node.acceptedTypes(visited)
+
+## set in a thread while the messages of an invalid object are built by validate after isValid has failed
+diagnosing=threading.local()
+
+class ProfiledNode(SchemaNode):
+    """node counting the calls, the failures and the time of the validations of the node it wraps,
+       the counter (a list [calls,failures,seconds,diagnosticCalls,diagnosticSeconds]) being shared by
+       the wrappers of the same path; the calls of the fast path (isValid) are counted apart from those
+       of the diagnostic pass (validate) that builds the messages of an invalid object, so that an object
+       is counted once by the fast path"""
+    def __init__(self,node,counter):
+        self.node=node
+        self.counter=counter
+
+    def validate(self,sels,o):
+        if getattr(diagnosing,"on",False):
+            start=time.perf_counter()
+            mess=self.node.validate(sels,o)
+            self.countDiagnostic(start)
+            return mess
+        diagnosing.on=True # the nodes called by this one are also in the diagnostic pass
+        try:
+            start=time.perf_counter()
+            mess=self.node.validate(sels,o)
+            self.countDiagnostic(start)
+        finally:
+            diagnosing.on=False
+        return mess
+
+    def isValid(self,o):
+        start=time.perf_counter()
+        valid=self.node.isValid(o)
+        if getattr(diagnosing,"on",False):
+            self.countDiagnostic(start)
         else:
-            return errorSchema(sels,"unexpected type:",str(theType))
-    if "$ref" in schema: # hack replace in the schema the type reference by its definition 
+            counter=self.counter
+            counter[2]+=time.perf_counter()-start
+            counter[0]+=1
+            if not valid:
+                counter[1]+=1
+        return valid
+
+    def countDiagnostic(self,start):
+        counter=self.counter
+        counter[4]+=time.perf_counter()-start
+        counter[3]+=1
+
+    def acceptedTypes(self,visited):
+        return self.node.acceptedTypes(visited)
+
+###
+#  link wrappers in place of the nodes of a compiled schema whose root is given, wrap(node,path) giving the wrapper
+#  of a node at a json path (a list of steps) starting with the name of the definition in which the node is used,
+#  names giving the name of the definition of a node by its id; returns the wrapper of the root
+#  The nodes are relinked only once, even when they are used in many places, and the json path of the use of
+#  a node stops at its definition, so that the paths are finite even for recursive schemas.
+def instrument(root,names,wrap):
+    relinked=set()
+    def relink(node,path):
+        if id(node) in relinked:
+            return
+        relinked.add(id(node))
+        def link(child,step):
+            childPath=path+[step]
+            wrapper=wrap(child,childPath)
+            if id(child) not in names:
+                relink(child,childPath)
+            return wrapper
+        node.relink(link)
+    for (nodeId,(name,node)) in names.items():
+        relink(node,[name])
+    rootName=names[id(root)][0] if id(root) in names else "start"
+    relink(root,[rootName])
+    return wrap(root,[rootName])
+
+## facet checks of simple types: ok(value) tells if the value satisfies the facet,
+#  message(sels,value) gives the error message of a value that does not
+class MinimumFacet:
+    def __init__(self,low):
+        self.low=low
+    def ok(self,value):
+        return not(value < self.low)
+    def message(self,sels,value):
+        return errorValidate(sels,"illegal value:",str(value)+" < "+str(self.low))
+
+class ExclusiveMinimumFacet:
+    def __init__(self,low):
+        self.low=low
+    def ok(self,value):
+        return not(value <= self.low)
+    def message(self,sels,value):
+        return errorValidate(sels,"illegal value:",str(value)+" <= "+str(self.low)+" excl")
+
+class MaximumFacet:
+    def __init__(self,high):
+        self.high=high
+    def ok(self,value):
+        return not(value > self.high)
+    def message(self,sels,value):
+        return errorValidate(sels,"illegal value:",str(value)+" > "+str(self.high))
+
+class ExclusiveMaximumFacet:
+    def __init__(self,high):
+        self.high=high
+    def ok(self,value):
+        return not(value >= self.high)
+    def message(self,sels,value):
+        return errorValidate(sels,"illegal value:",str(value)+" >= "+str(self.high)+" excl")
+
+class PatternFacet:
+    def __init__(self,pattern):
+        self.pattern=pattern
+        self.regex="^"+pattern+"$"   # the whole value must match the pattern, i.e. an "anchored match"
+        self.lastFailure=None # (value,outcome) of the last value that did not match
+        try:
+            self.compiled=compilePattern(pattern)
+            self.error=None
+        except re.error as err:
+            self.compiled=None
+            self.error=str(err)
+    ## a pickled facet keeps only its pattern, compiled again when loaded according to the current regexTimeout
+    def __getstate__(self):
+        return self.pattern
+    def __setstate__(self,pattern):
+        self.__init__(pattern)
+    ## True when the value matches, False when it does not and None when the match takes more than regexTimeout
+    #  the outcome of the last value that did not match is kept, so that the message of an invalid value
+    #  (built after the fast path has found it invalid) does not match it again, a catastrophic value costing
+    #  a single time budget and its message always agreeing with the verdict of the fast path
+    def outcome(self,value):
+        lastFailure=self.lastFailure
+        if lastFailure is not None and lastFailure[0]==value:
+            return lastFailure[1]
         try:
-            typeref=schema["$ref"]
-            newType=deref(typeref.split("/"),parent)
-            schema.update(newType)
-            del schema["$ref"]
-            return validate(sels+["("+typeref+")"],schema,parent,o)
-        except NameError as err: # we could not dereference...
-            return str(err)+" in "+typeref
-    return errorSchema(sels,"Schema without type, oneOf nor $ref:",showVal(schema))
-
-def validateProperties(sels,props,required,parent,obj):
-    global traceValidate
-    if traceValidate:print ("$$validateProperties:%s:%s:%s"%(showVal(props),str(required),showVal(obj)))
-    valid=""
-    if not(type(obj) is dict):
-        return errorValidate(sels,"object expected:",showVal(obj))
-    # validate required fields
-    for field in required:
-        if field in obj:
-            newSels=list(sels) # update selector list
-            newSels.append(field)
-            valid+=validate(newSels,props[field],parent,obj[field])
+            matched=fullmatch(self.compiled,value) is not None
+        except (PatternTimeout,TimeoutError):
+            matched=None
+        if not matched:
+            self.lastFailure=(value,matched)
+        return matched
+    def ok(self,value):
+        if self.compiled is None:
+            return False
+        return self.outcome(value) is True
+    def message(self,sels,value):
+        if self.compiled is None:
+            return errorSchema(sels,"illegal pattern:",self.regex+" : "+self.error)
+        matched=self.outcome(value)
+        if matched:
+            return ""
+        if matched is None:
+            return errorValidate(sels,"pattern match timeout:",self.regex+"<>"+showVal(value))
+        return errorValidate(sels,"no match:",self.regex+"<>"+value)
+
+class MinLengthFacet:
+    def __init__(self,low):
+        self.low=low
+    def ok(self,value):
+        return not(len(value) < self.low)
+    def message(self,sels,value):
+        return errorValidate(sels,"illegal length:",str(len(value))+" < "+str(self.low))
+
+class MaxLengthFacet:
+    def __init__(self,high):
+        self.high=high
+    def ok(self,value):
+        return not(len(value) > self.high)
+    def message(self,sels,value):
+        return errorValidate(sels,"illegal length:",str(len(value))+" > "+str(self.high))
+
+## patterns shared by all the pattern facets, each one is compiled only once
+compiledPatterns={}
+def compilePattern(pattern):
+    useRegexModule=regexTimeout is not None and regexModule is not None
+    key=(pattern,useRegexModule)
+    if key not in compiledPatterns:
+        compiledPatterns[key]=(regexModule if useRegexModule else re).compile(pattern)
+    return compiledPatterns[key]
+
+## match the whole value within the time budget, according to the module that compiled the pattern
+def fullmatch(compiled,value):
+    if regexTimeout is None:
+        return compiled.fullmatch(value)
+    if not isinstance(compiled,re.Pattern): # compiled by the regex module
+        return compiled.fullmatch(value,timeout=regexTimeout)
+    if threading.current_thread() is not threading.main_thread():
+        return compiled.fullmatch(value)
+    signal.setitimer(signal.ITIMER_REAL,regexTimeout)
+    try:
+        return compiled.fullmatch(value)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL,0)
+
+## facets checked for each simple type in the order of their checks
+numericFacets=[("minimum",MinimumFacet),("exclusiveMinimum",ExclusiveMinimumFacet),
+               ("maximum",MaximumFacet),("exclusiveMaximum",ExclusiveMaximumFacet)]
+stringFacets=[("pattern",PatternFacet),("minLength",MinLengthFacet),("maxLength",MaxLengthFacet)]
+typeFacets={"integer":numericFacets,"number":numericFacets,"string":stringFacets,"boolean":[],"null":[]}
+
+### find a definition within the root schema using a selector such as "#/definitions/person"
+def deref(typeref,rootSchema):
+    selects=typeref.split("/")
+    if selects[0]!="#":
+        raise NameError("could not find:"+selects[0]+" in "+typeref)
+    schema=rootSchema
+    for field in selects[1:]:
+        if type(schema) is dict and field in schema:
+            schema=schema[field]
         else:
-            valid+=errorValidate(sels,"missing required field:"+field,"")
-    # validate the other fields of the object
-    # validate if fields are present or not
-    for field in iter(obj):
-        if field not in required: # required fields have already been validated
-            newSels=list(sels)    # update the selector list
-            newSels.append(field)
-            if field in props:
-                valid+=validate(newSels,props[field],parent,obj[field])
-            else:
-                valid+=errorValidate(sels,"unexpected field in object:"+field,"")
-    return valid
-
-def validateSimpleType(sels,schemaType,value):
-    global traceValidate
-    if traceValidate:print( "$$validateSimpleType:%s:%s:%s"%(str(schemaType),showVal(value),str(type(value))))
-    if schemaType=="string":
-        return "" if isString(value) \
-                  else errorValidate(sels,"string expected:",showVal(value)) 
-    if schemaType=="integer":
-        return "" if type(value) is int \
-                  else errorValidate(sels,"integer expected:",showVal(value))
-    if schemaType=="number":
-        return "" if isinstance(value,(int,float)) \
-                  else errorValidate(sels,"number expected:",showVal(value))
-    if schemaType=="boolean":
-        return "" if type(value) is bool \
-                  else errorValidate(sels,"boolean expected:",showVal(value))
-    if schemaType=="null":
-        return "" if value==None \
-                  else errorValidate(sels,"null expected:",showVal(value))
-    return errorSchema(sels,"unknown schemaType:",schemaType)
-
-def validateFacets(sels,schema,value):
-    global traceValidate
-    if traceValidate:print ("$$validateFacets:%s:%s"%(str(schema),str(value)))
-    valid=""
-    theType=schema["type"]
-    if theType in ["integer","number"]:
-        if isinstance(value,(int,float)):
-            if "minimum" in schema:
-                low=schema["minimum"]
-                if value < low :
-                    valid+=errorValidate(sels,"illegal value:",str(value)+" < "+str(low))
-            if "exclusiveMinimum" in schema:
-                low=schema["exclusiveMinimum"]
-                if value <= low : 
-                    valid+=errorValidate(sels,"illegal value:",str(value)+" <= "+ str(low)+" excl")
-            if "maximum" in schema:
-                high=schema["maximum"]
-                if value > high :
-                    valid+=errorValidate(sels,"illegal value:",str(value)+" > "+str(high))
-            if "exclusiveMaximum" in schema:
-                high=schema["exclusiveMaximum"]
-                if value >= high : 
-                   valid+=errorValidate(sels,"illegal value:",str(value)+" >= "+ str(high)+" excl")
+            raise NameError("could not find:"+field+" in "+typeref)
+    return schema
+
+### follow a reference (and the references it leads to) up to a schema that is not a reference
+#   the facets given along the references are merged with the definition, the definition having precedence
+#   returns the definition itself when nothing has to be merged so that its node is shared
+def resolveRef(schema,rootSchema):
+    seen=[]
+    merged=None
+    while "$ref" in schema:
+        typeref=schema["$ref"]
+        if typeref in seen:
+            raise NameError("circular reference:"+" => ".join(seen+[typeref]))
+        seen.append(typeref)
+        definition=deref(typeref,rootSchema)
+        if type(definition) is not dict:
+            raise NameError("not a schema:"+typeref)
+        if len(schema)>1 or merged is not None:
+            merged=dict(schema)
+            del merged["$ref"]
+            merged.update(definition)
+            schema=merged
         else:
-            valid+=errorValidate(sels,"numeric value expected:",value)
-    if theType=="string":
-        if isString(value):
-            if "pattern" in schema:
-                regex="^"+schema["pattern"]+"$"   # do an "anchored match" of the regex
-                valid += "" if re.match(regex,value) \
-                            else errorValidate(sels,"no match:",regex+"<>"+value)
-            length=len(value)
-            if "minLength" in schema :
-                low = schema["minLength"]
-                if length<low:
-                    valid+=errorValidate(sels,"illegal length:",str(length)+" < "+str(low))
-            if "maxLength" in schema :
-                high = schema["maxLength"]
-                if length>high:
-                    valid+=errorValidate(sels,"illegal length:",str(length)+" > "+str(high))
+            schema=definition
+    return schema
+
+### 
+#  compile a schema (a dict corresponding to a JSON schema) into a tree of nodes
+#  the node compiled for a sub-schema is shared by all its uses and is created before its children,
+#  so references are linked directly to the node of their definition, even recursive ones
+#  raises NameError listing the references that cannot be resolved
+#  when trace is True, the nodes print the values they validate
+#  when profile is a dict, the calls, failures and time of the validations of the nodes are counted in it:
+#  the json path of the use of a node (a string such as "person/address") => [calls,failures,seconds]
+def compileSchema(rootSchema,trace=False,profile=None):
+    compiled={}  # id of a schema dict => node
+    merges=[]    # merged schemas are kept so that their id is not reused
+    errors=[]
+
+    def comp(schema):
+        key=id(schema)
+        if key in compiled:
+            return compiled[key]
+        if "oneOf" in schema:
+            node=OneOfNode([])
+            compiled[key]=node
+            node.alternatives=[comp(alt) for alt in schema["oneOf"]]
+        elif "type" in schema:
+            theType=schema["type"]
+            if theType in typeFacets:
+                node=SimpleTypeNode(theType,[makeFacet(schema[facet]) for (facet,makeFacet) in typeFacets[theType]
+                                                                       if facet in schema])
+                compiled[key]=node
+            elif theType=="object":
+                node=ObjectNode(schema.get("minProperties"),schema.get("maxProperties"))
+                compiled[key]=node
+                additionalProperties=schema.get("additionalProperties")
+                if additionalProperties is not None and type(additionalProperties) is not bool:
+                    node.additionalProperties=comp(additionalProperties)
+                elif "properties" in schema:
+                    node.properties={field:comp(prop) for (field,prop) in schema["properties"].items()}
+                    if "required" in schema:
+                        node.required=schema["required"]
+                        node.requiredSet=set(node.required)
+                        for field in node.required:
+                            if field not in node.properties:
+                                node.properties[field]=SchemaErrorNode("required field without schema:",field)
+            elif theType=="array":
+                node=ArrayNode(schema.get("minItems"),schema.get("maxItems"))
+                compiled[key]=node
+                if "items" in schema:
+                    node.items=comp(schema["items"])
+            else:
+                node=SchemaErrorNode("unexpected type:",str(theType))
+                compiled[key]=node
+        elif "$ref" in schema:
+            try:
+                definition=resolveRef(schema,rootSchema)
+            except NameError as err:
+                if str(err) not in errors:
+                    errors.append(str(err))
+                node=SchemaErrorNode(str(err),"")
+                compiled[key]=node
+                return node
+            merges.append(definition)
+            node=comp(definition)
+            compiled[key]=node
         else:
-            valid+=errorValidate(sels,"string expected:",str(value))
-    return valid
+            node=SchemaErrorNode("Schema without type, oneOf nor $ref:",showVal(schema))
+            compiled[key]=node
+        return node
+
+    root=comp(rootSchema)
+    # link all definitions, even unused ones, to report all dangling references
+    definitions=rootSchema.get("definitions",{})
+    for name in definitions:
+        if type(definitions[name]) is dict:
+            node=comp(definitions[name])
+            # a oneOf cannot have itself as an alternative without going through an object or an array
+            if type(node) is OneOfNode and oneOfReaches(node,node,set()):
+                errors.append("left recursive definition:"+name)
+    if len(errors)>0:
+        raise NameError("\n".join(errors))
+    for node in compiled.values():
+        if type(node) is OneOfNode and node.dispatch is None:
+            node.buildDispatch()
+    names={} # id of the node of a definition => (name of the definition,node)
+    for name in definitions:
+        if type(definitions[name]) is dict:
+            node=compiled[id(definitions[name])]
+            names.setdefault(id(node),(name,node))
+    if profile is not None: # the nodes are not traced while profiling
+        def profiled(node,path):
+            return ProfiledNode(node,profile.setdefault("/".join(path),[0,0,0.0,0,0.0]))
+        root=instrument(root,names,profiled)
+    elif trace:
+        traced={} # a single wrapper for each node
+        def tracedNode(node,path):
+            if id(node) not in traced:
+                traced[id(node)]=TracedNode(node)
+            return traced[id(node)]
+        root=instrument(root,names,tracedNode)
+    return root
+
+def oneOfReaches(node,target,visited):
+    for alt in node.alternatives:
+        if alt is target:
+            return True
+        if type(alt) is OneOfNode and id(alt) not in visited:
+            visited.add(id(alt))
+            if oneOfReaches(alt,target,visited):
+                return True
+    return False
 
 ### show n ,an integer, with a space as a blank separator right aligned 
 ##              in a field of 'width' chars (expanded if necessary)
@@ -229,39 +769,115 @@ def showNum(n,width=0):
     s+=res
     return (width-len(s))*" "+s
 
-# error type table for statistics
-errorTable={}
-def printErrorStatistics():
-    global errorTable
-    if len(errorTable)==0:return
-    errors=sorted(errorTable.items(),key=lambda i:i[1],reverse=True)
-    print ("Error Statistics")
-    for (mess,nb) in errors:
-        print (showNum(nb,15)+"\t"+mess)
-
-# list of ids of erroneous objects
-errorIdList=[]
-def printErrorIdList():
-    global errorIdList
-    print (";".join([id+"p" for id in errorIdList]))
-
-## validate a single json object (json), identified by recordId (a string), according to a json schema
-def validateObject(obj,recordId, schema,logMessages,traceRead):
-    global rootSchema,errorTable, errorIdList,traceValidate
-    rootSchema=schema
-    traceValidate=traceRead
-    mess=validate([],schema,None,obj)
-    if mess!="":
-        errorIdList.append(recordId)
-        if logMessages:
-            print (recordId+":"+showVal(obj,100)+"\n"+mess,end="")
-        for messLine in mess.split("\n")[0:-1]: ## mess can contain more than one error message
-            messType=":".join(messLine.split("\t")[0:2])
-            if messType in errorTable: 
-                errorTable[messType]+=1
-            else: 
-                errorTable[messType]=1
-            if re.search("does not match any alternative",messLine):
-                break # stats for only the first line of alternative errors 
-        return False
-    return True
+################################################################################################
+#### validation of json objects according to a schema with statistics on the error messages
+
+class Validator:
+    """validator of json objects according to a schema (a dict corresponding to a JSON schema) that keeps
+       its compiled schema and the statistics of the errors of the objects it validates, so that many
+       validators can be used in the same process. The compiled schema is only read while validating and
+       the statistics are updated under a lock, so validate and validate_many can be called from many threads."""
+    def __init__(self,schema,trace=False,compiledSchema=None,profile=False):
+        self.schema=schema
+        self.trace=trace
+        self.profile={} if profile else None # json path => [calls,failures,seconds,diagnosticCalls,diagnosticSeconds]
+        if compiledSchema==None: # otherwise the compiled schema of the same schema shared with another validator
+            # raises NameError listing the errors in the schema
+            compiledSchema=compileSchema(schema,trace,self.profile)
+        self.compiledSchema=compiledSchema
+        self.lock=threading.Lock()
+        self.errorTable=ErrorCounter() # kind of error => number of occurrences and examples of records
+        self.errorIdList=[] # ids of erroneous objects
+        self.keepErrorIds=True # when False, the ids of erroneous objects are not added to errorIdList
+
+    ## messages of the errors of an object, "" when it is valid, without changing the statistics
+    def errors(self,obj):
+        if not self.trace and self.compiledSchema.isValid(obj):
+            return ""
+        return self.compiledSchema.validate([],obj) # build the messages only for an invalid object
+
+    ## (messages,kinds) of the errors of an object, ("",None) when it is valid, kinds being the list of the kinds
+    #  of its errors for the statistics, without changing them
+    #  valid is the verdict of the fast path when it is already known, so that it is not run again
+    def errorsAndKinds(self,obj,valid=None):
+        if not self.trace:
+            if valid==None:
+                valid=self.compiledSchema.isValid(obj)
+            if valid:
+                return ("",None)
+        found=getattr(errorKinds,"found",None)
+        errorKinds.found=[]
+        try:
+            mess=self.compiledSchema.validate([],obj)
+            kinds=errorKinds.found
+        finally:
+            errorKinds.found=found
+        return (mess,kinds) if mess!="" else ("",None)
+
+    ## messages of the errors of an object, "" when it is valid, the errors being added to the statistics
+    #  for the object identified by recordId (a string)
+    def validate(self,obj,recordId=None):
+        (mess,kinds)=self.errorsAndKinds(obj)
+        if mess!="":
+            self.addErrors(recordId,kinds)
+        return mess
+
+    ## generator of the messages of the errors of each object of an iterable, the objects being identified
+    #  by their position from 1 in the statistics
+    def validate_many(self,objs):
+        for (nb,obj) in enumerate(objs,1):
+            yield self.validate(obj,str(nb))
+
+    ## add the kinds of the errors of an object identified by recordId (not added to the list of ids when None)
+    def addErrors(self,recordId,kinds):
+        with self.lock:
+            if recordId!=None and self.keepErrorIds:
+                self.errorIdList.append(recordId)
+            for kind in kinds:
+                self.errorTable.add(kind,recordId)
+
+    ## print the number of occurrences of each kind of error, the most frequent first, followed by the ids
+    #  of a few records having it when showExamples is True
+    def printErrorStatistics(self,showExamples=False):
+        if len(self.errorTable)==0:return
+        print ("Error Statistics")
+        for (kind,nb) in self.errorTable.items():
+            examples=self.errorTable.examples[kind] if showExamples else []
+            print (showNum(nb,15)+"\t"+kind+("\t"+";".join(examples) if examples else ""))
+        overEstimation=self.errorTable.maxError()
+        if overEstimation>0: # only when more than errorTable.capacity kinds of errors were found
+            print ("Counts over-estimated by at most %s, less frequent kinds of errors having been replaced"%showNum(overEstimation))
+
+    ## print on a file the counts of the nodes of a profiled schema, the slowest first
+    #  a line for each json path: calls, failures, seconds, microseconds per call of the fast path, then
+    #  calls and seconds of the diagnostic pass that builds the messages of the invalid objects
+    #  (the time of a node includes that of its children)
+    def printProfile(self,file=sys.stdout):
+        if self.profile==None:return
+        counters=sorted(self.profile.items(),key=lambda i:(i[1][2],i[1][0]),reverse=True)
+        print ("%15s %15s %12s %10s %15s %12s  %s"%("calls","failures","seconds","us/call",
+                                                  "diag. calls","diag. secs","json path"),file=file)
+        for (path,(calls,failures,seconds,diagCalls,diagSeconds)) in counters:
+            if calls==0 and diagCalls==0:continue
+            print ("%s %s %12.6f %10.2f %s %12.6f  %s"%(showNum(calls,15),showNum(failures,15),seconds,
+                                                        1e6*seconds/calls if calls>0 else 0,
+                                                        showNum(diagCalls,15),diagSeconds,path),file=file)
+
+    def printErrorIdList(self):
+        print (";".join([id+"p" for id in self.errorIdList]))
+
+    ## take the statistics gathered up to now and restart new ones
+    #  used by the processes that validate parts of a file
+    def takeErrorStatistics(self):
+        with self.lock:
+            stats=(self.errorTable,self.errorIdList)
+            self.errorTable=ErrorCounter(self.errorTable.capacity)
+            self.errorIdList=[]
+        return stats
+
+    ## add statistics gathered by another validator, table being its ErrorCounter (or a dict kind => count)
+    def mergeErrorStatistics(self,table,idList):
+        with self.lock:
+            self.errorTable.merge(table)
+            if self.keepErrorIds:
+                self.errorIdList.extend(idList)
@@ -6,147 +6,553 @@
 ##   revision for adding statistics on error messages, May 2015
 ########################################################################
 
-import pprint,json,os,datetime,argparse,sys
+import pprint,os,argparse,sys,io,mmap,contextlib,multiprocessing,itertools,time
 
 ## flag for debugging
 traceRead=False
 
-from ppJson             import ppJson
+## file of the report of the profiling of the nodes of the schema, None when they are not profiled
+profileFile=None
+
 from ParseJsonRnc       import parseJsonRnc
+import SchemaCache
 from SplitJson          import jsonSplitter
-from ValidateJsonObject import validateObject,errorSchema,printErrorStatistics,printErrorIdList,showNum
+from CompressedInput    import openInput,isCompressed,stdinInput
+from Sampling           import everyNth,reservoirSample,rateIsKnown,showRate
+import Checkpoint
+import Progress
+from Progress           import ProgressMeter
+from ValidationCache    import ValidationCache,schemaKey,validOutcome
+from BatchValidation    import BatchValidator
+from Quarantine         import Quarantine
+from Checkpoint         import saveCheckpoint,loadCheckpoint,removeCheckpoint
+from DecodeJson         import decodeJson,jsonDecoders,setJsonDecoder
+import DecodeJson
+import UniqueValues
+from UniqueValues       import UniqueValueSet
+import ErrorStatistics
+import ValidateJsonObject
+from ValidateJsonObject import Validator,showVal,errorSchema,showNum,setRegexTimeout
 
 # recursively search for a value in an object
 # sels is a list of field names
 def select(sels,obj):
     if len(sels)==0:return obj
     s=sels[0]
-    if s in obj: 
+    if type(obj) is dict and s in obj:
         return select(sels[1:],obj[s])
     else: 
         return None
 
-# detect possible duplicate pairs in a Json object
-# adapted from http://stackoverflow.com/questions/16172011/json-in-python-receive-check-duplicate-key-error
-def duplicate_check_hook(pairs):
-    result = dict()
-    for key,val in pairs:
-        if key in result:
-            raise KeyError("duplicate key: "+key)
-        result[key]=val
-    return result
-
 
-###########
-### validate a stream of json objects within a file according to a schema
-#   prints the number of invalid objects
-#   when no message are logged, print something on stderr every 10000 records
-def validateStream(schema,idStr,stream,logMessages):
+## validator of a schema after checking its version
+#  returns None after printing the errors found in the schema
+def compileJsonSchema(schema):
     if '$schema' not in schema or schema['$schema']!='http://json-schema.org/draft-07/schema#':
         print (errorSchema([],"bad schema!!!",""))
+        return None
+    try:
+        return Validator(schema,traceRead,profile=profileFile!=None)
+    except NameError as err:
+        for mess in str(err).split("\n"):
+            print (errorSchema([],mess,""),end="")
+        return None
+
+## function giving the value of the id of an object (None when no id is used)
+def idFunction(idStr):
+    if idStr==None:return None
+    sels=idStr.split("/")
+    return lambda o:select(sels,o)
+
+## JSON pointers of fields whose values must be unique among the records, in addition to the id
+uniquePointers=[]
+
+## list of (name,function) giving the values of an object that must be unique, the id being the first one
+#  followed by those of the pointers (uniquePointers by default)
+def uniqueFunctions(idStr,pointers=None):
+    fns=[] if idStr==None else [("id",idFunction(idStr))]
+    return fns+[(pointer,idFunction(pointer)) for pointer in (uniquePointers if pointers==None else pointers)]
+
+## output of the messages of the validation, on the standard output by default
+def printMessages(text):
+    print (text,end="")
+
+## returns (checkUnique,uniqueSets) where checkUnique(i,val,nb) outputs a message when the value val
+#  of the i-th unique function has already been found in a previous record, the memory for the values
+#  being shared among the sets of values (that must be closed once the validation is done)
+#  With checkpoints, the values are saved in files named after the checkpoint file, those of the records
+#  up to lastNb being restored when a validation is resumed.
+def uniqueChecker(uniqueFns,lastNb=None,output=printMessages):
+    uniqueSets=[]
+    for i in range(len(uniqueFns)):
+        dbFile=None
+        if checkpointFile!=None:
+            dbFile=checkpointFile+".unique"+str(i)
+            if lastNb==None and os.path.exists(dbFile): # left by a previous validation
+                os.remove(dbFile)
+        uniqueSets.append(UniqueValueSet(UniqueValues.uniqueMemory//len(uniqueFns),dbFile))
+        if lastNb!=None and dbFile!=None:
+            uniqueSets[-1].restore(lastNb)
+    def checkUnique(i,val,nb):
+        firstNb=uniqueSets[i].firstRecord(val,nb)
+        if firstNb!=None:
+            output("record %d :duplicate %s:%s already used for record no %d\n"%(nb,uniqueFns[i][0],val,firstNb))
+    return (checkUnique,uniqueSets)
+
+## file of the cache of the outcomes of the validation of records, None when no cache is used, and its maximum size
+cacheFile=None
+cacheSize=1<<30
+
+## open the cache of the outcomes of the validation of records according to a schema, None when no cache is used
+#  the outcomes depend on the schema and on the options giving the ids and unique values and limiting the time of a match
+def openCache(validator,idStr,**args):
+    if cacheFile==None:return None
+    return ValidationCache(cacheFile,schemaKey(validator.schema,[idStr,uniquePointers,ValidateJsonObject.regexTimeout]),cacheSize,**args)
+
+### 
+#  outcome of the validation of a single json text (inJson): (kind,id value,unique values,shown object,messages,error kinds)
+#  where kind is "valid", "invalid", "bad" (not json) or "dup" (duplicate key), unique values is the list of (i,val)
+#  for each value val of the i-th unique function of the object, the object is shown (when showObject is True)
+#  and the messages and the kinds of the errors (for the statistics) are given only for an object that is not valid
+def recordOutcome(validator,inJson,idFn,uniqueFns,showObject):
+    try:
+        if traceRead:print ("$$$inJson="+str(inJson))
+        return objectOutcome(validator,decodeJson(inJson),idFn,uniqueFns,showObject)
+    except ValueError as mess:
+        return ("bad",None,[],None," bad json object:"+str(mess),None)
+    except KeyError as mess:
+        return ("dup",None,[],None,mess.args[0],None)
+
+## outcome of the validation of a decoded object, valid being its verdict when it is already known
+def objectOutcome(validator,obj,idFn,uniqueFns,showObject,valid=None):
+    idVal=None if idFn==None else idFn(obj)
+    values=[]
+    for (i,(name,uniqueFn)) in enumerate(uniqueFns):
+        val=uniqueFn(obj)
+        if val!=None:
+            values.append((i,val))
+    (mess,kinds)=("",None) if valid else validator.errorsAndKinds(obj,valid)
+    if mess=="":
+        return validOutcome if idVal==None and len(values)==0 else ("valid",idVal,values,None,None,None)
+    return ("invalid",idVal,values,showVal(obj,100) if showObject else None,mess,kinds)
+
+## number of records validated together by columns (see BatchValidation.py), 0 for validating them one by one
+batchSize=0
+
+## True when the records are validated by blocks: the blocks are read ahead, so they are not used when the
+#  validation may stop early or is checkpointed, nor with a cache, a traced or a profiled validator
+def isBatched(validator,cache):
+    return batchSize>1 and cache==None and checkpointFile==None and maxInvalid==None and errorMargin==None \
+           and not validator.trace and validator.profile==None
+
+###
+#  generator of the (nb,(record,outcome)) of a stream of (nb,record) whose records are decoded by blocks of batchSize,
+#  the verdicts of the objects of a block being given by a BatchValidator
+def batchedOutcomes(validator,records,idFn,uniqueFns,showObject):
+    batchValidator=BatchValidator(validator.compiledSchema)
+    records=iter(records) # e.g. the list of a reservoir sample
+    block=list(itertools.islice(records,batchSize))
+    while len(block)>0:
+        outcomes=[]
+        objs=[]
+        for (nb,inJson) in block:
+            outcome=None
+            try:
+                objs.append(decodeJson(inJson))
+            except ValueError as mess:
+                outcome=("bad",None,[],None," bad json object:"+str(mess),None)
+            except KeyError as mess:
+                outcome=("dup",None,[],None,mess.args[0],None)
+            outcomes.append(outcome)
+        verdicts=iter(zip(objs,batchValidator.verdicts(objs)))
+        for ((nb,inJson),outcome) in zip(block,outcomes):
+            if outcome==None:
+                (obj,valid)=next(verdicts)
+                outcome=objectOutcome(validator,obj,idFn,uniqueFns,showObject,valid)
+            yield (nb,(inJson,outcome))
+        block=list(itertools.islice(records,batchSize))
+
+## output the messages of the outcome of the validation of the nb-th record of the input and update the statistics
+#  of the validator, counts (a dict with the number of "invalid", "bad" and "dup" objects) is updated
+#  checkUnique(i,val,nb) is called before the messages with each value val of the i-th unique function of the object
+def reportOutcome(validator,outcome,nb,checkUnique,logMessages,counts,output=printMessages):
+    (kind,idVal,values,shownObj,mess,kinds)=outcome
+    if kind=="bad" or kind=="dup":
+        if logMessages:
+            output("Item "+str(nb)+":"+mess+"\n")
+        counts[kind]+=1
         return
-    idFn=None if idStr==None else lambda o:select(idStr.split("/"),o)
-    nb=0
-    nbInvalid=0
-    nbBad=0
-    nbDup=0
-    allIds=dict()
-    for inJson in stream:
-        try:
-            if traceRead:print ("$$$inJson="+inJson)
-            nb+=1
-            obj=json.loads(inJson,object_pairs_hook=duplicate_check_hook)
-            id=str(nb)
-            if idFn!=None:
-                val=idFn(obj)
-                if val!=None:
-                    if val in allIds:  # check for duplicate id
-                        print ("record %d :duplicate id:%s already used for record no %d"%(nb,val,allIds[val]))
-                    else:
-                        allIds[val]=nb
-                    id=val
-            if not(validateObject(obj,id,schema,logMessages,traceRead)):
-                nbInvalid+=1
-            if not(logMessages) and nb%10000==0:
-                sys.stderr.write("Processing record "+str(nb)+"\n")
-        except ValueError as mess:
-            if logMessages:
-                print ("Item "+str(nb)+": bad json object:"+str(mess))
-            nbBad+=1
-        except KeyError as mess:
-            if logMessages:
-                print ("Item "+str(nb)+":"+mess.args[0])
-            nbDup+=1
-    if nbInvalid==0 and nbBad==0 and nbDup==0:
+    for (i,val) in values:
+        checkUnique(i,val,nb)
+    if kind=="invalid":
+        recordId=str(nb) if idVal==None else idVal
+        if logMessages:
+            output(recordId+":"+shownObj+"\n"+mess)
+        validator.addErrors(recordId,kinds)
+        counts["invalid"]+=1
+
+### 
+#  validate a single json text (inJson) that is the nb-th record of the input
+#  the outcome is taken from the cache when it has already been found for the same text, otherwise it is saved in it
+#  returns the outcome of the record
+def validateRecord(validator,inJson,nb,idFn,uniqueFns,checkUnique,logMessages,counts,cache=None):
+    if cache==None:
+        outcome=recordOutcome(validator,inJson,idFn,uniqueFns,logMessages)
+    else:
+        recordKey=cache.recordKey(inJson)
+        outcome=cache.lookup(recordKey)
+        if outcome==None:
+            outcome=recordOutcome(validator,inJson,idFn,uniqueFns,True)
+            cache.store(recordKey,outcome)
+    if outcome is not validOutcome:
+        reportOutcome(validator,outcome,nb,checkUnique,logMessages,counts)
+    return outcome
+
+## print the final line giving the number of objects read and of the invalid ones
+def printSummary(nb,counts):
+    if counts["invalid"]==0 and counts["bad"]==0 and counts["dup"]==0:
         if nb==1:
             print ("The object is valid")
         else:
             print ("The "+showNum(nb)+" objects are valid")
     else:
-        print (showNum(nb)+" objects read: "+showNum(nbInvalid)+" invalid, "+showNum(nbBad)+" bad, " + showNum(nbDup)+ " with duplicate fields")
-    return nbInvalid
+        print (showNum(nb)+" objects read: "+showNum(counts["invalid"])+" invalid, "+showNum(counts["bad"])+" bad, " +
+               showNum(counts["dup"])+ " with duplicate fields")
+
+## options for a quick check of a stream by validating only some of its records:
+#  one record out of sampleEvery, a random sample of reservoirSize records (when not None),
+#  stop after maxInvalid invalid records or once the rate of invalid records is known within ± errorMargin
+sampleEvery=1
+reservoirSize=None
+maxInvalid=None
+errorMargin=None
 
+def isSampling():
+    return sampleEvery>1 or reservoirSize!=None or maxInvalid!=None or errorMargin!=None
+
+## files of the outputs of the valid records and of the others (see Quarantine.py), None when they are not written,
+#  and whether the messages are written with the records of the quarantine
+validOutputFile=None
+quarantineFile=None
+quarantineMessages=False
+
+## outputs of the records according to their validation, None when they are not written
+def openQuarantine():
+    if validOutputFile==None and quarantineFile==None:return None
+    return Quarantine(validOutputFile,quarantineFile,quarantineMessages)
+
+## file in which the state of the validation is saved periodically, the validation being resumed from it when resume is True
+checkpointFile=None
+resume=False
+
+## state saved in the checkpoint file when the validation is resumed, None otherwise
+def resumeState():
+    if checkpointFile==None or not resume:return None
+    return loadCheckpoint(checkpointFile)
 
 ###########
-### validate a series of json objects within a file according to a schema
+### validate a stream of json objects within a file with a validator
+#   prints the number of invalid objects
+#   when no message are logged, print something on stderr every 10000 records
+#   when only a sample of the records is validated, the summary is about the sample and is preceded
+#   by the number of records read and the rate of invalid records in the sample
+#   With a checkpoint file, the state of the validation is saved every few seconds; when the validation is resumed,
+#   the records already validated are skipped unless the stream starts at startOffset, the byte offset of the checkpoint.
+def validateStream(validator,idStr,stream,logMessages,startOffset=0):
+    idFn=idFunction(idStr)
+    uniqueFns=uniqueFunctions(idStr)
+    nbRead=0
+    nbValidated=0
+    offset=0 # byte offset of the next record when the records are lines read as bytes, None otherwise
+    nbBytes=0 # bytes (characters for text) of the records read
+    counts={"invalid":0,"bad":0,"dup":0}
+    state=resumeState()
+    if state!=None:
+        (nbRead,nbValidated,offset,counts)=(state["nb"],state["nbValidated"],state["offset"],state["counts"])
+        validator.mergeErrorStatistics(state["errorTable"],state["errorIdList"])
+        if startOffset==0:
+            stream=itertools.islice(stream,nbRead,None)
+        nbBytes=offset or 0
+    cache=openCache(validator,idStr)
+    if cache!=None and sampleEvery==1 and reservoirSize==None: # all the records are validated
+        stream=cache.prefetch(stream)
+    def numberedRecords():
+        nonlocal nbRead,offset,nbBytes
+        for inJson in stream:
+            nbRead+=1
+            nbBytes+=len(inJson)
+            if offset!=None:
+                offset=nbBytes if isinstance(inJson,bytes) else None
+            yield (nbRead,inJson)
+    records=numberedRecords()
+    if sampleEvery>1:
+        records=everyNth(records,sampleEvery)
+    if reservoirSize!=None:
+        records=reservoirSample(records,reservoirSize)
+    (checkUnique,uniqueSets)=uniqueChecker(uniqueFns,None if state==None else nbRead)
+    stopMessage=None
+    nextCheckpoint=time.monotonic()+Checkpoint.checkpointInterval
+    progress=ProgressMeter(nbRead,nbBytes) if Progress.isReporting() else None
+    batched=isBatched(validator,cache)
+    if batched:
+        records=batchedOutcomes(validator,records,idFn,uniqueFns,logMessages)
+    quarantine=openQuarantine()
+    for (nb,record) in records:
+        nbValidated+=1
+        if batched: # the record comes with its outcome
+            (inJson,outcome)=record
+            if outcome is not validOutcome:
+                reportOutcome(validator,outcome,nb,checkUnique,logMessages,counts)
+        else:
+            inJson=record
+            outcome=validateRecord(validator,inJson,nb,idFn,uniqueFns,checkUnique,logMessages,counts,cache)
+        if quarantine!=None:
+            quarantine.write(nb,inJson,outcome)
+        if checkpointFile!=None and time.monotonic()>=nextCheckpoint:
+            for uniqueSet in uniqueSets:
+                uniqueSet.save()
+            saveCheckpoint(checkpointFile,{"nb":nbRead,"nbValidated":nbValidated,"offset":offset,"counts":counts,
+                                           "errorTable":validator.errorTable,"errorIdList":validator.errorIdList})
+            nextCheckpoint=time.monotonic()+Checkpoint.checkpointInterval
+        if progress!=None:
+            if time.monotonic()>=progress.nextReport:
+                progress.report(nbRead,nbValidated,nbBytes,counts)
+        elif not(logMessages) and nbValidated%10000==0:
+            sys.stderr.write("Processing record "+str(nb)+"\n")
+        nbInvalid=counts["invalid"]+counts["bad"]+counts["dup"]
+        if maxInvalid!=None and nbInvalid>=maxInvalid:
+            stopMessage="Validation stopped at record %d after %s invalid objects"%(nb,showNum(nbInvalid))
+            break
+        if errorMargin!=None and rateIsKnown(nbInvalid,nbValidated,errorMargin):
+            stopMessage="Validation stopped at record %d once the rate of invalid objects is known within %g%%"%(nb,100*errorMargin)
+            break
+    for uniqueSet in uniqueSets:
+        uniqueSet.close()
+    if cache!=None:
+        cache.close()
+    if quarantine!=None:
+        quarantine.close()
+    if checkpointFile!=None:
+        removeCheckpoint(checkpointFile)
+    if progress!=None:
+        progress.report(nbRead,nbValidated,nbBytes,counts,done=True)
+    if isSampling():
+        if stopMessage!=None:
+            print (stopMessage)
+        if nbValidated<nbRead:
+            print ("Sample of "+showNum(nbValidated)+" objects out of "+showNum(nbRead)+" read")
+        if nbValidated>0:
+            print (showRate(counts["invalid"]+counts["bad"]+counts["dup"],nbValidated))
+    printSummary(nbValidated,counts)
+    return counts["invalid"]
+
+###########
+### validation of a JSON lines file by many processes each validating a shard of the file,
+#   i.e. a range of bytes starting and ending at the start of a line.
+#   The number of lines in each shard is first counted to number the records as a single process would,
+#   then each process validates its shard and returns its messages and statistics which are merged in
+#   the order of the shards. The duplicate ids and unique values are checked during the merge.
+
+## validator, id and unique functions of a validating process and its read only cache
+shardValidator=None
+shardIdFn=None
+shardUniqueFns=[]
+shardCache=None
+
+def initShardProcess(schema,idStr,pointers,trace,regexTimeout,fastLoads,cache,cacheGeneration,keepErrorIds,maxErrorKinds):
+    global shardValidator,shardIdFn,shardUniqueFns,shardCache,uniquePointers,traceRead,cacheFile
+    traceRead=trace
+    ErrorStatistics.maxKinds=maxErrorKinds
+    uniquePointers=pointers
+    DecodeJson.fastLoads=fastLoads
+    if regexTimeout!=None:
+        setRegexTimeout(regexTimeout)
+    shardValidator=Validator(schema,trace)
+    shardValidator.keepErrorIds=keepErrorIds
+    shardIdFn=idFunction(idStr)
+    shardUniqueFns=uniqueFunctions(idStr)
+    cacheFile=cache
+    shardCache=openCache(shardValidator,idStr,generation=cacheGeneration,readOnly=True)
+
+## split a file in about nbShards ranges of bytes [start,end[ each starting at the beginning of a line
+def shardRanges(fileName,nbShards):
+    size=os.path.getsize(fileName)
+    starts=[0]
+    with open(fileName,"rb") as f:
+        for i in range(1,nbShards):
+            pos=size*i//nbShards
+            if pos<=starts[-1]:continue
+            f.seek(pos-1)
+            f.readline() # go to the start of the next line
+            pos=f.tell()
+            if pos>=size:break
+            if pos>starts[-1]:
+                starts.append(pos)
+    return list(zip(starts,starts[1:]+[size]))
+
+## number of lines in a range of bytes of a file
+def countShardLines(task):
+    (fileName,start,end)=task
+    if end<=start:return 0
+    with open(fileName,"rb") as f, mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ) as mm:
+        nbLines=0
+        for pos in range(start,end,1<<24):
+            nbLines+=mm[pos:min(pos+(1<<24),end)].count(b"\n")
+        if mm[end-1:end]!=b"\n":
+            nbLines+=1 # last line without a newline
+    return nbLines
+
+## validate the lines of a range of bytes of a file, the first line being the record numbered firstNb
+#  returns (records,nb,counts,errorTable,errorIdList,cache) where records is the list of (nb,unique values,output)
+#  for the records having a unique value or an output, unique values being a list of (i,value),
+#  and cache the pending outcomes and uses of the cache to merge in the cache of the main process
+def validateShard(task):
+    (fileName,start,end,firstNb,logMessages)=task
+    records=[]
+    counts={"invalid":0,"bad":0,"dup":0}
+    values=[]
+    def checkUnique(i,val,nb):
+        values.append((i,val))
+    out=io.StringIO()
+    nb=firstNb-1
+    lines=mappedLines(fileName,start,end)
+    if shardCache!=None:
+        lines=shardCache.prefetch(lines)
+    with contextlib.redirect_stdout(out):
+        for line in lines:
+            nb+=1
+            validateRecord(shardValidator,line,nb,shardIdFn,shardUniqueFns,checkUnique,logMessages,counts,shardCache)
+            if out.tell()>0 or len(values)>0:
+                records.append((nb,values,out.getvalue()))
+                values=[]
+                out.seek(0)
+                out.truncate()
+    (errorTable,errorIdList)=shardValidator.takeErrorStatistics()
+    return (records,nb-firstNb+1,counts,errorTable,errorIdList,None if shardCache==None else shardCache.takePending())
+
+###########
+### validate a JSON lines file with nbJobs processes, the output being the same as validateStream's
+def validateLinesInParallel(validator,idStr,fileName,logMessages,nbJobs):
+    if traceRead:print ("validateLinesInParallel(%s,%s,%d)"%(validator.schema,fileName,nbJobs))
+    ranges=shardRanges(fileName,nbJobs*4) # more shards than processes for balancing their work
+    nb=0
+    counts={"invalid":0,"bad":0,"dup":0}
+    (checkUnique,uniqueSets)=uniqueChecker(uniqueFunctions(idStr))
+    cache=openCache(validator,idStr)
+    progress=ProgressMeter() if Progress.isReporting() else None
+    with multiprocessing.Pool(nbJobs,initShardProcess,(validator.schema,idStr,uniquePointers,traceRead,ValidateJsonObject.regexTimeout,DecodeJson.fastLoads,
+                                                       cacheFile,None if cache==None else cache.generation,
+                                                       validator.keepErrorIds,ErrorStatistics.maxKinds)) as pool:
+        nbLines=pool.map(countShardLines,[(fileName,start,end) for (start,end) in ranges])
+        firstNbs=[1]
+        for n in nbLines[:-1]:
+            firstNbs.append(firstNbs[-1]+n)
+        tasks=[(fileName,start,end,firstNb,logMessages) for ((start,end),firstNb) in zip(ranges,firstNbs)]
+        for ((records,nbShard,shardCounts,errorTable,errorIdList,cachePending),(start,end)) in zip(pool.imap(validateShard,tasks),ranges):
+            for (recordNb,values,output) in records:
+                for (i,val) in values:
+                    checkUnique(i,val,recordNb)
+                print (output,end="")
+            for key in counts:
+                counts[key]+=shardCounts[key]
+            validator.mergeErrorStatistics(errorTable,errorIdList)
+            if cache!=None:
+                cache.merge(cachePending)
+            if progress!=None:
+                if time.monotonic()>=progress.nextReport:
+                    progress.report(nb+nbShard,nb+nbShard,end,counts)
+            elif not(logMessages) and (nb+nbShard)//10000>nb//10000:
+                sys.stderr.write("Processing record "+str((nb+nbShard)//10000*10000)+"\n")
+            nb+=nbShard
+    for uniqueSet in uniqueSets:
+        uniqueSet.close()
+    if cache!=None:
+        cache.close()
+    if progress!=None:
+        progress.report(nb,nb,ranges[-1][1] if len(ranges)>0 else 0,counts,done=True)
+    printSummary(nb,counts)
+    return counts["invalid"]
+
+###########
+### validate a series of json objects within a file with a validator
 #   returns the number of invalid objects
-def validateObjects(schema,idStr,fileName,logMessages):
-    if traceRead:print ("validateObjects(%s,%s)"%(schema,fileName))
+#   the values are put on a single line when they are copied in the outputs of the valid records or of the quarantine,
+#   whose records are one per line
+def validateObjects(validator,idStr,fileName,logMessages):
+    if traceRead:print ("validateObjects(%s,%s)"%(validator.schema,fileName))
+    singleLineValues=validOutputFile!=None or quarantineFile!=None
     if fileName==None:
-        # it seems that sys.stdin.read() does not work from the console... but readlines() does
-        splitStdin = jsonSplitter("".join(sys.stdin.readlines()))  
-        return validateStream(schema,idStr,splitStdin,logMessages)
+        return validateStream(validator,idStr,jsonSplitter(stdinInput(),singleLineValues),logMessages)
     else:
         if not os.path.exists(fileName):
             print ("json file not found: "+fileName)
             return 1
-        return validateStream(schema,idStr,jsonSplitter(open(fileName).read()),logMessages)
+        with openInput(fileName) as f:
+            return validateStream(validator,idStr,jsonSplitter(f,singleLineValues),logMessages)
+
+### 
+#  generator of the lines of a file, as bytes, between the byte offsets start and end (the end of the file when None)
+#  the file is memory-mapped and the lines are found on the raw bytes, they are not decoded as text
+#  because the json decoder accepts bytes. A file that cannot be mapped (e.g. a pipe) is read by lines.
+def mappedLines(fileName,start=0,end=None):
+    with open(fileName,"rb") as f:
+        try:
+            mm=mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+        except (ValueError,OSError): # empty file or not a regular file
+            if start==0 and end==None:
+                yield from f
+            return
+        with mm:
+            if end==None:end=len(mm)
+            pos=start
+            while pos<end:
+                eol=mm.find(b"\n",pos,end)
+                nextPos=end if eol<0 else eol+1
+                yield mm[pos:nextPos]
+                pos=nextPos
 
 ### 
-#  validate lines in a file each of which is json object
+#  validate lines in a file each of which is json object, a compressed file being read as a stream of lines
 #  returns the number of invalid lines
-def validateLines(schema,idStr,fileName,logMessages):
-    if traceRead:print ("validateLines(%s,%s)"%(schema,fileName))
-    return validateStream(schema,idStr,open(fileName) if fileName!=None else sys.stdin,logMessages)        
-
-## taken from http://stackoverflow.com/questions/237079/how-to-get-file-creation-modification-date-times-in-python
-def modificationDate(filename):
-    t = os.path.getmtime(filename)
-    return datetime.datetime.fromtimestamp(t)
-
-## save a schema as a JSON Schema file
-def saveSchema(schema,pythonSchemaFileName):
-    if traceRead:print ("saveSchema:"+pythonSchemaFileName)
-    out=open(pythonSchemaFileName,"w")
-    # json.dump(schema,out,indent=3,separators=(',', ': '))
-    ppJson(out,schema)
-    return schema
-
-## read an existing schema
-def readSchema(pythonSchemaFileName):
-    if traceRead:print ("readSchema:"+pythonSchemaFileName)
-    schema = json.load(open(pythonSchemaFileName))
-    if traceRead:
-        print ("schema read:\n")
-        pprint.pprint(schema)
-    return schema
-    
-## find a JSON-RNC schema: if the JSON Schema file is older than the JSON-RNC schema parse it
-def getSchema(jsonrncFile):
-    if traceRead:print ("getSchema:"+jsonrncFile)
+def validateLines(validator,idStr,fileName,logMessages):
+    if traceRead:print ("validateLines(%s,%s)"%(validator.schema,fileName))
+    if fileName==None:
+        return validateStream(validator,idStr,stdinInput(True),logMessages)
+    if isCompressed(fileName):
+        with openInput(fileName,True) as f:
+            return validateStream(validator,idStr,f,logMessages)
+    state=resumeState()
+    if state!=None and state["offset"]!=None: # continue reading from the checkpoint
+        return validateStream(validator,idStr,mappedLines(fileName,state["offset"]),logMessages,state["offset"])
+    return validateStream(validator,idStr,mappedLines(fileName),logMessages)
+
+## validator of a JSON-RNC schema: its compiled schema is loaded from the schema cache when the content
+#  of the file has already been parsed and compiled, otherwise the schema is parsed, compiled and saved in the cache
+#  returns None after printing the errors found in the schema
+def getValidator(jsonrncFile):
+    if traceRead:print ("getValidator:"+jsonrncFile)
     if not os.path.exists(jsonrncFile):
         print ("schema file not found: "+jsonrncFile)
         return None
-    pythonSchemaFileName=jsonrncFile+".json"
-    if os.path.exists(pythonSchemaFileName):
-        schemaCreationTime=modificationDate(pythonSchemaFileName)
-        if schemaCreationTime > modificationDate(jsonrncFile):
-            return readSchema(pythonSchemaFileName)
-    schema=parseJsonRnc(open(jsonrncFile))
+    with open(jsonrncFile,"rb") as f:
+        content=f.read()
+    key=SchemaCache.schemaFileKey(content)
+    instrumented=traceRead or profileFile!=None # traced or profiled nodes are not cached
+    cached=SchemaCache.loadSchema(key) if not instrumented else None
+    if cached!=None:
+        (schema,compiledSchema)=cached
+        return Validator(schema,compiledSchema=compiledSchema)
+    schema=parseJsonRnc(content.decode("utf-8").splitlines(keepends=True))
     if type(schema) is int:
-        print (str(schema)+" errors found in schema in "+pythonSchemaFileName)
+        print (str(schema)+" errors found in schema in "+jsonrncFile)
         return None
-    return saveSchema(schema,pythonSchemaFileName)
+    if traceRead:
+        print ("schema parsed:\n")
+        pprint.pprint(schema)
+    validator=compileJsonSchema(schema)
+    if not instrumented:
+        SchemaCache.saveSchema(key,schema,validator.compiledSchema if validator!=None else None)
+    return validator
 
 
 if __name__ == '__main__':
@@ -157,27 +563,103 @@ if __name__ == '__main__':
     parser.add_argument("--debug",help="Trace calls for debugging",action="store_true")
     parser.add_argument("-id",help="use this selector as a list of keys each separated by a slash, a.k.a. JSON pointer, (e.g. '_id/$oid') "
                                    "for identifying records in error messages instead of line numbers")
+    parser.add_argument("--unique",help="JSON pointer of a field whose values must be unique among the records (e.g. 'email'), "
+                                        "this option can be repeated",action="append",default=[],metavar="POINTER")
+    parser.add_argument("--unique-memory",help="Megabytes of memory for checking unique ids and values, "
+                                               "the values that do not fit being kept in a temporary database",type=int,default=1024)
+    parser.add_argument("--max-invalid",help="Stop the validation after this number of invalid objects",type=int,metavar="K")
+    parser.add_argument("--sample",help="Validate only one object out of N, starting with the first one",type=int,default=1,metavar="N")
+    parser.add_argument("--reservoir",help="Validate only a random sample of K objects, the same for the same input",type=int,metavar="K")
+    parser.add_argument("--error-margin",help="Stop the validation once the rate of invalid objects is known within plus or minus "
+                                              "this margin (e.g. 0.01) at a 95%% confidence level",type=float)
+    parser.add_argument("--checkpoint",help="File in which the state of the validation is saved periodically for resuming it",metavar="FILE")
+    parser.add_argument("--checkpoint-interval",help="Number of seconds between checkpoints",type=float,default=60)
+    parser.add_argument("--resume",help="Resume the validation from the state saved in the checkpoint file",action="store_true")
+    parser.add_argument("--cache",help="File of a cache of the outcomes of the validation of records so that the records "
+                                       "that have not changed since a previous validation with the same schema are not validated again",metavar="FILE")
+    parser.add_argument("--cache-size",help="Maximum number of megabytes of the cache, the outcomes least recently used being removed",
+                        type=int,default=1024)
+    parser.add_argument("--schema-cache",help="Directory of the cache of the parsed and compiled schemas, "
+                                              "an empty string for not using a cache",default=SchemaCache.schemaCacheDir,metavar="DIR")
+    parser.add_argument("--profile",help="Count the calls, failures and time of the validation of each node of the schema "+
+                                         "and write the report of the slowest ones in this file",metavar="FILE")
+    parser.add_argument("--progress",help="Write on stderr the throughput, the rate of invalid objects, the estimated time "+
+                                          "to the end of the file and the memory used every few seconds",action="store_true")
+    parser.add_argument("--progress-file",help="File rewritten every few seconds with the progress of the validation, "+
+                                               "in the Prometheus textfile format for a .prom file, otherwise in JSON",metavar="FILE")
+    parser.add_argument("--progress-interval",help="Number of seconds between progress reports",type=float,default=5)
+    parser.add_argument("--batch",help="Validate the records by blocks of N, the values of their fields being checked by columns "+
+                                       "(with NumPy when it is installed); faster only for flat records, whose fields are mostly of simple types",
+                        type=int,default=0,metavar="N")
     parser.add_argument("--stats","-st",help="Output statistics about error messages",action="store_true")
+    parser.add_argument("--stats-examples",help="Output with the statistics the ids of a few objects having each kind of error",
+                        action="store_true")
+    parser.add_argument("--stats-kinds",help="Maximum number of kinds of errors counted in the statistics, "+
+                        "the least frequent ones being replaced by the new ones",type=int,default=1000,metavar="K")
     parser.add_argument("--nolog",help="Do not log error messages",action="store_true")
     parser.add_argument("--sed",help="Output list of erroneous ids in sed compatible format",action="store_true")
+    parser.add_argument("--valid-output",help="File in which the valid records are copied, "+
+                                              "compressed according to its extension (.gz, .bz2 or .xz)",metavar="FILE")
+    parser.add_argument("--quarantine",help="File in which the invalid, malformed or duplicate records are copied, "+
+                                            "compressed according to its extension (.gz, .bz2 or .xz)",metavar="FILE")
+    parser.add_argument("--quarantine-messages",help="Write each record of the quarantine as a JSON object with its number, "+
+                                                     "its kind of error and its messages",action="store_true")
+    parser.add_argument("--jobs","-j",help="Number of processes validating a JSON lines file in parallel",type=int,default=1)
+    parser.add_argument("--decoder",help="JSON decoder to use, by default the fastest one installed",choices=sorted(jsonDecoders))
+    parser.add_argument("--regex-timeout",help="Maximum number of seconds for matching a value against a pattern",type=float)
     parser.add_argument("schema",help="name of file containing the schema")
     parser.add_argument("json_file",help="name of the JSON file to validate",nargs='?')
     args=parser.parse_args()
-    if args.json_file != None and args.json_file.endswith(".json"): ## always split when dealing with .json file
+    if args.json_file != None and args.json_file.endswith((".json",".json.gz",".json.bz2",".json.xz")): ## always split when dealing with .json file
         args.split=True
     if args.debug : 
         traceRead=True
-    schema = getSchema(args.schema)
-    if schema!=None:
+    if args.decoder != None:
+        setJsonDecoder(args.decoder)
+    if args.regex_timeout != None:
+        setRegexTimeout(args.regex_timeout)
+    uniquePointers=args.unique
+    UniqueValues.uniqueMemory=args.unique_memory<<20
+    (sampleEvery,reservoirSize,maxInvalid,errorMargin)=(args.sample,args.reservoir,args.max_invalid,args.error_margin)
+    if args.resume and args.checkpoint==None:
+        parser.error("--resume needs a --checkpoint file")
+    if args.checkpoint!=None and args.reservoir!=None:
+        parser.error("--checkpoint cannot be used with --reservoir that reads the whole input before validating")
+    (checkpointFile,resume)=(args.checkpoint,args.resume)
+    (validOutputFile,quarantineFile,quarantineMessages)=(args.valid_output,args.quarantine,args.quarantine_messages)
+    if (validOutputFile!=None or quarantineFile!=None) and (isSampling() or checkpointFile!=None):
+        parser.error("--valid-output and --quarantine copy all the records, they cannot be used with sampling or checkpoints")
+    (cacheFile,cacheSize)=(args.cache,args.cache_size<<20)
+    Checkpoint.checkpointInterval=args.checkpoint_interval
+    SchemaCache.schemaCacheDir=args.schema_cache or None
+    profileFile=args.profile
+    batchSize=args.batch
+    if args.stats_kinds<1:
+        parser.error("--stats-kinds must count at least one kind of error")
+    ErrorStatistics.maxKinds=args.stats_kinds
+    (Progress.showProgress,Progress.progressFile,Progress.progressInterval)=(args.progress,args.progress_file,args.progress_interval)
+    if args.json_file!=None and os.path.isfile(args.json_file) and not isCompressed(args.json_file):
+        Progress.inputSize=os.path.getsize(args.json_file)
+    Progress.metricLabels={"schema":args.schema,"input":args.json_file or "-"}
+    validator = getValidator(args.schema)
+    if validator!=None:
+        validator.keepErrorIds=args.sed # the list of the ids is not kept otherwise
         if args.slurp:
-            nbInvalid = validateStream(schema,args.id,[open(args.json_file,"r").read()],not(args.nolog))
+            nbInvalid = validateStream(validator,args.id,[openInput(args.json_file).read()],not(args.nolog))
         elif args.split:
-            nbInvalid=validateObjects(schema,args.id,args.json_file,not(args.nolog))
+            nbInvalid=validateObjects(validator,args.id,args.json_file,not(args.nolog))
+        elif args.jobs>1 and args.json_file!=None and not isCompressed(args.json_file) and not isSampling() and args.checkpoint==None \
+                and profileFile==None and validOutputFile==None and quarantineFile==None:
+            # shards need random access, the nodes are profiled and the records are copied by a single process
+            nbInvalid=validateLinesInParallel(validator,args.id,args.json_file,not(args.nolog),args.jobs)
         else:
-            nbInvalid=validateLines(schema,args.id,args.json_file,not(args.nolog))
+            nbInvalid=validateLines(validator,args.id,args.json_file,not(args.nolog))
         if args.stats:
-            printErrorStatistics()
+            validator.printErrorStatistics(args.stats_examples)
+        if profileFile!=None:
+            with open(profileFile,"w") as f:
+                validator.printProfile(f)
         if args.sed:
-            printErrorIdList()
+            validator.printErrorIdList()
         exit(nbInvalid) # return the number of errors but in Linux it is given modulo 256...
 
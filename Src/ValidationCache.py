@@ -0,0 +1,158 @@
+#!/usr/local/bin/python3
+# coding=utf-8
+
+####### Cache of the outcomes of the validation of records kept between validations
+###  a record is found by a hash of its text keyed by a hash of the schema (and of the options changing
+###  the outcome), so that the records of a file that have not changed since a previous validation with
+###  the same schema are neither decoded nor validated again. The cache is an SQLite database whose size
+###  is limited by removing the records least recently used.
+########################################################################
+
+import hashlib,sqlite3,json,marshal,time
+
+## version of the format of the outcomes in the cache, changing it invalidates the existing caches
+cacheVersion=2
+
+## number of outcomes or uses kept in memory before writing them in the database
+flushSize=10000
+
+## number of records whose outcomes are looked up with a single query
+prefetchSize=256
+
+## proportion of the maximum size of the cache kept when its outcomes least recently used are removed
+evictedSize=0.75
+
+## outcome of a valid record without id nor unique value, saved as NULL
+validOutcome=("valid",None,[],None,None,None)
+
+## hash of a schema and of the options that change the outcome of a validation, used as the key of the record hashes
+def schemaKey(schema,options):
+    text=json.dumps([cacheVersion,marshal.version,schema,options],sort_keys=True)
+    return hashlib.blake2b(text.encode("utf-8","surrogatepass"),digest_size=32).digest()
+
+class ValidationCache:
+    """outcomes of the validation of records, each outcome being marked with the day it was last used (its generation)
+       so that the outcomes least recently used are removed when the cache exceeds maxBytes. A read only cache
+       (e.g. in a process validating a shard) only keeps the new outcomes and the uses that must then be
+       merged in the cache of the main process."""
+    def __init__(self,fileName,key,maxBytes=None,generation=None,readOnly=False):
+        self.key=key
+        self.maxBytes=maxBytes
+        self.readOnly=readOnly
+        self.db=sqlite3.connect(fileName,timeout=600)
+        self.db.execute("PRAGMA cache_size=-262144") # 256MB of pages instead of 2MB for looking up random keys
+        self.db.execute("PRAGMA mmap_size=%d"%(1<<30))
+        if not readOnly:
+            self.db.execute("PRAGMA journal_mode=WAL") # readers in other processes while writing
+            self.db.execute("PRAGMA synchronous=OFF")
+            self.db.execute("CREATE TABLE IF NOT EXISTS outcomes(key BLOB PRIMARY KEY, outcome BLOB, used INTEGER) WITHOUT ROWID")
+            self.db.execute("CREATE INDEX IF NOT EXISTS outcomesUsed ON outcomes(used)")
+            self.db.commit()
+        self.generation=int(time.time()//86400) if generation==None else generation
+        self.added=[] # (key,outcome) not yet written
+        self.prefetched={} # key => (outcome,used) or None for the records read ahead of their validation
+        self.uses=[]  # keys of the outcomes used today that are not yet written
+
+    ## key of the text of a record (str or bytes) ignoring the blanks at its end
+    def recordKey(self,inJson):
+        if isinstance(inJson,str):
+            inJson=inJson.encode("utf-8","surrogatepass")
+        return hashlib.blake2b(inJson.rstrip(),digest_size=16,key=self.key).digest()
+
+    ## generator of the records of a stream whose outcomes are looked up by groups of prefetchSize records
+    #  which is much faster than looking up each one
+    def prefetch(self,stream):
+        records=[]
+        for inJson in stream:
+            records.append(inJson)
+            if len(records)==prefetchSize:
+                self.lookupAll(records)
+                yield from records
+                records=[]
+        self.lookupAll(records)
+        yield from records
+
+    def lookupAll(self,records):
+        keys=[self.recordKey(inJson) for inJson in records]
+        self.prefetched=dict.fromkeys(keys)
+        query="SELECT key,outcome,used FROM outcomes WHERE key IN (%s)"%",".join("?"*len(keys))
+        for (key,outcome,used) in self.db.execute(query,keys):
+            self.prefetched[key]=(outcome,used)
+
+    ## outcome saved for a record key, None when there is none
+    def lookup(self,recordKey):
+        if recordKey in self.prefetched:
+            row=self.prefetched.pop(recordKey)
+        else:
+            row=self.db.execute("SELECT outcome,used FROM outcomes WHERE key=?",(recordKey,)).fetchone()
+        if row==None:return None
+        if row[1]<self.generation:
+            self.uses.append(recordKey)
+            self.flushIfNeeded()
+        return validOutcome if row[0]==None else marshal.loads(row[0])
+
+    def store(self,recordKey,outcome):
+        self.added.append((recordKey,None if outcome==validOutcome else marshal.dumps(outcome)))
+        self.flushIfNeeded()
+
+    def flushIfNeeded(self):
+        if not self.readOnly and len(self.added)+len(self.uses)>=flushSize:
+            self.flush()
+
+    def flush(self):
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO outcomes VALUES (?,?,?)",
+                                [(key,outcome,self.generation) for (key,outcome) in self.added])
+            self.db.executemany("UPDATE outcomes SET used=? WHERE key=?",[(self.generation,key) for key in self.uses])
+        self.added=[]
+        self.uses=[]
+
+    ## returns the (new outcomes,uses) of a read only cache and forget them
+    def takePending(self):
+        pending=(self.added,self.uses)
+        self.added=[]
+        self.uses=[]
+        return pending
+
+    ## add the pending outcomes and uses of a read only cache
+    def merge(self,pending):
+        (added,uses)=pending
+        self.added.extend(added)
+        self.uses.extend(uses)
+        self.flushIfNeeded()
+
+    ## bytes of the pages of the database in use, found without reading the outcomes
+    def usedBytes(self):
+        (pageSize,)=self.db.execute("PRAGMA page_size").fetchone()
+        (nbPages,)=self.db.execute("PRAGMA page_count").fetchone()
+        (nbFree,)=self.db.execute("PRAGMA freelist_count").fetchone()
+        return (nbPages-nbFree)*pageSize
+
+    ## remove the outcomes least recently used when the pages in use exceed maxBytes, the oldest days first
+    #  (read from the index of the day of their last use), so that they fill about evictedSize of maxBytes.
+    #  The outcomes of a day are spread over all the pages, so the database is compacted after removing them;
+    #  as the cache is then well under its limit, this is done only once in a while and not after each validation
+    def evict(self):
+        if self.maxBytes==None:return
+        size=self.usedBytes()
+        if size<=self.maxBytes:return
+        days=self.db.execute("SELECT used,count(*) FROM outcomes GROUP BY used ORDER BY used").fetchall()
+        nbOutcomes=sum(nb for (used,nb) in days)
+        if nbOutcomes==0:return
+        nbRemoved=(size-int(self.maxBytes*evictedSize))*nbOutcomes//size+1
+        with self.db:
+            for (used,nb) in days:
+                if nbRemoved<=0:break
+                if nb<=nbRemoved:
+                    self.db.execute("DELETE FROM outcomes WHERE used=?",(used,))
+                else:
+                    self.db.execute("DELETE FROM outcomes WHERE key IN (SELECT key FROM outcomes WHERE used=? LIMIT ?)",
+                                    (used,nbRemoved))
+                nbRemoved-=nb
+        self.db.execute("VACUUM")
+
+    def close(self):
+        if not self.readOnly:
+            self.flush()
+            self.evict()
+        self.db.close()
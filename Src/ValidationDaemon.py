@@ -0,0 +1,204 @@
+#!/usr/local/bin/python3
+# coding=utf-8
+
+####### Daemon keeping compiled schemas ready for validating batches of JSON lines
+###  a request gives the JSON-rnc file of a schema and a batch of lines, the response gives the verdict of each record
+###  with its messages in the format of ValidateJsonRnc.py, the summary and (on demand) the statistics of the errors.
+###  The requests are read from a Unix domain socket (a JSON request on a line answered by a JSON response on a line)
+###  or over HTTP on localhost (a JSON request POSTed to /validate). They are handled one at a time, a connection
+###  that stays idle longer than a timeout being dropped so that it does not stall the daemon.
+###  Only the schemas given on the command line or found in the schema directories of the daemon are compiled,
+###  so that a client cannot make the daemon read other files, and the errors of a schema are printed by the daemon
+###  instead of being sent to the client, as they show the lines of the schema.
+###  ValidateClient.py sends the lines of a file to the daemon and prints the response as ValidateJsonRnc.py would.
+########################################################################
+
+import sys,os,io,json,argparse,contextlib,signal,socket,socketserver,http.server
+import SchemaCache
+from ValidateJsonRnc    import getValidator,idFunction,uniqueFunctions,uniqueChecker,recordOutcome,reportOutcome,printSummary
+from ValidationCache    import validOutcome
+from ValidateJsonObject import Validator
+from SplitJson          import jsonSplitter
+
+## flag for debugging
+traceDaemon=False
+
+## seconds after which a connection that sends nothing is dropped
+connectionTimeout=10
+
+## real paths of the schema files given on the command line and of the directories whose schemas can be used
+allowedSchemas=set()
+schemaDirs=[]
+
+## validators of the schemas already compiled: file name => (key of its content,validator),
+#  the least recently used ones being removed when there are more than maxValidators
+validators={}
+maxValidators=100
+
+## real path of a schema file that the daemon may compile, None when it is not allowed
+def allowedSchema(schemaFile):
+    path=os.path.realpath(schemaFile)
+    if path in allowedSchemas:
+        return path
+    for schemaDir in schemaDirs:
+        if os.path.commonpath([schemaDir,path])==schemaDir:
+            return path
+    return None
+
+## (validator,messages) for a schema file, the schema being compiled again only when the content of its file has
+#  changed, the validator is None when the schema cannot be compiled and the messages are then those of its errors
+def schemaValidator(schemaFile):
+    key=None
+    if os.path.exists(schemaFile):
+        with open(schemaFile,"rb") as f:
+            key=SchemaCache.schemaFileKey(f.read())
+    if schemaFile in validators and validators[schemaFile][0]==key:
+        validators[schemaFile]=validators.pop(schemaFile) # the most recently used last
+        return (validators[schemaFile][1],"")
+    out=io.StringIO()
+    with contextlib.redirect_stdout(out):
+        validator=getValidator(schemaFile)
+    if validator!=None:
+        validators.pop(schemaFile,None)
+        if len(validators)>=maxValidators:
+            del validators[next(iter(validators))]
+        validators[schemaFile]=(key,validator)
+    return (validator,out.getvalue())
+
+###
+#  response to a request, a dict with the fields
+#     schema: name of the JSON-rnc file of the schema (as seen by the daemon)
+#     lines:  list of JSON lines or, when split is True, of lines of JSON values spanning any number of lines
+#     id, unique, nolog, stats: as the options of ValidateJsonRnc.py
+#  the response is a dict with the list of {"nb","verdict","messages"} of the records, where the verdict is "valid",
+#  "invalid", "bad" or "dup", the summary, the statistics and the number of invalid records;
+#  it is {"error":message} when the schema is not allowed or has errors, which are printed by the daemon
+def validateBatch(request):
+    schemaFile=allowedSchema(request["schema"])
+    if schemaFile==None:
+        return {"error":"schema not allowed by the daemon: %s\n"%request["schema"]}
+    (validator,errors)=schemaValidator(schemaFile)
+    if validator==None:
+        print (errors,end="")
+        return {"error":"errors found in schema in %s, see the output of the daemon\n"%request["schema"]}
+    validator=Validator(validator.schema,compiledSchema=validator.compiledSchema) # statistics of this request only
+    idStr=request.get("id")
+    idFn=idFunction(idStr)
+    uniqueFns=uniqueFunctions(idStr,request.get("unique",[]))
+    logMessages=not request.get("nolog",False)
+    records=request["lines"]
+    if request.get("split",False):
+        records=jsonSplitter("".join(records))
+    counts={"invalid":0,"bad":0,"dup":0}
+    results=[]
+    out=io.StringIO()
+    with contextlib.redirect_stdout(out):
+        (checkUnique,uniqueSets)=uniqueChecker(uniqueFns)
+        for (nb,inJson) in enumerate(records,1):
+            outcome=recordOutcome(validator,inJson,idFn,uniqueFns,logMessages)
+            if outcome is not validOutcome:
+                reportOutcome(validator,outcome,nb,checkUnique,logMessages,counts)
+            results.append({"nb":nb,"verdict":outcome[0],"messages":out.getvalue()})
+            out.seek(0)
+            out.truncate()
+        for uniqueSet in uniqueSets:
+            uniqueSet.close()
+        printSummary(len(results),counts)
+        summary=out.getvalue()
+        out.seek(0)
+        out.truncate()
+        if request.get("stats",False):
+            validator.printErrorStatistics()
+    return {"results":results,"summary":summary,"stats":out.getvalue(),"invalid":counts["invalid"]}
+
+## response to the bytes of a request, {"error":message} when the request cannot be handled
+def handleRequest(data):
+    try:
+        request=json.loads(data)
+        if traceDaemon:print ("request: schema=%s, %d lines"%(request.get("schema"),len(request.get("lines",[]))))
+        return validateBatch(request)
+    except Exception as err:
+        return {"error":"bad request: %s\n"%err}
+
+class SocketRequestHandler(socketserver.StreamRequestHandler):
+    """requests of a connection to the Unix domain socket, each one on a line,
+       the connection being dropped when it stays idle for connectionTimeout seconds"""
+    def setup(self):
+        self.timeout=connectionTimeout # settimeout of the socket of the connection
+        super().setup()
+
+    def handle(self):
+        try:
+            for data in self.rfile:
+                self.wfile.write(json.dumps(handleRequest(data)).encode("utf-8")+b"\n")
+                self.wfile.flush()
+        except socket.timeout:
+            if traceDaemon:print ("idle connection dropped")
+
+class HttpRequestHandler(http.server.BaseHTTPRequestHandler):
+    """requests POSTed to /validate, the connection being dropped when it stays idle for connectionTimeout seconds"""
+    def setup(self):
+        self.timeout=connectionTimeout
+        super().setup()
+
+    def do_POST(self):
+        if self.path!="/validate":
+            self.send_error(404)
+            return
+        data=self.rfile.read(int(self.headers.get("Content-Length",0)))
+        body=json.dumps(handleRequest(data)).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type","application/json")
+        self.send_header("Content-Length",str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self,format,*args):
+        if traceDaemon:
+            super().log_message(format,*args)
+
+## server of the requests on a Unix domain socket, the file of the socket being replaced when it already exists
+def socketServer(socketFile):
+    if os.path.exists(socketFile):
+        os.remove(socketFile)
+    return socketserver.UnixStreamServer(socketFile,SocketRequestHandler)
+
+## server of the HTTP requests on localhost
+def httpServer(port):
+    return http.server.HTTPServer(("127.0.0.1",port),HttpRequestHandler)
+
+if __name__ == '__main__':
+    parser=argparse.ArgumentParser(description="Daemon validating batches of JSON lines sent by ValidateClient.py "+
+                                               "according to JSON-rnc schemas that are compiled only once")
+    group=parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--socket",help="File of the Unix domain socket on which requests are read",metavar="FILE")
+    group.add_argument("--port",help="Port on localhost on which HTTP requests are read",type=int)
+    parser.add_argument("--schema-cache",help="Directory of the cache of the parsed and compiled schemas, "
+                                              "an empty string for not using a cache",default=SchemaCache.schemaCacheDir,metavar="DIR")
+    parser.add_argument("--schema-dir",help="Directory whose schemas (also in its subdirectories) can be used by the requests, "+
+                                            "this option can be repeated",action="append",default=[],metavar="DIR")
+    parser.add_argument("--timeout",help="Seconds after which a connection that sends nothing is dropped",
+                        type=float,default=connectionTimeout)
+    parser.add_argument("--debug",help="Trace the requests",action="store_true")
+    parser.add_argument("schemas",help="JSON-rnc files of the schemas to compile before reading requests, "+
+                                       "the only ones that can be used with those of the schema directories",nargs="*")
+    args=parser.parse_args()
+    if args.debug:
+        traceDaemon=True
+    SchemaCache.schemaCacheDir=args.schema_cache or None
+    connectionTimeout=args.timeout
+    schemaDirs=[os.path.realpath(schemaDir) for schemaDir in args.schema_dir]
+    for schemaFile in args.schemas:
+        allowedSchemas.add(os.path.realpath(schemaFile))
+        (validator,errors)=schemaValidator(os.path.realpath(schemaFile))
+        print (errors,end="")
+    server=socketServer(args.socket) if args.socket!=None else httpServer(args.port)
+    signal.signal(signal.SIGTERM,lambda signum,frame:sys.exit(0)) # remove the socket when killed
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket!=None:
+            os.remove(args.socket)
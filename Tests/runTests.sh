@@ -1,10 +1,26 @@
 #!/usr/bin/env bash
 cd `dirname ${TM_FILEPATH:-.}`
 testFiles=(*.jsonrnc) # create array of jsonrnc files
+nbTests=0
+# a schema cache of the tests, so that the schemas are parsed and compiled by the first validations
+# and loaded from the cache by the following ones
+export XDG_CACHE_HOME=`mktemp -d /tmp/runTests$$.XXXXXX`
+
+## compare the output of a command (given after the name of the test and the file of its expected output)
+#  with the expected output
+check() {
+    testName=$1
+    expected=$2
+    shift 2
+    "$@" | cmp $expected
+    if [ $? != 0 ]; then
+        echo 'no match for: ' $testName
+    fi
+    nbTests=`expr $nbTests + 1`
+}
 
 for file in ${testFiles[@]}
 do
-    touch $file    # force the creation of a new jsonrnc.json file
     name=`basename $file .jsonrnc`
     if [ -f $name.json ]; then
         ../Src/ValidateJsonRnc.py --stats $name.jsonrnc $name.json | cmp $name.out
@@ -14,11 +30,203 @@ do
     if [ $? != 0 ]; then
         echo 'no match for: ' $file
     fi
+    nbTests=`expr $nbTests + 1`
+done
+
+check TestSplitter TestSplitter.out ../Src/SplitJson.py <TestSplitter.txt
+
+## the JSON lines files validated by many processes give the same output as a single process
+for file in *.jsonl
+do
+    name=`basename $file .jsonl`
+    check "$name -j 3" $name.out ../Src/ValidateJsonRnc.py --stats -j 3 $name.jsonrnc $file
+done
+
+## ids and unique values repeated in records, kept in memory or spilled to a database after 1000 values
+check "TestUnique --unique" TestUnique-unique.out \
+      ../Src/ValidateJsonRnc.py --stats -id id --unique email TestUnique.jsonrnc TestUnique.jsonl
+check "TestUnique --unique-memory 0" TestUnique-unique.out \
+      ../Src/ValidateJsonRnc.py --stats -id id --unique email --unique-memory 0 TestUnique.jsonrnc TestUnique.jsonl
+check "TestUnique --unique -j 3" TestUnique-unique.out \
+      ../Src/ValidateJsonRnc.py --stats -id id --unique email --unique-memory 0 -j 3 TestUnique.jsonrnc TestUnique.jsonl
+
+## statistics counting a single kind of error, the others replacing it; counting none is refused
+check "Test2 --stats-kinds 1" Test2-kinds.out ../Src/ValidateJsonRnc.py --stats --stats-kinds 1 Test2.jsonrnc Test2.jsonl
+check "Test2 --stats-kinds 0" Test2-kinds0.out \
+      sh -c "../Src/ValidateJsonRnc.py --stats --stats-kinds 0 Test2.jsonrnc Test2.jsonl 2>&1 >/dev/null | tail -n 1"
+
+## the records validated by blocks, whose columns of values are checked at once, give the same output as
+#  the records validated one by one
+for file in ${testFiles[@]}
+do
+    name=`basename $file .jsonrnc`
+    if [ -f $name.json ]; then in=$name.json; else in=$name.jsonl; fi
+    check "$name --batch 2" $name.out ../Src/ValidateJsonRnc.py --stats --batch 2 $file $in
 done
+check "TestUnique --batch 100 --unique" TestUnique-unique.out \
+      ../Src/ValidateJsonRnc.py --stats -id id --unique email --batch 100 TestUnique.jsonrnc TestUnique.jsonl
+check "TestUnique --batch 100 --unique -j 3" TestUnique-unique.out \
+      ../Src/ValidateJsonRnc.py --stats -id id --unique email --batch 100 -j 3 TestUnique.jsonrnc TestUnique.jsonl
+
+## the valid records and the others copied on a single line in the outputs of --valid-output and --quarantine,
+#  compressed or not, while the output of the validation is unchanged
+quarantine=/tmp/runTests$$.quarantine
+check "TestQuarantine --valid-output --quarantine" TestQuarantine.out \
+      ../Src/ValidateJsonRnc.py --stats --valid-output $quarantine-valid.jsonl.gz --quarantine $quarantine.jsonl \
+      TestQuarantine.jsonrnc TestQuarantine.json
+check "TestQuarantine --valid-output (.gz)" TestQuarantine-valid.out gzip -dc $quarantine-valid.jsonl.gz
+check "TestQuarantine --quarantine" TestQuarantine-quarantine.out cat $quarantine.jsonl
+../Src/ValidateJsonRnc.py --split -id id --quarantine $quarantine-messages.jsonl.bz2 --quarantine-messages \
+    TestQuarantine.jsonrnc <TestQuarantine.json >/dev/null
+check "TestQuarantine --quarantine-messages (.bz2)" TestQuarantine-messages.out bzip2 -dc $quarantine-messages.jsonl.bz2
+rm -f $quarantine*
+
+## the counts of the profile of the nodes (without their times), an invalid record being counted once by the fast path
+#  and again by the diagnostic pass that builds its messages
+profile=/tmp/runTests$$.profile
+../Src/ValidateJsonRnc.py --profile $profile Test2.jsonrnc Test2.jsonl >/dev/null
+check "Test2 --profile" Test2-profile.out sh -c "cut -c1-31,56-71,85- $profile | (IFS= read -r header; echo \"\$header\"; LC_ALL=C sort -k 4)"
+rm -f $profile
 
-../Src/SplitJson.py <TestSplitter.txt | cmp TestSplitter.out
-if [ $? != 0 ]; then
-    echo 'no match for: TestSplitter'
-fi
-echo "Test complete for `expr ${#testFiles[@]} + 1` files"
+## errors of the schemas found by JsonRncParser (with their line and column) and by compile_rnc (left recursion,
+#  undefined reference), the errors of the schemas TestSchemaErrors and TestLeftRecursive found by the validator
+#  being in their .out files
+check "JsonRncParser and compile_rnc errors" TestSchemaErrors-api.out python3 - <<'EOF'
+import sys
+sys.path.insert(0,"../Src")
+from ParseJsonRnc import JsonRncParser,compile_rnc
+parser=JsonRncParser()
+print(parser.parse(open("TestSchemaErrors.jsonrnc").read()))
+for error in parser.errors:
+    print(repr(error))
+for text in [open("TestLeftRecursive.jsonrnc").read(),"start = {name:string, address:place}\n"]:
+    try:
+        compile_rnc(text)
+    except ValueError as err:
+        print(err.args[0])
+        for error in err.args[1]:
+            print(error)
+EOF
+
+## a time budget for matching the patterns set after a validator has been compiled, whose patterns are those of
+#  the re module even when the regex module is installed: a catastrophic value is stopped in both validators
+check "pattern timeout set after compiling" TestPatternTimeout.out python3 - <<'EOF'
+import sys
+sys.path.insert(0,"../Src")
+from ParseJsonRnc import compile_rnc
+import ValidateJsonObject
+schema="start = {code:/(a+)+b/}\n"
+before=compile_rnc(schema) # patterns compiled by the re module, before the time budget is set
+ValidateJsonObject.setRegexTimeout(0.5)
+after=compile_rnc(schema)  # the same patterns memoized by compile_rnc, or compiled by the regex module
+for validator in [before,after]:
+    for obj in [{"code":"aab"},{"code":"aac"},{"code":"a"*40+"c"}]:
+        print(validator.validate(obj),end="")
+EOF
+
+## the outcomes taken from a cache give the same output as the validation that saved them
+cache=/tmp/runTests$$.cache
+for file in *.jsonl
+do
+    name=`basename $file .jsonl`
+    check "$name --cache" $name.out ../Src/ValidateJsonRnc.py --stats --cache $cache $name.jsonrnc $file
+    check "$name --cache (cached)" $name.out ../Src/ValidateJsonRnc.py --stats --cache $cache $name.jsonrnc $file
+done
+check "TestUnique --cache --unique" TestUnique-unique.out \
+      ../Src/ValidateJsonRnc.py --stats -id id --unique email --cache $cache TestUnique.jsonrnc TestUnique.jsonl
+check "TestUnique --cache --unique (cached) -j 3" TestUnique-unique.out \
+      ../Src/ValidateJsonRnc.py --stats -id id --unique email --cache $cache -j 3 TestUnique.jsonrnc TestUnique.jsonl
+rm -f $cache*
+
+## a validation interrupted after 1000 records and resumed from its checkpoint gives the output of a validation
+#  that is not interrupted: the records are sent through a pipe kept open, so that the validation waits for
+#  the next record once the state after the 1000th one has been saved; it is then killed, its output being unbuffered
+checkpoint=/tmp/runTests$$.checkpoint
+checkpointAt() {
+    python3 -c "import sys; sys.path.insert(0,'../Src'); from Checkpoint import loadCheckpoint
+sys.exit((loadCheckpoint('$checkpoint') or {}).get('nb')!=$1)"
+}
+mkfifo $checkpoint.fifo
+PYTHONUNBUFFERED=1 ../Src/ValidateJsonRnc.py --stats -id id --unique email --checkpoint $checkpoint --checkpoint-interval 0 \
+    TestUnique.jsonrnc <$checkpoint.fifo >$checkpoint.out 2>/dev/null &
+validation=$!
+exec 3>$checkpoint.fifo
+head -n 1000 TestUnique.jsonl >&3
+for i in {1..100}; do checkpointAt 1000 && break; sleep 0.1; done
+kill $validation
+wait $validation 2>/dev/null
+exec 3>&-
+../Src/ValidateJsonRnc.py --stats -id id --unique email --checkpoint $checkpoint --resume \
+    TestUnique.jsonrnc TestUnique.jsonl >>$checkpoint.out
+check "TestUnique --checkpoint --resume" TestUnique-unique.out cat $checkpoint.out
+rm -f $checkpoint*
+
+## the validations done by a daemon through ValidateClient.py give the same outputs, except for the schemas with errors
+#  whose errors are printed by the daemon instead of being sent to the client; the daemon only uses the schemas
+#  of the test directory and drops the connections that stay idle for a second
+socket=/tmp/runTests$$.sock
+../Src/ValidationDaemon.py --socket $socket --schema-dir . --timeout 1 >$socket.out &
+daemon=$!
+for i in {1..100}; do [ -S $socket ] && break; sleep 0.1; done
+for file in ${testFiles[@]}
+do
+    name=`basename $file .jsonrnc`
+    grep -q "errors found in schema in\|Error in schema" $name.out && continue
+    if [ -f $name.json ]; then in=$name.json; else in=$name.jsonl; fi
+    check "$name ValidateClient.py" $name.out ../Src/ValidateClient.py --socket $socket --stats $file $in
+done
+check "TestUnique ValidateClient.py --unique" TestUnique-unique.out \
+      ../Src/ValidateClient.py --socket $socket --stats -id id --unique email TestUnique.jsonrnc TestUnique.jsonl
+check "TestLeftRecursive ValidateClient.py" ValidateClient-errors.out \
+      sh -c "../Src/ValidateClient.py --socket $socket TestLeftRecursive.jsonrnc TestLeftRecursive.jsonl | sed 's|$PWD/||'"
+check "ValidateClient.py with a schema outside of the schema directory" ValidateClient-refused.out \
+      ../Src/ValidateClient.py --socket $socket /etc/passwd TestUnique.jsonl
+python3 -c "import socket,time; s=socket.socket(socket.AF_UNIX); s.connect('$socket'); time.sleep(10)" &
+idle=$!
+sleep 0.2
+check "TestUnique ValidateClient.py with an idle connection" TestUnique.out \
+      timeout 5 ../Src/ValidateClient.py --socket $socket --stats TestUnique.jsonrnc TestUnique.jsonl
+kill $idle
+wait $idle 2>/dev/null
+kill $daemon
+wait $daemon
+check "TestLeftRecursive errors printed by the daemon" TestLeftRecursive.out cat $socket.out
+rm -f $socket.out
+
+## the validations by validateAsync of the input read by chunks of 100 bytes, cut anywhere in the records,
+#  give the same outputs
+validateAsync() {
+    python3 - "$@" <<'EOF'
+import sys,asyncio
+sys.path.insert(0,"../Src")
+from ValidateJsonRnc import getValidator,printSummary
+from AsyncValidation import validateAsync
+(schemaFile,inFile,idStr,unique)=(sys.argv[1:]+[None,None])[:4]
+async def chunks():
+    content=open(inFile,"rb").read()
+    for i in range(0,len(content),100):
+        yield content[i:i+100]
+async def main(validator):
+    counts={"invalid":0,"bad":0,"dup":0}
+    nb=0
+    async for result in validateAsync(validator,chunks(),idStr,inFile.endswith(".json"),counts=counts,
+                                      unique=[unique] if unique else []):
+        print(result["messages"],end="")
+        nb=result["nb"]
+    printSummary(nb,counts)
+    validator.printErrorStatistics()
+validator=getValidator(schemaFile)
+if validator!=None:
+    asyncio.run(main(validator))
+EOF
+}
+for file in ${testFiles[@]}
+do
+    name=`basename $file .jsonrnc`
+    if [ -f $name.json ]; then in=$name.json; else in=$name.jsonl; fi
+    check "$name validateAsync" $name.out validateAsync $file $in
+done
+check "TestUnique validateAsync --unique" TestUnique-unique.out validateAsync TestUnique.jsonrnc TestUnique.jsonl id email
 
+rm -rf $XDG_CACHE_HOME
+echo "Test complete for $nbTests files"